@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Command line entry for headless batch rendering
+
+Ing.,Mgr. (MSc.) Jan Cimbálník, PhD.
+Biomedical engineering
+International Clinical Research Center
+St. Anne's University Hospital in Brno
+Czech Republic
+&
+Mayo systems electrophysiology lab
+Mayo Clinic
+200 1st St SW
+Rochester, MN
+United States
+
+Example:
+pysigview-render recording.h5 -c ch1 ch2 -a events.csv -o pages
+"""
+
+# Std imports
+import argparse
+import sys
+
+# Third pary imports
+import pandas as pd
+
+# Local imports
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(
+            description='Render signal windows to PNG / PDF pages without '
+                        'display.')
+    parser.add_argument('recording', help='path to the recording')
+    parser.add_argument('-c', '--channels', nargs='+', required=True,
+                        help='channels to render')
+    parser.add_argument('-a', '--annotations',
+                        help='CSV file with start_time and end_time columns '
+                             '(uutc)')
+    parser.add_argument('-w', '--windows', nargs='+', default=[],
+                        help='windows as start:stop in uutc')
+    parser.add_argument('--pre', type=float, default=1.,
+                        help='seconds before annotation')
+    parser.add_argument('--post', type=float, default=1.,
+                        help='seconds after annotation')
+    parser.add_argument('-t', '--transforms',
+                        help='transform chain saved by save_chain')
+    parser.add_argument('-o', '--out', required=True,
+                        help='output directory')
+    parser.add_argument('-f', '--format', default='png',
+                        choices=['png', 'pdf'])
+    parser.add_argument('-n', '--workers', type=int, default=4)
+    parser.add_argument('--dpi', type=int, default=100)
+    parser.add_argument('--password', help='MEF password')
+
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    """
+    Render windows of a recording in a process pool.
+    """
+
+    from pysigview.core.batch_render import (BatchRenderer, create_trace,
+                                             windows_from_annotations)
+    from pysigview.core.transform_pipeline import load_chain
+
+    opts = parse_args(sys.argv[1:] if args is None else args)
+
+    windows = [[int(x) for x in w.split(':')] for w in opts.windows]
+    if opts.annotations:
+        df = pd.read_csv(opts.annotations)
+        windows += windows_from_annotations(df, opts.pre, opts.post)
+
+    if not windows:
+        print('No windows to render', file=sys.stderr)
+        return 1
+
+    chain = load_chain(opts.transforms) if opts.transforms else None
+
+    traces = [create_trace(ch, chain) for ch in opts.channels]
+
+    renderer = BatchRenderer(opts.recording, traces, opts.password,
+                             opts.workers, opts.format, dpi=opts.dpi)
+    renderer.set_windows(windows, opts.out)
+
+    def report(done, n_pages):
+        print('Rendered {} / {}'.format(done, n_pages), end='\r')
+
+    paths = renderer.run(report)
+    print('\nWritten {} pages to {}'.format(len(paths), opts.out))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -48,7 +48,8 @@ from PyQt5.QtGui import QColor, QIcon, QPixmap
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QMessageBox,
                              QSplashScreen, QFileDialog, QInputDialog,
                              QDockWidget, QDialog, QFormLayout, QLineEdit,
-                             QLabel, QPushButton, QComboBox)
+                             QLabel, QPushButton, QComboBox,
+                             QProgressDialog)
 
 # =============================================================================
 # Local imports
@@ -58,13 +59,20 @@ from pysigview.core.clients.clients import client_type_evaluator
 
 from pysigview.core import source_manager as sm
 # from pysigview.core.buffer_handler import MemoryBuffer
-from pysigview.core.thread_workers import TimerWorker
+from pysigview.core.thread_workers import (TimerWorker, AnnotationsWorker,
+                                           RecordingJobWorker)
+from pysigview.core.feature_extraction import FeatureExtractionJob
+from pysigview.core.event_detection import EventDetectionJob
+from pysigview.core.batch_render import (BatchRenderer, traces_from_containers,
+                                         windows_from_annotations)
 from pysigview.config.utils import get_image_path, get_home_dir
 
 # from pysigview.config.system import SYS_INFO
 from pysigview.utils.qthelpers import add_actions, create_action
 from pysigview.widgets.dir_tree_dialog import DirTreeDialog
 from pysigview.widgets.preferences import Preferences
+from pysigview.widgets.feature_dialog import FeatureDialog
+from pysigview.widgets.detector_dialog import DetectorDialog
 # =============================================================================
 # Get configuration
 # =============================================================================
@@ -108,6 +116,8 @@ class MainWindow(QMainWindow):
     metadata_reloaded = pyqtSignal()
     stop_metadata_worker = pyqtSignal()
     start_metadata_worker = pyqtSignal()
+    start_annotations_worker = pyqtSignal(object)
+    start_job_worker = pyqtSignal(object)
 
     def __init__(self, options=None):
         QMainWindow.__init__(self)
@@ -181,6 +191,30 @@ class MainWindow(QMainWindow):
         self.metadata_worker.time_started.connect(self.reload_metadata)
         self.metadata_worker_thread.start()
 
+        # Annotations loading thread
+        self.annotations_worker = AnnotationsWorker()
+        self.annotations_worker_thread = QThread()
+        self.annotations_worker.moveToThread(self.annotations_worker_thread)
+        self.start_annotations_worker.connect(self.annotations_worker.run)
+        self.annotations_worker.annotations_loaded.connect(
+                self.add_annotation_groups)
+        self.annotations_worker.annotations_failed.connect(
+                self.report_annotations_failure)
+        self.annotations_worker_thread.start()
+
+        # Whole recording jobs thread
+        self.recording_job = None
+        self.recording_job_callback = None
+        self.job_progress_dialog = None
+        self.job_worker = RecordingJobWorker()
+        self.job_worker_thread = QThread()
+        self.job_worker.moveToThread(self.job_worker_thread)
+        self.start_job_worker.connect(self.job_worker.run)
+        self.job_worker.job_progress.connect(self.report_job_progress)
+        self.job_worker.job_finished.connect(self.finish_job)
+        self.job_worker.job_failed.connect(self.report_job_failure)
+        self.job_worker_thread.start()
+
         # Server IP / port
         self.ip_le = None
         self.port_le = None
@@ -344,7 +378,26 @@ class MainWindow(QMainWindow):
                                                 ' for pysigview'),
                                            triggered=self.open_preferences,
                                            context=Qt.ApplicationShortcut)
-        self.tools_menu_actions = [preferences_action]
+        features_action = create_action(self, '&Extract features',
+                                        icon=None,
+                                        tip=('&Extract features from the'
+                                             ' whole recording'),
+                                        triggered=self.extract_features,
+                                        context=Qt.ApplicationShortcut)
+        detect_action = create_action(self, '&Detect events',
+                                      icon=None,
+                                      tip=('&Detect events in the'
+                                           ' whole recording'),
+                                      triggered=self.detect_events,
+                                      context=Qt.ApplicationShortcut)
+        render_action = create_action(self, '&Render annotations',
+                                      icon=None,
+                                      tip=('&Render pages of the active'
+                                           ' annotation set'),
+                                      triggered=self.render_annotations,
+                                      context=Qt.ApplicationShortcut)
+        self.tools_menu_actions = [preferences_action, features_action,
+                                   detect_action, render_action]
 
         # Help menu
         report_bug_action = create_action(self, '&Report bug',
@@ -478,17 +531,7 @@ class MainWindow(QMainWindow):
 
         self.statusBar().showMessage('Loading metadata')
         sm.ODS.load_metadata()
-        self.statusBar().showMessage('Loading annotatios')
-        # Try to get annotations
-        if getattr(self, "annotations", None) is not None:
-            if getattr(sm.ODS, "get_annotations", None) is not None:
-
-                ann_groups = sm.ODS.get_annotations()
-
-                if ann_groups is not None:
-                    for ann_group in ann_groups.items():
-                        self.annotations.add_annotation_set(ann_group[1],
-                                                            ann_group[0])
+        self.load_annotations()
 
         # Fork for buffer usage
         # if CONF.get('data_management', 'use_memory_buffer'):
@@ -502,6 +545,46 @@ class MainWindow(QMainWindow):
         self.add_path_to_title()
         self.sig_file_opened.emit()
 
+    def load_annotations(self):
+        """
+        Loads annotations from the original data source either directly or
+        in the annotations worker thread.
+        """
+
+        # Try to get annotations
+        if getattr(self, "annotations", None) is None:
+            return
+        if getattr(sm.ODS, "get_annotations", None) is None:
+            return
+
+        if CONF.get('annotations', 'load_in_background'):
+            self.statusBar().showMessage('Loading annotations in background')
+            self.start_annotations_worker.emit(sm.ODS)
+        else:
+            self.statusBar().showMessage('Loading annotations')
+            self.add_annotation_groups(sm.ODS, sm.ODS.get_annotations())
+
+    def add_annotation_groups(self, data_source, ann_groups):
+
+        # The data source was changed while the annotations were loading
+        if data_source is not sm.ODS:
+            return
+
+        if ann_groups is not None:
+            for ann_group in ann_groups.items():
+                self.annotations.add_annotation_set(ann_group[1],
+                                                    ann_group[0])
+
+        self.statusBar().showMessage('Annotations loaded', 2000)
+
+    def report_annotations_failure(self, data_source, message):
+
+        if data_source is not sm.ODS:
+            return
+
+        self.statusBar().clearMessage()
+        QMessageBox.critical(self, "Loading annotations failed", message)
+
     def reload_metadata(self):
 
         if not sm.ODS:
@@ -617,16 +700,7 @@ class MainWindow(QMainWindow):
 
         self.statusBar().showMessage('Loading metadata')
         sm.ODS.load_metadata()
-        self.statusBar().showMessage('Loading annotatios')
-        # Try to get annotations
-        if getattr(self, "annotations", None) is not None:
-            if getattr(sm.ODS, "get_annotations", None) is not None:
-
-                ann_groups = sm.ODS.get_annotations()
-
-                for ann_group in ann_groups.items():
-                    self.annotations.add_annotation_set(ann_group[1],
-                                                        ann_group[0])
+        self.load_annotations()
 
         # Fork for buffer usage
 
@@ -742,6 +816,145 @@ class MainWindow(QMainWindow):
 
     # ----- Tools menu actions
 
+    # ----- Whole recording jobs -----
+    def check_job_start(self):
+
+        if not self.source_opened:
+            QMessageBox.information(self, "No data source",
+                                    "Please open a data source first.")
+            return False
+
+        if self.recording_job is not None:
+            QMessageBox.information(self, "Job running",
+                                    "Previous job is still running.")
+            return False
+
+        return True
+
+    def extract_features(self):
+
+        if not self.check_job_start():
+            return
+
+        dialog = FeatureDialog(sm.ODS.data_map['channels'], self)
+        if not dialog.exec():
+            return
+        params = dialog.get_params()
+
+        job = FeatureExtractionJob(
+                chunk_span=CONF.get('batch_jobs', 'chunk_span'),
+                n_workers=CONF.get('batch_jobs', 'workers'),
+                **params)
+        self.start_recording_job(job, 'Extracting features',
+                                 self.show_job_output)
+
+    def show_job_output(self, path):
+        QMessageBox.information(self, "Job finished",
+                                "Output written to:\n" + str(path))
+
+    def detect_events(self):
+
+        if not self.check_job_start():
+            return
+
+        if getattr(self, "annotations", None) is None:
+            QMessageBox.information(self, "No annotations",
+                                    "Annotations plugin is not enabled.")
+            return
+
+        dialog = DetectorDialog(sm.ODS.data_map['channels'], self)
+        if not dialog.exec():
+            return
+        params = dialog.get_params()
+
+        job = EventDetectionJob(
+                chunk_span=CONF.get('batch_jobs', 'chunk_span'),
+                n_workers=CONF.get('batch_jobs', 'workers'),
+                **params)
+        self.start_recording_job(job, 'Detecting events',
+                                 lambda df: self.add_detected_events(
+                                         df, params['detector']))
+
+    def render_annotations(self):
+
+        if not self.check_job_start():
+            return
+
+        active_set = getattr(getattr(self, "annotations", None),
+                             "active_set", None)
+        if active_set is None or not len(active_set.df):
+            QMessageBox.information(self, "No annotation set selected",
+                                    "Please select an annotation set.")
+            return
+
+        out_dir = QFileDialog.getExistingDirectory(self, 'Output directory')
+        if not out_dir:
+            return
+
+        # Every visible container with its own chain and channel block
+        traces = traces_from_containers(
+                self.signal_display.get_plot_containers(),
+                sm.PDS.data_map['channels'])
+
+        job = BatchRenderer(sm.ODS.path, traces,
+                            getattr(sm.ODS, 'password', None),
+                            CONF.get('batch_jobs', 'workers'))
+        job.set_windows(windows_from_annotations(active_set.get_full_df()),
+                        out_dir)
+        self.start_recording_job(job, 'Rendering annotations',
+                                 lambda paths: self.show_job_output(
+                                         out_dir))
+
+    def add_detected_events(self, df, name):
+        self.annotations.add_annotation_set(df, name)
+        self.statusBar().showMessage('Detected {} events'.format(len(df)),
+                                     2000)
+
+    def start_recording_job(self, job, title, callback):
+        self.recording_job = job
+        self.recording_job_callback = callback
+
+        self.job_progress_dialog = QProgressDialog(title, 'Cancel', 0, 0,
+                                                   self)
+        self.job_progress_dialog.setWindowTitle(title)
+        self.job_progress_dialog.setMinimumDuration(0)
+        self.job_progress_dialog.canceled.connect(self.cancel_job)
+        self.job_progress_dialog.show()
+
+        self.start_job_worker.emit(job)
+
+    def cancel_job(self):
+        if self.recording_job is not None:
+            self.recording_job.interupt()
+            self.statusBar().showMessage('Cancelling job')
+
+    def report_job_progress(self, done, n_chunks):
+        if self.job_progress_dialog is not None:
+            self.job_progress_dialog.setMaximum(n_chunks)
+            self.job_progress_dialog.setValue(done)
+
+    def close_job(self):
+        self.recording_job = None
+        self.recording_job_callback = None
+        if self.job_progress_dialog is not None:
+            self.job_progress_dialog.canceled.disconnect(self.cancel_job)
+            self.job_progress_dialog.close()
+            self.job_progress_dialog = None
+
+    def finish_job(self, result):
+        callback = self.recording_job_callback
+        self.close_job()
+        if result is None:
+            self.statusBar().showMessage('Job cancelled', 2000)
+            return
+        self.statusBar().showMessage('Job finished', 2000)
+        callback(result)
+
+    def report_job_failure(self, message):
+        self.close_job()
+        self.statusBar().clearMessage()
+        QMessageBox.critical(self, "Job failed", message)
+
     def open_preferences(self):
         self.preferences_widget = Preferences(self)
 
@@ -951,6 +1164,11 @@ class MainWindow(QMainWindow):
             if not plugin.closing_plugin(cancelable):
                 return False
 
+        if self.recording_job is not None:
+            self.recording_job.interupt()
+        self.job_worker_thread.quit()
+        self.job_worker_thread.wait()
+
 #        self.dialog_manager.close_all()
 #        if self.toolbars_visible:
 #            self.save_visible_toolbars()
@@ -69,7 +69,12 @@ DEFAULTS = {'DEFAULTS': {'enable': True
                                'label_font_size': 12,
                                'antialiasing': 'min_max',
                                'init_crosshair_color': '#ffffffff',
-                               'init_marker_color': '#ffffffff'
+                               'init_marker_color': '#ffffffff',
+                               'transform_cache_size': 256,  # in MB
+                               'transform_workers': 4,
+                               'common_fsamp': False,
+                               'autoscale_percentile': 1,
+                               'autoscale_group': False
                                },
             'channels': {
                          },
@@ -81,22 +86,44 @@ DEFAULTS = {'DEFAULTS': {'enable': True
                                'discontinuity_color': '#ffff0044'
                                },
             'annotations': {'enable': True,
+                            'load_in_background': True,
+                            'file/lazy_loading': False,
                             'database/database': '',
                             'database/table': '',
                             'database/start_column': '',
                             'database/end_column': '',
                             'database/channel_column': '',
-                            'database/where_clause': ''},
+                            'database/where_clause': '',
+                            'database/stream': False,
+                            'database/tile_span': 60,  # in seconds
+                            'database/prefetch_tiles': 1,
+                            'database/max_tiles': 64,
+                            'database/chunksize': 10000,
+                            'database/upload_database': '',
+                            'database/upload_table': '',
+                            'database/upload_start_column': '',
+                            'database/upload_end_column': '',
+                            'database/upload_channel_column': '',
+                            'database/batch_size': 1000,
+                            'database/upsert': False},
             'database': {'enable': True,
                          'host': '',
                          'port': '',
                          'username': ''
                          },
             'transforms': {'enable': True,
+                           'max_margin': 10,  # in seconds
+                           'fft_workers': -1,
+                           'preview_delay': 150  # in milliseconds
                            },
             'measurement': {'enable': True,
                             'bgcolor': '#606060ff',
-                            'axis_color': '#ffffffff'},
+                            'axis_color': '#ffffffff',
+                            'spectrum_window': 'hann'},
+            'batch_jobs': {'enable': True,
+                           'chunk_span': 60,  # in seconds
+                           'workers': 4
+                           },
             'shortcuts': {
                           },
             }
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Time-windowed reading of annotations from database and files
+
+Ing.,Mgr. (MSc.) Jan Cimbálník, PhD.
+Biomedical engineering
+International Clinical Research Center
+St. Anne's University Hospital in Brno
+Czech Republic
+&
+Mayo systems electrophysiology lab
+Mayo Clinic
+200 1st St SW
+Rochester, MN
+United States
+"""
+
+# Std imports
+from collections import OrderedDict
+from threading import Lock
+
+# Third pary imports
+import numpy as np
+import pandas as pd
+from pandas import DataFrame, read_sql
+from sqlalchemy import text
+
+# Local imports
+
+
+class AnnotationTileCache:
+    """
+    LRU cache of annotations split into time tiles.
+
+    A tile holds annotations overlapping its time span, so annotations
+    running into the viewed window from before are loaded as well.
+    Annotations spanning several cached tiles are output once. Subclasses
+    implement read_tile which pulls a single tile from the storage.
+    """
+
+    def __init__(self, tile_span=60e6, max_tiles=64):
+
+        self.tile_span = int(tile_span)
+        self.max_tiles = max_tiles
+
+        self._tiles = OrderedDict()
+        self._pending = set()
+        self._window_idxs = set()
+        self._lock = Lock()
+
+        # Message of failed read, no tiles are requested until cleared
+        self.error = None
+
+    def __len__(self):
+        return len(self._tiles)
+
+    # ----- Tiles -----
+    def get_tile_idxs(self, uutc_ss, margin=0):
+        first = int(uutc_ss[0] // self.tile_span) - margin
+        last = int((uutc_ss[1] - 1) // self.tile_span) + margin
+        return list(range(first, last + 1))
+
+    def get_missing_tiles(self, uutc_ss, margin=0):
+        """
+        Returns tiles that are neither cached nor being loaded and marks them
+        as pending. Cached tiles of the window become most recently used.
+        """
+
+        tile_idxs = self.get_tile_idxs(uutc_ss, margin)
+
+        with self._lock:
+            self._window_idxs = set(tile_idxs)
+            for x in tile_idxs:
+                if x in self._tiles:
+                    self._tiles.move_to_end(x)
+            if self.error is not None:
+                return []
+            missing = [x for x in tile_idxs
+                       if x not in self._tiles and x not in self._pending]
+            self._pending.update(missing)
+
+        return missing
+
+    def put_tile(self, tile_idx, df):
+        with self._lock:
+            self._tiles[tile_idx] = df
+            self._tiles.move_to_end(tile_idx)
+
+            # Evict least recently used tiles outside the viewed window
+            for idx in list(self._tiles.keys()):
+                if len(self._tiles) <= self.max_tiles:
+                    break
+                if idx in self._window_idxs:
+                    continue
+                self._tiles.pop(idx)
+
+    def clear(self):
+        with self._lock:
+            self._tiles.clear()
+            self._pending.clear()
+            self.error = None
+
+    # ----- Reading -----
+    def get_tile_ss(self, tile_idx):
+        return [tile_idx * self.tile_span, (tile_idx + 1) * self.tile_span]
+
+    def read_tile(self, tile_idx):
+        raise NotImplementedError
+
+    def read_all(self):
+        """
+        Reads all annotations from the storage bypassing the cache.
+        """
+        raise NotImplementedError
+
+    def fetch_tiles(self, tile_idxs):
+        """
+        Reads the tiles and stores them in the cache. A failed read stops
+        further requests until the cache is cleared.
+        """
+
+        try:
+            for tile_idx in tile_idxs:
+                self.put_tile(tile_idx, self.read_tile(tile_idx))
+        except Exception as e:
+            with self._lock:
+                self.error = str(e)
+            raise
+        finally:
+            with self._lock:
+                self._pending.difference_update(tile_idxs)
+
+    # ----- Output -----
+    def get_dataframe(self):
+        """
+        Returns all cached annotations ordered by time. An annotation
+        overlapping several cached tiles is taken from the first of them.
+        """
+
+        with self._lock:
+            tiles = [(x, self._tiles[x]) for x in sorted(self._tiles.keys())]
+
+        cached_idxs = np.array([x[0] for x in tiles])
+        dfs = []
+        for tile_idx, df in tiles:
+            if not len(df):
+                continue
+
+            # Skip annotations already held by a cached tile before this one
+            start_idxs = (df['start_time'].values // self.tile_span)
+            n_before = (np.searchsorted(cached_idxs, tile_idx)
+                        - np.searchsorted(cached_idxs, start_idxs))
+            dfs.append(df[n_before <= 0])
+
+        dfs = [x for x in dfs if len(x)]
+        if not len(dfs):
+            return DataFrame(columns=('start_time', 'end_time', 'channel'))
+
+        return pd.concat(dfs, ignore_index=True)
+
+
+class DatabaseTileCache(AnnotationTileCache):
+    """
+    Tile cache reading annotations from database table.
+
+    Tiles are read with parameterised overlap queries on the start and end
+    columns so only annotations around the viewed window are pulled from
+    the database.
+    Each read uses a connection from the engine pool so that the cache can
+    be filled from a worker thread.
+    """
+
+    def __init__(self, engine, table, start_col, end_col=None,
+                 channel_col=None, where_clause=None, tile_span=60e6,
+                 max_tiles=64, chunksize=10000):
+        super().__init__(tile_span, max_tiles)
+
+        self.engine = engine
+        self.table = table
+        self.start_col = start_col
+        self.end_col = end_col
+        self.channel_col = channel_col
+        self.where_clause = where_clause
+        self.chunksize = chunksize
+
+    def build_query(self, ranged=True):
+        query = 'SELECT * FROM {} WHERE '.format(self.table)
+        conditions = []
+        if ranged:
+            # NULL end is a one point annotation ending at its start
+            end = self.start_col
+            if self.end_col:
+                end = 'COALESCE({}, {})'.format(self.end_col, self.start_col)
+            conditions.append('{} < :tile_stop AND {} >= :tile_start'.format(
+                    self.start_col, end))
+        if self.where_clause:
+            conditions.append('(' + self.where_clause + ')')
+        if not conditions:
+            conditions.append('1 = 1')
+
+        return text(query + ' AND '.join(conditions))
+
+    def read_query(self, query, params=None):
+        with self.engine.connect() as conn:
+            chunks = read_sql(query, conn, params=params,
+                              chunksize=self.chunksize)
+            chunks = [x for x in chunks if len(x)]
+
+        if len(chunks):
+            df = pd.concat(chunks, ignore_index=True)
+        else:
+            df = DataFrame(columns=[self.start_col])
+
+        return self.rename_columns(df)
+
+    def read_tile(self, tile_idx):
+        tile_ss = self.get_tile_ss(tile_idx)
+        params = {'tile_start': tile_ss[0],
+                  'tile_stop': tile_ss[1]}
+
+        return self.read_query(self.build_query(), params)
+
+    def read_all(self):
+        return self.read_query(self.build_query(ranged=False))
+
+    def rename_columns(self, df):
+        rename_dict = {self.start_col: 'start_time'}
+        if self.end_col:
+            rename_dict[self.end_col] = 'end_time'
+        if self.channel_col:
+            rename_dict[self.channel_col] = 'channel'
+        df = df.rename(columns=rename_dict)
+
+        # This only a one point annotation
+        if not self.end_col:
+            df['end_time'] = np.nan
+        if not self.channel_col:
+            df['channel'] = np.nan
+
+        return df
+
+
+class FileTileCache(AnnotationTileCache):
+    """
+    Tile cache reading annotations from file through annotation format
+    handler which pushes the time range down to the reader.
+    """
+
+    def __init__(self, file_handler, tile_span=60e6, max_tiles=64):
+        super().__init__(tile_span, max_tiles)
+
+        # Formats without pushdown (i.e. CSV) would scan the whole file for
+        # each tile
+        if not file_handler.pushdown:
+            raise ValueError(file_handler.name + ' does not support reading '
+                             'time ranges')
+
+        self.file_handler = file_handler
+
+    def read_tile(self, tile_idx):
+        return self.file_handler.read(self.get_tile_ss(tile_idx))
+
+    def read_all(self):
+        return self.file_handler.read()
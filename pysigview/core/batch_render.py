@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Headless batch rendering of signal windows to PNG / PDF pages
+
+Ing.,Mgr. (MSc.) Jan Cimbálník, PhD.
+Biomedical engineering
+International Clinical Research Center
+St. Anne's University Hospital in Brno
+Czech Republic
+&
+Mayo systems electrophysiology lab
+Mayo Clinic
+200 1st St SW
+Rochester, MN
+United States
+"""
+
+# Std imports
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+from datetime import datetime
+
+# Third pary imports
+import numpy as np
+
+# Local imports
+from pysigview.core import source_manager as sm
+from pysigview.core.source_manager import DataMap
+from pysigview.core.file_formats.formats import extension_evaluator
+from pysigview.core.transform_pipeline import chain_to_spec, spec_to_chain
+from pysigview.core.visual_container import SignalContainer, robust_range
+
+
+# ----- Worker process -----
+def init_render_worker(path, password=None):
+    """
+    Opens the recording once in each worker process.
+    """
+
+    sm.ODS, _ = extension_evaluator(path)
+    if password is not None:
+        sm.ODS.password = password
+    sm.ODS.load_metadata()
+
+
+def read_window(channels, uutc_ss):
+    """
+    Reads channels in uutc_ss from the recording opened in the process.
+
+    Returns:
+    --------
+    Dictionary {channel: (fsamp, unit, ufact, data)}
+    """
+
+    dm = DataMap()
+    dm.setup_data_map(sm.ODS.data_map._map)
+    dm.reset_data_map()
+    dm.set_data_map(channels, [uutc_ss] * len(channels))
+
+    data = sm.ODS.get_data(dm)
+
+    signals = {}
+    for ch in channels:
+        pos = np.where(sm.ODS.data_map['channels'] == ch)[0][0]
+        entry = sm.ODS.data_map[pos]
+        signals[ch] = (entry['fsamp'], entry['unit'], entry['ufact'],
+                       np.asarray(data[pos], 'float64'))
+
+    return signals
+
+
+def create_trace_container(trace):
+    """
+    Signal container of the trace channel with the trace transform chain.
+    """
+
+    pos = np.where(sm.ODS.data_map['channels'] == trace['channel'])[0][0]
+    entry = sm.ODS.data_map[pos]
+
+    pc = SignalContainer(trace['channel'])
+    pc.fsamp = entry['fsamp']
+    pc.ufact = entry['ufact']
+    pc.unit = entry['unit']
+    pc.N = None
+    if trace['chain'] is not None:
+        pc.transform_chain = spec_to_chain(trace['chain'])
+
+    return pc
+
+
+def get_trace_data(trace, uutc_ss):
+    """
+    Reads trace channels with the margins of its transform chain and sets
+    them to the container the way the display does, i.e. montages get the
+    block of all the channels the container reads and the margins are cut
+    after the chain.
+    """
+
+    pc = create_trace_container(trace)
+
+    margin = pc.get_margin()
+    margin_uutc = int(np.ceil(margin / pc.fsamp * 1e6))
+    signals = read_window(trace['channels'], [uutc_ss[0] - margin_uutc,
+                                              uutc_ss[1] + margin_uutc])
+
+    # Samples read on each side of the window
+    margin = int(round(margin_uutc / 1e6 * pc.fsamp))
+
+    rows = [signals[ch][3] for ch in trace['channels']]
+    n = min([len(x) for x in rows])
+    if n <= 2 * margin:
+        return np.array([], 'float64')
+
+    pc.set_data(np.vstack([x[:n] for x in rows]), (margin, margin))
+
+    return np.atleast_1d(np.squeeze(pc.data)) * pc.ufact
+
+
+def render_page(page):
+    """
+    Renders one window into a file with matplotlib Agg canvas, no display
+    is needed. Runs in worker processes.
+
+    Parameters:
+    -----------
+    page - dictionary with traces, uutc_ss, path, title, size (inches),
+           dpi, percentile and line_color
+
+    Returns:
+    --------
+    path of the written file
+    """
+
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    fig = Figure(figsize=page['size'], dpi=page['dpi'])
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(111)
+
+    n = len(page['traces'])
+    span = (page['uutc_ss'][1] - page['uutc_ss'][0]) / 1e6
+    for i, trace in enumerate(page['traces']):
+        data = get_trace_data(trace, page['uutc_ss'])
+
+        # Each trace is scaled into its row by robust range
+        low, high = robust_range(data, page['percentile'])
+        amp_span = high - low
+        if not np.isfinite(amp_span) or amp_span == 0:
+            amp_span = 1
+        y = (data - (low + high) / 2) / amp_span + (n - i - 1)
+
+        t = np.linspace(0, span, len(data), endpoint=False)
+        ax.plot(t, y, color=page['line_color'], linewidth=0.5)
+
+    ax.set_yticks(np.arange(n))
+    ax.set_yticklabels([x['name'] for x in page['traces']][::-1])
+    ax.set_xlim(0, span)
+    ax.set_ylim(-1, n)
+    ax.set_xlabel('Time [s]')
+    ax.set_title(page['title'])
+
+    fig.savefig(page['path'])
+
+    return page['path']
+
+
+# ----- Renderer -----
+def windows_from_annotations(df, pre=1., post=1.):
+    """
+    Returns windows (uutc_ss) around annotations with pre and post seconds
+    of context. One point annotations (NaN end_time) end at their start.
+    """
+
+    end_times = df['end_time'].fillna(df['start_time'])
+    starts = df['start_time'].values.astype('int64') - int(pre * 1e6)
+    stops = end_times.values.astype('int64') + int(post * 1e6)
+    return [[int(a), int(b)] for a, b in zip(starts, stops)]
+
+
+def create_trace(channel, chain=None, channels=None, name=None):
+    """
+    Returns trace specification of one plotted channel.
+
+    Parameters:
+    -----------
+    channel - plotted channel
+    chain - transform chain (optional)
+    channels - channels of the data block the chain reads, in the block
+               order (montages), default [channel]
+    name - trace label, default channel
+    """
+
+    return {'name': channel if name is None else name,
+            'channel': channel,
+            'channels': [channel] if channels is None else list(channels),
+            'chain': chain_to_spec(chain) if chain else None}
+
+
+def traces_from_containers(pcs, channels):
+    """
+    Returns trace specifications of signal containers. Channels are names
+    of the source channels indexed by data_array_pos.
+    """
+
+    return [create_trace(pc.orig_channel, pc.transform_chain,
+                         [channels[x] for x in pc.data_array_pos], pc.name)
+            for pc in pcs]
+
+
+class BatchRenderer:
+    """
+    Renders list of time windows of a recording to PNG or PDF pages in a
+    process pool. Each worker opens the recording itself so the renderer
+    does not need the GUI or a display server.
+
+    Traces are specifications created by create_trace or
+    traces_from_containers.
+    """
+
+    def __init__(self, path, traces, password=None, n_workers=4, fmt='png',
+                 size=(11.69, 8.27), dpi=100, percentile=1,
+                 line_color='black'):
+
+        self.path = path
+        self.traces = list(traces)
+        self.password = password
+        self.n_workers = max(int(n_workers), 1)
+        self.fmt = fmt
+        self.size = tuple(size)
+        self.dpi = dpi
+        self.percentile = percentile
+        self.line_color = line_color
+
+        self.windows = []
+        self.out_dir = None
+
+        self._interupt_flag = False
+
+    def interupt(self):
+        self._interupt_flag = True
+
+    def set_windows(self, windows, out_dir):
+        self.windows = [list(x) for x in windows]
+        self.out_dir = out_dir
+
+    def get_pages(self):
+        pages = []
+        for i, uutc_ss in enumerate(self.windows):
+            start = datetime.utcfromtimestamp(uutc_ss[0] / 1e6)
+            path = os.path.join(self.out_dir,
+                                'page_{:05d}.{}'.format(i, self.fmt))
+            pages.append({'traces': self.traces,
+                          'uutc_ss': uutc_ss,
+                          'path': path,
+                          'title': start.strftime('%Y-%m-%d %H:%M:%S.%f'),
+                          'size': self.size,
+                          'dpi': self.dpi,
+                          'percentile': self.percentile,
+                          'line_color': self.line_color})
+        return pages
+
+    def run(self, progress_callback=None):
+        """
+        Renders the windows set by set_windows, returns list of written
+        paths or None if interrupted.
+        """
+
+        self._interupt_flag = False
+
+        os.makedirs(self.out_dir, exist_ok=True)
+        pages = self.get_pages()
+
+        paths = []
+        # Started from the GUI too, spawned workers do not inherit its
+        # threads, init_render_worker opens the recording
+        mp_context = multiprocessing.get_context('spawn')
+        executor = ProcessPoolExecutor(self.n_workers, mp_context=mp_context,
+                                       initializer=init_render_worker,
+                                       initargs=(self.path, self.password))
+        try:
+            futures = [executor.submit(render_page, x) for x in pages]
+            for future in as_completed(futures):
+                if self._interupt_flag:
+                    return None
+                paths.append(future.result())
+                if progress_callback is not None:
+                    progress_callback(len(paths), len(pages))
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+        return sorted(paths)
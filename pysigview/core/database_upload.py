@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Batched upload of annotations to a database
+
+Ing.,Mgr. (MSc.) Jan Cimbálník, PhD.
+Biomedical engineering
+International Clinical Research Center
+St. Anne's University Hospital in Brno
+Czech Republic
+&
+Mayo systems electrophysiology lab
+Mayo Clinic
+200 1st St SW
+Rochester, MN
+United States
+"""
+
+# Std imports
+
+# Third pary imports
+import sqlalchemy as sqla
+
+# Local imports
+
+
+class AnnotationUploader:
+    """
+    Writes annotation DataFrame into database table in batches.
+
+    Each batch is sent as one executemany insert inside its own
+    transaction. In upsert mode the rows with the same (start, channel)
+    key are deleted in the same transaction before the insert, so
+    re-uploading a set only replaces the matching annotations. Rows of the
+    DataFrame with duplicate keys are dropped first (the last one is kept)
+    so that a key deleted by one batch is not inserted twice. The
+    uploader only needs an SQLAlchemy engine so it runs the same way
+    against a server or a local SQLite file.
+    """
+
+    def __init__(self, engine, table, start_col, end_col=None,
+                 channel_col=None, schema=None, batch_size=1000,
+                 upsert=False):
+
+        self.engine = engine
+        self.table_name = table
+        self.start_col = start_col
+        self.end_col = end_col
+        self.channel_col = channel_col
+        self.schema = schema if schema else None
+        self.batch_size = max(int(batch_size), 1)
+        self.upsert = upsert
+
+        self._interupt_flag = False
+
+    def interupt(self):
+        self._interupt_flag = True
+
+    # ----- Preparation -----
+    def rename_columns(self, df):
+        rename_dict = {'start_time': self.start_col}
+        if self.end_col:
+            rename_dict['end_time'] = self.end_col
+        if self.channel_col:
+            rename_dict['channel'] = self.channel_col
+
+        return df.rename(columns=rename_dict)
+
+    def get_table(self, df):
+        """
+        Reflects the target table, creates it from the DataFrame dtypes when
+        it does not exist.
+        """
+
+        insp = sqla.inspect(self.engine)
+        if not insp.has_table(self.table_name, schema=self.schema):
+            df.iloc[:0].to_sql(self.table_name, self.engine,
+                               schema=self.schema, index=False)
+
+        return sqla.Table(self.table_name, sqla.MetaData(),
+                          schema=self.schema, autoload_with=self.engine)
+
+    def get_records(self, df, columns):
+        """
+        Converts DataFrame to list of dicts with NaNs replaced by None.
+        """
+
+        df = df[columns].astype(object)
+        df = df.where(df.notnull(), None)
+
+        values = df.values.tolist()
+        return [dict(zip(columns, row)) for row in values]
+
+    # ----- Statements -----
+    def get_key_columns(self, table):
+        key_cols = [self.start_col]
+        if self.channel_col and self.channel_col in table.c:
+            key_cols.append(self.channel_col)
+        return key_cols
+
+    def get_delete_statement(self, table, key_cols):
+        # NULL channels have to match as well
+        clauses = []
+        for col in key_cols:
+            key = sqla.bindparam('_key_' + col)
+            clauses.append(table.c[col].is_not_distinct_from(key))
+
+        return table.delete().where(sqla.and_(*clauses))
+
+    # ----- Upload -----
+    def upload(self, df, progress_callback=None):
+        """
+        Uploads the DataFrame and returns the number of written rows.
+        Interuption stops the upload after the current batch.
+        """
+
+        if not self.start_col or 'start_time' not in df.columns:
+            raise ValueError('Annotation start column has to be specified')
+
+        df = self.rename_columns(df)
+        table = self.get_table(df)
+
+        insert_stmt = table.insert()
+        if self.upsert:
+            key_cols = self.get_key_columns(table)
+            delete_stmt = self.get_delete_statement(table, key_cols)
+            df = df.drop_duplicates(subset=[col for col in key_cols
+                                            if col in df.columns],
+                                    keep='last')
+
+        columns = [col for col in df.columns if col in table.c]
+        records = self.get_records(df, columns)
+        n_records = len(records)
+
+        written = 0
+        for start in range(0, n_records, self.batch_size):
+            if self._interupt_flag:
+                break
+
+            batch = records[start:start + self.batch_size]
+
+            with self.engine.begin() as conn:
+                if self.upsert:
+                    keys = [{'_key_' + col: rec[col] for col in key_cols}
+                            for rec in batch]
+                    conn.execute(delete_stmt, keys)
+                conn.execute(insert_stmt, batch)
+
+            written += len(batch)
+            if progress_callback is not None:
+                progress_callback(written, n_records)
+
+        return written
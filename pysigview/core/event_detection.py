@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Threshold based event detection over the whole recording
+
+Ing.,Mgr. (MSc.) Jan Cimbálník, PhD.
+Biomedical engineering
+International Clinical Research Center
+St. Anne's University Hospital in Brno
+Czech Republic
+&
+Mayo systems electrophysiology lab
+Mayo Clinic
+200 1st St SW
+Rochester, MN
+United States
+"""
+
+# Std imports
+from functools import lru_cache
+
+# Third pary imports
+import numpy as np
+from pandas import DataFrame
+from scipy.signal import butter, sosfiltfilt, hilbert
+
+# Local imports
+from pysigview.core.recording_jobs import ChunkedRecordingJob
+
+
+# ----- Intervals -----
+def mask_to_intervals(mask, min_len=1):
+    """
+    Converts boolean mask (channels x samples) to intervals of True values.
+
+    Returns:
+    --------
+    row, start, stop arrays, stop is exclusive
+    """
+
+    pad = np.zeros((mask.shape[0], 1), 'int8')
+    edges = np.diff(np.hstack([pad, mask.astype('int8'), pad]), axis=1)
+
+    # Row-major order keeps starts and stops of each row aligned
+    rows, starts = np.nonzero(edges == 1)
+    _, stops = np.nonzero(edges == -1)
+
+    keep = (stops - starts) >= min_len
+    return rows[keep], starts[keep], stops[keep]
+
+
+def interval_union(channels, starts, stops, gap=0):
+    """
+    Merges overlapping intervals (or closer than gap) of the same channel.
+
+    Parameters:
+    -----------
+    channels - integer channel codes
+    starts, stops - interval bounds
+    gap - intervals closer than gap are merged
+
+    Returns:
+    --------
+    channels, starts, stops of merged intervals sorted by channel and start
+    """
+
+    channels = np.asarray(channels)
+    starts = np.asarray(starts)
+    stops = np.asarray(stops)
+    if not len(starts):
+        return channels, starts, stops
+
+    order = np.lexsort((starts, channels))
+    channels, starts, stops = channels[order], starts[order], stops[order]
+
+    # Shift channels apart on one axis so that a single running maximum
+    # does not leak between channels
+    origin = starts.min()
+    span = stops.max() - origin + gap + 1
+    offset = (channels - channels.min()) * span
+    run_max = np.maximum.accumulate(stops - origin + offset)
+
+    new = np.ones(len(starts), bool)
+    new[1:] = (starts[1:] - origin + offset[1:]) > run_max[:-1] + gap
+    first = np.nonzero(new)[0]
+
+    return (channels[first], starts[first],
+            np.maximum.reduceat(stops, first))
+
+
+# ----- Detectors -----
+# Functions take block (channels x samples), return boolean mask of the
+# same shape
+
+def robust_sd(x):
+    return np.nanmedian(np.abs(x), axis=-1, keepdims=True) / 0.6745
+
+
+def amplitude_detector(block, fsamp, params):
+    x = block - np.nanmedian(block, axis=-1, keepdims=True)
+    return np.nan_to_num(np.abs(x)) > params['threshold'] * robust_sd(x)
+
+
+def line_length_detector(block, fsamp, params):
+    win = max(int(round(params['window'] * fsamp)), 1)
+    ll = np.abs(np.diff(block, axis=-1, prepend=block[:, :1]))
+    ll = np.nan_to_num(ll)
+
+    # Centered moving sum by cumulative sum
+    csum = np.cumsum(np.pad(ll, ((0, 0), (win // 2 + 1, win - win // 2)),
+                            mode='edge'), axis=-1)
+    ll = csum[:, win:win + block.shape[-1]] - csum[:, :block.shape[-1]]
+
+    med = np.median(ll, axis=-1, keepdims=True)
+    return ll > med + params['threshold'] * robust_sd(ll - med)
+
+
+@lru_cache(maxsize=32)
+def get_band_sos(fsamp, low, high, poles=4):
+    """
+    Returns cached band pass design, the array must not be modified.
+    """
+
+    sos = butter(poles, [low / (fsamp / 2), high / (fsamp / 2)], 'bandpass',
+                 output='sos')
+    sos.flags.writeable = False
+
+    return sos
+
+
+def hfo_detector(block, fsamp, params):
+    low, high = params['band']
+    if high >= fsamp / 2:
+        return np.zeros(block.shape, bool)
+
+    sos = get_band_sos(float(fsamp), float(low), float(high))
+    filt = sosfiltfilt(sos, np.nan_to_num(block), axis=-1)
+    env = np.abs(hilbert(filt, axis=-1))
+
+    med = np.median(env, axis=-1, keepdims=True)
+    return env > med + params['threshold'] * robust_sd(env - med)
+
+
+DETECTORS = {'amplitude': amplitude_detector,
+             'line_length': line_length_detector,
+             'hfo': hfo_detector}
+
+
+def detect_events(block, fsamp, detector, params):
+    """
+    Runs detector on block. Runs in worker processes.
+
+    Parameters:
+    -----------
+    block - 2-D array (channels x samples)
+    fsamp - sampling frequency
+    detector - detector name (key of DETECTORS)
+    params - dictionary of detector parameters
+
+    Returns:
+    --------
+    row, start, stop sample arrays
+    """
+
+    mask = DETECTORS[detector](block, fsamp, params)
+    min_len = max(int(round(params.get('min_duration', 0) * fsamp)), 1)
+
+    return mask_to_intervals(mask, min_len)
+
+
+# ----- Job -----
+class EventDetectionJob(ChunkedRecordingJob):
+    """
+    Detects events in the whole recording. Chunks are read with margin for
+    filter transients and overlap for events crossing chunk boundaries,
+    events touching the core of the chunk are kept and duplicates from
+    neighbouring chunks are merged by interval union. Thresholds adapt per
+    chunk.
+
+    The result is a DataFrame with start_time, end_time and channel columns.
+    """
+
+    def __init__(self, channels, detector, params, chunk_span=60,
+                 n_workers=4):
+
+        if detector == 'hfo':
+            margin = 10 / params['band'][0]
+        else:
+            margin = params.get('window', 0)
+        overlap = max(params.get('max_duration', 1), margin)
+
+        super().__init__(channels, chunk_span, overlap, n_workers, margin)
+
+        self.detector = detector
+        self.params = params
+
+        self._codes = dict([(ch, i) for i, ch in enumerate(self.channels)])
+        self._events = []
+
+    def prepare(self, chunks):
+        self._events = []
+
+    def submit_chunk(self, executor, chunk, blocks):
+
+        tasks = []
+        for fsamp, (channels, block) in blocks.items():
+            future = executor.submit(detect_events, block, fsamp,
+                                     self.detector, self.params)
+            tasks.append(((channels, fsamp), future))
+
+        return tasks
+
+    def collect_chunk(self, chunk, results):
+        for (channels, fsamp), (rows, starts, stops) in results:
+            codes = np.array([self._codes[ch] for ch in channels])[rows]
+            starts = chunk[0] + starts * 1e6 / fsamp
+            stops = chunk[0] + stops * 1e6 / fsamp
+
+            keep = (stops > chunk[1]) & (starts < chunk[2])
+            self._events.append((codes[keep], starts[keep], stops[keep]))
+
+    def finish(self, completed):
+        events = self._events
+        self._events = []
+
+        if not completed:
+            return None
+
+        if events:
+            codes, starts, stops = [np.concatenate(x) for x in zip(*events)]
+        else:
+            codes, starts, stops = np.array([], int), [], []
+
+        gap = self.params.get('merge_gap', 0) * 1e6
+        codes, starts, stops = interval_union(codes, starts, stops, gap)
+
+        df = DataFrame({'start_time': np.asarray(starts, 'int64'),
+                        'end_time': np.asarray(stops, 'int64'),
+                        'channel': np.array(self.channels,
+                                            dtype=object)[codes]})
+
+        return df.sort_values('start_time').reset_index(drop=True)
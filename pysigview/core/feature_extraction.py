@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Whole recording feature extraction
+
+Ing.,Mgr. (MSc.) Jan Cimbálník, PhD.
+Biomedical engineering
+International Clinical Research Center
+St. Anne's University Hospital in Brno
+Czech Republic
+&
+Mayo systems electrophysiology lab
+Mayo Clinic
+200 1st St SW
+Rochester, MN
+United States
+"""
+
+# Std imports
+import json
+
+# Third pary imports
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from numpy.lib.format import open_memmap
+import h5py
+
+# Local imports
+from pysigview.core.recording_jobs import ChunkedRecordingJob
+
+
+# ----- Features -----
+# Functions take windows (channels x windows x samples), return
+# (channels x windows)
+def line_length(windows, fsamp, band):
+    return np.nanmean(np.abs(np.diff(windows, axis=-1)), axis=-1)
+
+
+def rms(windows, fsamp, band):
+    return np.sqrt(np.nanmean(windows**2, axis=-1))
+
+
+def band_power(windows, fsamp, band):
+    n = windows.shape[-1]
+    windows = np.nan_to_num(windows - np.nanmean(windows, axis=-1,
+                                                 keepdims=True))
+    spec = np.abs(np.fft.rfft(windows, axis=-1))**2
+    freqs = np.fft.rfftfreq(n, 1 / fsamp)
+    f_mask = (freqs >= band[0]) & (freqs <= band[1])
+    return 2 * spec[..., f_mask].sum(axis=-1) / (fsamp * n)
+
+
+def kurtosis(windows, fsamp, band):
+    dev = windows - np.nanmean(windows, axis=-1, keepdims=True)
+    m2 = np.nanmean(dev**2, axis=-1)
+    m4 = np.nanmean(dev**4, axis=-1)
+    m2[m2 == 0] = np.nan
+    return m4 / m2**2 - 3
+
+
+FEATURES = {'line_length': line_length,
+            'rms': rms,
+            'band_power': band_power,
+            'kurtosis': kurtosis}
+
+
+def extract_features(block, fsamp, window, step, n_windows, features,
+                     band=None):
+    """
+    Computes features in n_windows windows of block. Runs in worker
+    processes.
+
+    Parameters:
+    -----------
+    block - 2-D array (channels x samples)
+    fsamp - sampling frequency
+    window - window length in seconds
+    step - window step in seconds
+    n_windows - number of windows starting at the beginning of block
+    features - list of feature names (keys of FEATURES)
+    band - (low, high) frequency for band power
+
+    Returns:
+    --------
+    Dictionary {feature: array (channels x n_windows)}
+    """
+
+    win = max(int(round(window * fsamp)), 2)
+    win_step = max(int(round(step * fsamp)), 1)
+
+    # Pad missing end of the recording with NaNs
+    n_samp = (n_windows - 1) * win_step + win
+    if block.shape[-1] < n_samp:
+        pad = np.full((block.shape[0], n_samp - block.shape[-1]), np.nan)
+        block = np.hstack([block, pad])
+
+    windows = sliding_window_view(block, win, axis=-1)[:, ::win_step]
+    windows = windows[:, :n_windows]
+
+    return dict([(f, FEATURES[f](windows, fsamp, band).astype('float32'))
+                 for f in features])
+
+
+# ----- Job -----
+class FeatureExtractionJob(ChunkedRecordingJob):
+    """
+    Extracts windowed features from the whole recording and writes them to
+    a sidecar file. HDF5 files (.h5) use the SignalPlant layout so they can
+    be opened in pysigview and shown as channels, other paths are written
+    as NumPy memmap (.npy) with JSON header.
+    """
+
+    def __init__(self, channels, path, features, window=1., step=0.5,
+                 band=(4, 30), chunk_span=60, n_workers=4):
+
+        # Chunk span aligned to window step
+        chunk_span = max(int(chunk_span / step), 1) * step
+
+        super().__init__(channels, chunk_span, max(window - step, 0),
+                         n_workers)
+
+        self.path = path
+        self.features = list(features)
+        self.window = window
+        self.step = step
+        self.band = band
+
+        self._out = None
+        self._hf = None
+        self._rows = {}
+
+    def get_n_windows(self, start, stop):
+        if stop - start < self.window * 1e6:
+            return 1
+        return int((stop - start) / 1e6 // self.step) + 1
+
+    def get_signal_names(self):
+        return [ch + '_' + f for f in self.features for ch in self.channels]
+
+    def prepare(self, chunks):
+
+        start, stop = self.get_uutc_ss()
+        n_windows = self.get_n_windows(start, stop - self.window * 1e6)
+        names = self.get_signal_names()
+        shape = (len(names), n_windows)
+
+        for fi, f in enumerate(self.features):
+            for ci, ch in enumerate(self.channels):
+                self._rows[(f, ch)] = fi * len(self.channels) + ci
+
+        if self.path.endswith('.h5'):
+            self._hf = h5py.File(self.path, 'w')
+            self._out = self._hf.create_dataset(
+                    'Data', shape, 'float32', fillvalue=np.nan,
+                    chunks=(len(names), min(n_windows, 4096)))
+            info = np.array([(x.encode(), b'feature', b'')
+                             for x in names],
+                            dtype=[('name', 'S128'), ('type', 'S16'),
+                                   ('unit', 'S16')])
+            self._hf.create_dataset('Info', data=info)
+            self._hf.attrs['Fs'] = 1 / self.step
+            self._hf.attrs['time_info'] = start / 1e6
+        else:
+            self._out = open_memmap(self.path, 'w+', 'float32', shape)
+            self._out[:] = np.nan
+            header = {'signals': names,
+                      'fsamp': 1 / self.step,
+                      'window': self.window,
+                      'start_time': int(start)}
+            with open(self.path + '.json', 'w') as fid:
+                json.dump(header, fid)
+
+    def submit_chunk(self, executor, chunk, blocks):
+
+        start = self.get_uutc_ss()[0]
+        first = int(round((chunk[1] - start) / 1e6 / self.step))
+        n_windows = min(int(round((chunk[2] - chunk[1]) / 1e6 / self.step)),
+                        self._out.shape[1] - first)
+        if n_windows < 1:
+            return []
+
+        tasks = []
+        for fsamp, (channels, block) in blocks.items():
+            future = executor.submit(extract_features, block, fsamp,
+                                     self.window, self.step, n_windows,
+                                     self.features, self.band)
+            tasks.append(((channels, first), future))
+
+        return tasks
+
+    def collect_chunk(self, chunk, results):
+        for (channels, first), result in results:
+            for f, values in result.items():
+                for ch, row in zip(channels, values):
+                    self._out[self._rows[(f, ch)],
+                              first:first + len(row)] = row
+
+    def finish(self, completed):
+        if self._hf is not None:
+            self._hf.close()
+            self._hf = None
+        elif self._out is not None:
+            self._out.flush()
+        self._out = None
+
+        return self.path if completed else None
@@ -92,18 +92,18 @@ class dHandler(FileDataSource):
         # Basic annotation columns
         basic_cols = ['start_time', 'end_time', 'channel', 'note']
 
-        df = pd.DataFrame(columns=basic_cols)
-        for i, tag in enumerate(xh['tags']):
-            time = int(rec_start + (tag[0] / sh['fsamp']) * 1e6)
-            col_vals = {'start_time': time,
-                        'end_time': np.nan,
-                        'channel': np.nan,
-                        'note': ''}
-            df.loc[i] = col_vals
+        # Convert tag sample positions to uutc times at once
+        tag_samps = np.array([tag[0] for tag in xh['tags']], dtype=np.float64)
+        times = (rec_start + (tag_samps / sh['fsamp']) * 1e6).astype(np.int64)
+        n_tags = len(times)
 
-        dfs_out = {'tags': df}
+        df = pd.DataFrame({'start_time': times,
+                           'end_time': np.full(n_tags, np.nan),
+                           'channel': np.full(n_tags, np.nan),
+                           'note': np.full(n_tags, '', dtype=object)},
+                          columns=basic_cols)
 
-        # Get tags and convert them to dataframe
+        dfs_out = {'tags': df}
 
         return dfs_out
 
@@ -103,73 +103,89 @@ class mefdHandler(FileDataSource):
     def _process_mef_records(self, records_list):
         """
         Processes records generated by pymef and puts them into Pysigview.
+
+        The records are grouped by type_string and their fields accumulated
+        into column lists so that each DataFrame is created only once.
         """
 
         # Basic annotation columns
         basic_cols = ['start_time', 'end_time', 'channel']
 
-        dfs_out = {}
-
+        # Accumulate columns per record type
+        rec_cols = {}
         for entry in records_list:
             rec_header = entry['record_header']
             rec_body = entry['record_body']
             rec_type = rec_header['type_string'][0]
             rec_type = rec_type.decode("utf-8")
-            if rec_type not in dfs_out:
+            if rec_type not in rec_cols:
                 ann_cols = [x[0] for x in rec_body.dtype.descr]
-                cols = basic_cols + ann_cols
-                dfs_out[rec_type] = pd.DataFrame(columns=cols)
-
-            df = dfs_out[rec_type]
-            ei = len(df)
-            col_vals = {'start_time': rec_header['time'][0],
-                        'end_time': np.nan,
-                        'channel': np.nan}
-            col_vals.update(
-                    dict([(x[0], rec_body[x[0]][0])
-                          for x in rec_body.dtype.descr]))
-            # Convert byte strings to normal strings
-            for key, val in col_vals.items():
-                if type(val) == np.bytes_:
-                    col_vals[key] = (val.decode("utf-8"))
-
-            df.loc[ei] = col_vals
+                rec_cols[rec_type] = {'start_time': []}
+                for col in ann_cols:
+                    rec_cols[rec_type][col] = []
+
+            cols = rec_cols[rec_type]
+            cols['start_time'].append(rec_header['time'][0])
+            for col in cols.keys():
+                if col == 'start_time':
+                    continue
+                cols[col].append(rec_body[col][0])
+
+        # Create the dataframes at once
+        dfs_out = {}
+        for rec_type, cols in rec_cols.items():
+            n_recs = len(cols['start_time'])
+            df_cols = {'start_time': np.array(cols['start_time']),
+                       'end_time': np.full(n_recs, np.nan),
+                       'channel': np.full(n_recs, np.nan)}
+
+            for col, vals in cols.items():
+                if col == 'start_time':
+                    continue
+                vals = np.array(vals)
+                # Convert byte strings to normal strings in bulk
+                if vals.dtype.kind == 'S':
+                    vals = np.char.decode(vals, 'utf-8').astype(object)
+                df_cols[col] = vals
+
+            col_order = basic_cols + [x for x in cols.keys()
+                                      if x not in basic_cols]
+            dfs_out[rec_type] = pd.DataFrame(df_cols, columns=col_order)
 
         return dfs_out
 
     def get_annotations(self):
         """
+        Annotations are read from a private session so that loading them in
+        a background thread does not share the session used for data reads.
+
         Returns:
         --------
         Annotations - in form of pandas DataFrame(s)
         """
 
-        if self.session is None or self.session.session_md is None:
-            self.session = MefSession(self._path, self._password)
+        session = MefSession(self._path, self._password,
+                             check_all_passwords=False)
+        session_md = session.session_md
+
+        # Gather all records first so that each type is processed only once
+        records_list = []
 
-        dfs_out = {}
-        session_md = self.session.session_md
         # Get session level records
         if 'records_info' in session_md.keys():
-            session_records = session_md['records_info']['records']
-
-            dfs_out.update(self._process_mef_records(session_records))
+            records_list += session_md['records_info']['records']
 
         # Get channel level records
         for _, channel_d in session_md['time_series_channels'].items():
             if 'records_info' in channel_d.keys():
-                ch_rec_list = channel_d['records_info']['records']
-            else:
-                ch_rec_list = []
+                records_list += channel_d['records_info']['records']
 
             # Get segment level records
             for segment_d in channel_d['segments'].values():
                 if 'records_info' in segment_d.keys():
-                    ch_rec_list += segment_d['records_info']['records']
+                    records_list += segment_d['records_info']['records']
 
-            dfs_out.update(self._process_mef_records(ch_rec_list))
-
-        return dfs_out
+        return self._process_mef_records(records_list)
 
     def get_data(self, data_map):
         """
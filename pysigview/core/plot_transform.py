@@ -19,8 +19,10 @@ United States
 """
 
 # Standard library imports
+import hashlib
 
 # Third party imports
+import numpy as np
 
 # Local imports
 
@@ -34,9 +36,83 @@ class BasePlotTransform():
     def apply_transform(self, data):
         raise NotImplementedError
 
+    def apply_container_transform(self, data, vc):
+        """
+        Applies transform to data of visual container. Transforms keeping
+        state between consecutive views override this.
+        """
+        return self.apply_transform(data)
+
+    def is_noop(self):
+        """
+        Whether the transform does not change the data.
+        """
+        return False
+
+    def is_idempotent(self):
+        """
+        Whether applying the transform twice equals applying it once.
+        """
+        return False
+
+    def fuse(self, other):
+        """
+        Returns a single transform equivalent to self followed by other or
+        None if the transforms cannot be fused.
+        """
+        return None
+
+    def is_batchable(self):
+        """
+        Whether the transform can be applied on 2-D data along the last axis
+        for several containers at once.
+        """
+        return False
+
+    def get_margin(self, fsamp):
+        """
+        Number of samples needed on each side of the view to suppress edge
+        effects.
+        """
+        return 0
+
+    def get_output_fsamp(self, fsamp):
+        """
+        Sampling frequency of the transformed data.
+        """
+        return fsamp
+
+    def get_output_length(self, n):
+        """
+        Number of samples of the transformed data.
+        """
+        return n
+
     def modify_visual_container(self, vc):
         return
 
+    @property
+    def signature(self):
+        """
+        Stable hash of transform type and its parameters. Attributes starting
+        with underscore hold runtime state and are not included.
+        """
+
+        h = hashlib.sha1(type(self).__name__.encode())
+        for key in sorted(self.__dict__):
+            if key.startswith('_'):
+                continue
+            val = self.__dict__[key]
+            h.update(key.encode())
+            if isinstance(val, np.ndarray):
+                h.update(str(val.dtype).encode())
+                h.update(str(val.shape).encode())
+                h.update(np.ascontiguousarray(val).tobytes())
+            else:
+                h.update(repr(val).encode())
+
+        return h.hexdigest()
+
     @property
     def transform_variables(self):
         return NotImplementedError
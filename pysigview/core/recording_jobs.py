@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Jobs processing the whole recording in chunks
+
+Ing.,Mgr. (MSc.) Jan Cimbálník, PhD.
+Biomedical engineering
+International Clinical Research Center
+St. Anne's University Hospital in Brno
+Czech Republic
+&
+Mayo systems electrophysiology lab
+Mayo Clinic
+200 1st St SW
+Rochester, MN
+United States
+"""
+
+# Std imports
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+# Third pary imports
+import numpy as np
+
+# Local imports
+from pysigview.core import source_manager as sm
+from pysigview.core.source_manager import DataMap, FileDataSource
+from pysigview.core.file_formats.formats import extension_evaluator
+
+
+class ChunkedRecordingJob:
+    """
+    Streams channels of the whole recording from the original data source in
+    chunks and processes them in a process pool.
+
+    Chunk k covers core span [start + k * chunk_span, start + (k + 1) *
+    chunk_span) and is read with overlap seconds on the right so that
+    windows or events crossing the chunk boundary are complete and with
+    margin seconds on the left for filter transients. Only a
+    limited number of chunks is in flight so the memory does not depend on
+    the recording length. Results are collected in chunk order.
+
+    Recording files are read through a private handler opened by run so
+    that the job thread does not share the handler used by the display.
+
+    Subclasses implement submit_chunk and collect_chunk.
+    """
+
+    def __init__(self, channels, chunk_span=60, overlap=0, n_workers=4,
+                 margin=0):
+
+        self.channels = list(channels)
+        self.chunk_span = chunk_span  # in seconds
+        self.overlap = overlap  # in seconds
+        self.margin = margin  # in seconds
+        self.n_workers = max(int(n_workers), 1)
+
+        self.uutc_ss = None
+        self.source = None
+
+        self._interupt_flag = False
+
+    def interupt(self):
+        self._interupt_flag = True
+
+    # ----- Source -----
+    def open_source(self):
+        """
+        Opens private handler of the recording file. Other sources
+        (clients) are used directly.
+        """
+
+        if not isinstance(sm.ODS, FileDataSource):
+            return sm.ODS
+
+        source, _ = extension_evaluator(sm.ODS.path)
+        if sm.ODS.password is not None:
+            source.password = sm.ODS.password
+        source.load_metadata()
+
+        return source
+
+    def get_source(self):
+        return self.source if self.source is not None else sm.ODS
+
+    # ----- Chunks -----
+    def get_uutc_ss(self):
+        if self.uutc_ss is not None:
+            return self.uutc_ss
+        info = self.get_source().recording_info
+        return [info['recording_start'], info['recording_end']]
+
+    def get_chunks(self):
+        """
+        Returns list of (read_start, core_start, core_stop, read_stop) in
+        uutc.
+        """
+
+        start, stop = self.get_uutc_ss()
+        span = int(self.chunk_span * 1e6)
+        overlap = int(self.overlap * 1e6)
+        margin = int(self.margin * 1e6)
+
+        chunks = []
+        for core_start in range(int(start), int(stop), span):
+            core_stop = min(core_start + span, stop)
+            chunks.append((max(core_start - margin, start), core_start,
+                           core_stop, min(core_stop + overlap, stop)))
+
+        return chunks
+
+    def read_chunk(self, uutc_ss):
+        """
+        Reads channels for uutc_ss and groups them by sampling frequency.
+
+        Returns:
+        --------
+        Dictionary {fsamp: (channels, 2-D array)}, shorter channels are
+        padded with NaNs
+        """
+
+        source = self.get_source()
+
+        dm = DataMap()
+        dm.setup_data_map(source.data_map._map)
+        dm.reset_data_map()
+        dm.set_data_map(self.channels, [uutc_ss] * len(self.channels))
+
+        data = source.get_data(dm)
+
+        groups = {}
+        for ch in self.channels:
+            pos = np.where(source.data_map['channels'] == ch)[0][0]
+            fsamp = source.data_map['fsamp'][pos]
+            groups.setdefault(fsamp, []).append((ch, data[pos]))
+
+        blocks = {}
+        for fsamp, group in groups.items():
+            n = int(round((uutc_ss[1] - uutc_ss[0]) / 1e6 * fsamp))
+            block = np.full((len(group), n), np.nan, 'float64')
+            for i, (_, x) in enumerate(group):
+                x = x[:n]
+                block[i, :len(x)] = x
+            blocks[fsamp] = ([x[0] for x in group], block)
+
+        return blocks
+
+    # ----- Subclass API -----
+    def prepare(self, chunks):
+        """
+        Called before processing, i.e. to create outputs.
+        """
+        return
+
+    def submit_chunk(self, executor, chunk, blocks):
+        """
+        Submits processing of chunk to executor and returns list of
+        (meta, future) tuples.
+        """
+        raise NotImplementedError
+
+    def collect_chunk(self, chunk, results):
+        """
+        Processes list of (meta, result) of chunk tasks, called in chunk
+        order.
+        """
+        raise NotImplementedError
+
+    def finish(self, completed):
+        """
+        Called after processing, returns the result of the job.
+        """
+        return completed
+
+    # ----- Run -----
+    def run(self, progress_callback=None):
+        """
+        Runs the job, returns the result of finish. Can be interrupted from
+        another thread.
+        """
+
+        self._interupt_flag = False
+
+        self.source = self.open_source()
+        try:
+            return self.run_chunks(progress_callback)
+        finally:
+            self.source = None
+
+    def run_chunks(self, progress_callback=None):
+
+        chunks = self.get_chunks()
+        self.prepare(chunks)
+
+        in_flight = deque()
+        done = 0
+        completed = True
+
+        # Jobs run from a thread of the GUI process, forking it could copy
+        # locks held by Qt / OpenGL threads
+        mp_context = multiprocessing.get_context('spawn')
+        executor = ProcessPoolExecutor(self.n_workers, mp_context=mp_context)
+        try:
+            for chunk in chunks:
+                if self._interupt_flag:
+                    completed = False
+                    break
+
+                blocks = self.read_chunk((chunk[0], chunk[3]))
+                in_flight.append((chunk,
+                                  self.submit_chunk(executor, chunk, blocks)))
+                del blocks
+
+                # Bounded number of chunks in memory
+                while len(in_flight) > self.n_workers:
+                    chunk_done, tasks = in_flight.popleft()
+                    self.collect_chunk(chunk_done,
+                                       [(m, f.result()) for m, f in tasks])
+                    done += 1
+                    if progress_callback is not None:
+                        progress_callback(done, len(chunks))
+
+            while in_flight and completed:
+                if self._interupt_flag:
+                    completed = False
+                    break
+                chunk_done, tasks = in_flight.popleft()
+                self.collect_chunk(chunk_done,
+                                   [(m, f.result()) for m, f in tasks])
+                done += 1
+                if progress_callback is not None:
+                    progress_callback(done, len(chunks))
+        except Exception:
+            # Release outputs before reporting the failure
+            executor.shutdown(wait=True, cancel_futures=True)
+            self.finish(False)
+            raise
+        executor.shutdown(wait=True, cancel_futures=True)
+
+        return self.finish(completed)
@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Spectral estimates for measurement tools
+
+Ing.,Mgr. (MSc.) Jan Cimbálník, PhD.
+Biomedical engineering
+International Clinical Research Center
+St. Anne's University Hospital in Brno
+Czech Republic
+&
+Mayo systems electrophysiology lab
+Mayo Clinic
+200 1st St SW
+Rochester, MN
+United States
+"""
+
+# Std imports
+from collections import OrderedDict
+from functools import lru_cache
+
+# Third pary imports
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy import fft as sp_fft
+from scipy.signal import get_window as sp_get_window
+from scipy.signal.windows import dpss
+
+# Local imports
+
+
+@lru_cache(maxsize=32)
+def get_window(window, n):
+    """
+    Returns cached window function, the array must not be modified.
+    """
+
+    win = sp_get_window(window, n, fftbins=True)
+    win.flags.writeable = False
+
+    return win
+
+
+def one_sided(psd, n_fft):
+    """
+    Converts two sided density of rfft bins (last axis) to one sided in
+    place. All bins except DC and Nyquist (even n_fft) are doubled.
+    """
+
+    psd[..., 1:] *= 2
+    if n_fft % 2 == 0:
+        psd[..., -1] /= 2
+
+    return psd
+
+
+def amplitude_spectrum(data, fsamp, window='boxcar', mean_filter=None,
+                       workers=None):
+    """
+    Amplitude spectrum of data. The data is zero padded to length the FFT
+    handles fast.
+
+    Parameters:
+    -----------
+    data - 1-D signal
+    fsamp - sampling frequency
+    window - window name accepted by scipy.signal.get_window
+    mean_filter - length of moving average applied on the spectrum
+    workers - number of FFT workers
+
+    Returns:
+    --------
+    freqs, spectrum
+    """
+
+    data = np.nan_to_num(np.asarray(data, 'float64'))
+    n = len(data)
+    n_fft = sp_fft.next_fast_len(n, real=True)
+
+    # Window normalized so that amplitudes do not depend on its type
+    win = get_window(window, n)
+    s = np.abs(sp_fft.rfft(data * win, n_fft, workers=workers))
+    s *= n / win.sum()
+    s[0] = 0
+    freqs = sp_fft.rfftfreq(n_fft, 1 / fsamp)
+
+    if mean_filter is not None and mean_filter > 1:
+        s = np.convolve(s, np.ones((mean_filter,)) / mean_filter,
+                        mode='valid')
+        freqs = freqs[:len(s)]
+
+    return freqs, s
+
+
+@lru_cache(maxsize=32)
+def get_dpss(n, nw):
+    """
+    Returns cached Slepian tapers (2 * NW - 1 of them) of length n, the
+    array must not be modified.
+    """
+
+    n_tapers = max(int(2 * nw) - 1, 1)
+    tapers = dpss(n, nw, Kmax=n_tapers)
+    tapers = np.atleast_2d(tapers)
+    tapers.flags.writeable = False
+
+    return tapers
+
+
+def welch_psd(data, fsamp, n_fft=256, overlap=0.5, window='hann',
+              workers=None):
+    """
+    Welch power spectral density. All segments are taken as strided view
+    and transformed by one rfft call.
+
+    Parameters:
+    -----------
+    data - 1-D signal
+    fsamp - sampling frequency
+    n_fft - segment length
+    overlap - segment overlap (0 - 1)
+    window - window name accepted by scipy.signal.get_window
+    workers - number of FFT workers
+
+    Returns:
+    --------
+    freqs, psd
+    """
+
+    data = np.nan_to_num(np.asarray(data, 'float64'))
+    n_fft = min(int(n_fft), len(data))
+    step = max(int(n_fft * (1 - overlap)), 1)
+
+    segments = sliding_window_view(data, n_fft)[::step]
+    segments = segments - segments.mean(axis=-1, keepdims=True)
+
+    win = get_window(window, n_fft)
+    spec = sp_fft.rfft(segments * win, axis=-1, workers=workers)
+    psd = np.mean(np.abs(spec)**2, axis=0) / (fsamp * np.sum(win**2))
+
+    return sp_fft.rfftfreq(n_fft, 1 / fsamp), one_sided(psd, n_fft)
+
+
+def multitaper_psd(data, fsamp, nw=4, workers=None):
+    """
+    DPSS multitaper power spectral density. All tapered copies are
+    transformed by one rfft call.
+
+    Parameters:
+    -----------
+    data - 1-D signal
+    fsamp - sampling frequency
+    nw - time half bandwidth product
+    workers - number of FFT workers
+
+    Returns:
+    --------
+    freqs, psd
+    """
+
+    data = np.nan_to_num(np.asarray(data, 'float64'))
+    data = data - data.mean()
+    n = len(data)
+    n_fft = sp_fft.next_fast_len(n, real=True)
+
+    tapers = get_dpss(n, float(nw))
+    spec = sp_fft.rfft(tapers * data, n_fft, axis=-1, workers=workers)
+    psd = np.mean(np.abs(spec)**2, axis=0) / fsamp
+
+    return sp_fft.rfftfreq(n_fft, 1 / fsamp), one_sided(psd, n_fft)
+
+
+class SpectrogramTiles:
+    """
+    Spectrogram of a data array computed in time tiles. Column j of the
+    spectrogram is the windowed FFT of samples j * step : j * step + n_fft,
+    tile t holds columns t * tile_cols : (t + 1) * tile_cols. Selections
+    over the same data reuse the tiles that were already computed.
+    """
+
+    def __init__(self, n_fft=256, step=16, window='hann', tile_cols=128,
+                 max_tiles=512):
+
+        self.n_fft = n_fft
+        self.step = step
+        self.window = window
+        self.tile_cols = tile_cols
+        self.max_tiles = max_tiles
+
+        self.tiles = OrderedDict()
+        self._pending = set()
+        self._data = None
+
+    @property
+    def key(self):
+        return (id(self._data), self.n_fft, self.step, self.window)
+
+    def clear(self):
+        self.tiles.clear()
+        self._pending.clear()
+
+    def set_params(self, n_fft=None, step=None, window=None):
+        if n_fft is not None and n_fft != self.n_fft:
+            self.n_fft = n_fft
+            self.clear()
+        if step is not None and step != self.step:
+            self.step = step
+            self.clear()
+        if window is not None and window != self.window:
+            self.window = window
+            self.clear()
+
+    def set_data(self, data):
+        if data is not self._data:
+            self._data = data
+            self.clear()
+
+    # ----- Tiles -----
+    def get_columns(self, start, stop):
+        """
+        Returns range of columns that fit into samples start:stop.
+        """
+
+        col_start = int(np.ceil(start / self.step))
+        col_stop = (stop - self.n_fft) // self.step + 1
+        return col_start, max(col_start, col_stop)
+
+    def get_tile_idxs(self, start, stop):
+        col_start, col_stop = self.get_columns(start, stop)
+        if col_start == col_stop:
+            return []
+        return list(range(col_start // self.tile_cols,
+                          (col_stop - 1) // self.tile_cols + 1))
+
+    def get_missing_tiles(self, start, stop):
+        """
+        Returns tiles that are neither computed nor queued and marks them
+        pending until put_tiles or release_tiles.
+        """
+
+        missing = [x for x in self.get_tile_idxs(start, stop)
+                   if x not in self.tiles and x not in self._pending]
+        self._pending.update(missing)
+        return missing
+
+    def release_tiles(self, key, tile_idxs):
+        """
+        Clears pending mark of tiles whose job failed or was dropped.
+        """
+
+        if key == self.key:
+            self._pending.difference_update(tile_idxs)
+
+    def compute_tiles(self, data, tile_idxs, key, workers=None):
+        """
+        Computes tiles in dB, all columns of the tiles in one rfft call.
+        Runs in worker thread, the result is stored by put_tiles.
+        """
+
+        n_fft, step = key[1], key[2]
+        n_cols = (len(data) - n_fft) // step + 1
+        if n_cols < 1:
+            return key, {}
+
+        segments = sliding_window_view(data, n_fft)[::step]
+        win = get_window(key[3], n_fft)
+
+        cols = []
+        bounds = []
+        for tile_idx in tile_idxs:
+            first = tile_idx * self.tile_cols
+            last = min(first + self.tile_cols, n_cols)
+            bounds.append((tile_idx, len(cols), len(cols) + last - first))
+            cols.extend(range(first, last))
+
+        spec = sp_fft.rfft(np.nan_to_num(segments[cols]) * win, axis=-1,
+                           workers=workers)
+        spec = 20 * np.log10(np.abs(spec) + np.finfo('float64').tiny)
+        spec = spec.T.astype('float32')
+
+        return key, dict([(tile_idx, spec[:, a:b])
+                          for tile_idx, a, b in bounds])
+
+    def put_tiles(self, key, tiles):
+        """
+        Stores computed tiles, tiles computed for other data or parameters
+        are dropped.
+        """
+
+        if key != self.key:
+            return
+
+        for tile_idx, tile in tiles.items():
+            self.tiles[tile_idx] = tile
+            self.tiles.move_to_end(tile_idx)
+            self._pending.discard(tile_idx)
+
+        while len(self.tiles) > self.max_tiles:
+            self.tiles.popitem(last=False)
+
+    def get_image(self, start, stop):
+        """
+        Assembles spectrogram of samples start:stop from available tiles.
+
+        Returns:
+        --------
+        col_start, image (freqs x columns) with missing columns set to NaN
+        """
+
+        col_start, col_stop = self.get_columns(start, stop)
+        n_freqs = self.n_fft // 2 + 1
+        image = np.full((n_freqs, col_stop - col_start), np.nan, 'float32')
+
+        for tile_idx in self.get_tile_idxs(start, stop):
+            tile = self.tiles.get(tile_idx)
+            if tile is None:
+                continue
+            first = tile_idx * self.tile_cols
+            a = max(col_start, first)
+            b = min(col_stop, first + tile.shape[1])
+            if a < b:
+                image[:, a - col_start:b - col_start] = \
+                    tile[:, a - first:b - first]
+
+        return col_start, image
+
+
+def cross_spectral_matrix(data, fsamp, n_fft=256, overlap=0.5,
+                          window='hann', workers=None):
+    """
+    Welch cross spectral density matrix of multichannel data. Segments of
+    all channels are transformed by one rfft call and the channel products
+    are computed by einsum.
+
+    Parameters:
+    -----------
+    data - 2-D array (channels x samples)
+    fsamp - sampling frequency
+    n_fft - segment length
+    overlap - segment overlap (0 - 1)
+    window - window name accepted by scipy.signal.get_window
+    workers - number of FFT workers
+
+    Returns:
+    --------
+    freqs, one sided csd (channels x channels x freqs), the diagonal equals
+    welch_psd of the channels
+    """
+
+    data = np.nan_to_num(np.asarray(data, 'float64'))
+    n_fft = min(int(n_fft), data.shape[-1])
+    step = max(int(n_fft * (1 - overlap)), 1)
+
+    segments = sliding_window_view(data, n_fft, axis=-1)[:, ::step]
+    segments = segments - segments.mean(axis=-1, keepdims=True)
+
+    win = get_window(window, n_fft)
+    spec = sp_fft.rfft(segments * win, axis=-1, workers=workers)
+
+    csd = np.einsum('isf,jsf->ijf', spec, spec.conj(), optimize=True)
+    csd /= spec.shape[1] * fsamp * np.sum(win**2)
+
+    return sp_fft.rfftfreq(n_fft, 1 / fsamp), one_sided(csd, n_fft)
+
+
+def band_matrix(freqs, csd, band):
+    """
+    Per channel band power and band averaged magnitude squared coherence.
+
+    Parameters:
+    -----------
+    freqs - frequencies of csd
+    csd - cross spectral matrix (channels x channels x freqs)
+    band - (low, high) frequency
+
+    Returns:
+    --------
+    band_power (channels), coherence (channels x channels)
+    """
+
+    f_mask = (freqs >= band[0]) & (freqs <= band[1])
+    if not f_mask.any():
+        f_mask[np.argmin(np.abs(freqs - band[0]))] = True
+
+    csd = csd[..., f_mask]
+    psd = np.real(np.einsum('iif->if', csd))
+
+    band_power = psd.sum(axis=-1) * (freqs[1] - freqs[0])
+
+    denom = np.einsum('if,jf->ijf', psd, psd)
+    denom[denom == 0] = np.inf
+    coherence = np.mean(np.abs(csd)**2 / denom, axis=-1)
+
+    return band_power, coherence
+
+
+def spectral_matrix(data, fsamp, band, n_fft=256, overlap=0.5,
+                    window='hann', workers=None):
+    """
+    Band power and coherence matrix of multichannel data in one pass.
+    """
+
+    freqs, csd = cross_spectral_matrix(data, fsamp, n_fft, overlap, window,
+                                       workers)
+    return band_matrix(freqs, csd, band)
@@ -62,3 +62,162 @@ class TimerWorker(QObject):
     @pyqtSlot()
     def set_loop_time(self, time):
         self._loop_time = time
+
+
+class AnnotationsWorker(QObject):
+    """
+    Worker for loading annotations from data source in the background
+    """
+
+    annotations_loaded = pyqtSignal(object, object)
+    annotations_failed = pyqtSignal(object, str)
+
+    def __init__(self):
+        super().__init__()
+
+    @pyqtSlot(object)
+    def run(self, data_source):
+        ann_groups = None
+        try:
+            if getattr(data_source, "get_annotations", None) is not None:
+                ann_groups = data_source.get_annotations()
+        except Exception as e:
+            self.annotations_failed.emit(data_source, str(e))
+            return
+
+        # Send the source along so that stale results can be dropped
+        self.annotations_loaded.emit(data_source, ann_groups)
+
+        return
+
+
+class AnnotationTileWorker(QObject):
+    """
+    Worker for reading annotation tiles in the background
+    """
+
+    tiles_loaded = pyqtSignal(object)
+    tiles_failed = pyqtSignal(object, str)
+
+    def __init__(self):
+        super().__init__()
+
+    @pyqtSlot(object, list)
+    def run(self, tile_cache, tile_idxs):
+        try:
+            tile_cache.fetch_tiles(tile_idxs)
+        except Exception as e:
+            self.tiles_failed.emit(tile_cache, str(e))
+            return
+
+        self.tiles_loaded.emit(tile_cache)
+
+        return
+
+
+class DatabaseUploadWorker(QObject):
+    """
+    Worker for uploading annotations to database in the background
+    """
+
+    upload_progress = pyqtSignal(int, int)
+    upload_finished = pyqtSignal(int)
+    upload_failed = pyqtSignal(str)
+
+    def __init__(self):
+        super().__init__()
+
+    @pyqtSlot(object, object)
+    def run(self, uploader, df):
+        try:
+            written = uploader.upload(df, self.upload_progress.emit)
+        except Exception as e:
+            self.upload_failed.emit(str(e))
+            return
+
+        self.upload_finished.emit(written)
+
+        return
+
+
+class TransformPreviewWorker(QObject):
+    """
+    Worker for computing transform preview in the background. Requests
+    older than the latest one are dropped.
+    """
+
+    preview_ready = pyqtSignal(int, int, list)
+    preview_failed = pyqtSignal(int, str)
+
+    def __init__(self):
+        super().__init__()
+        self.latest_request = 0
+
+    @pyqtSlot(int, object, list, int)
+    def run(self, request, data, chain, start):
+        if request != self.latest_request:
+            return
+
+        outputs = []
+        try:
+            for t in chain[start:]:
+                data = t.apply_transform(data)
+                outputs.append(data)
+                if request != self.latest_request:
+                    return
+        except Exception as e:
+            self.preview_failed.emit(request, str(e))
+            return
+
+        self.preview_ready.emit(request, start, outputs)
+
+        return
+
+
+class SpectralWorker(QObject):
+    """
+    Worker for computing spectral estimates in the background
+    """
+
+    result_ready = pyqtSignal(object, object)
+    result_failed = pyqtSignal(object, str)
+
+    def __init__(self):
+        super().__init__()
+
+    @pyqtSlot(object)
+    def run(self, job):
+        try:
+            result = job['func'](**job['kwargs'])
+        except Exception as e:
+            self.result_failed.emit(job, str(e))
+            return
+
+        self.result_ready.emit(job, result)
+
+        return
+
+
+class RecordingJobWorker(QObject):
+    """
+    Worker for running jobs over the whole recording in the background
+    """
+
+    job_progress = pyqtSignal(int, int)
+    job_finished = pyqtSignal(object)
+    job_failed = pyqtSignal(str)
+
+    def __init__(self):
+        super().__init__()
+
+    @pyqtSlot(object)
+    def run(self, job):
+        try:
+            result = job.run(self.job_progress.emit)
+        except Exception as e:
+            self.job_failed.emit(str(e))
+            return
+
+        self.job_finished.emit(result)
+
+        return
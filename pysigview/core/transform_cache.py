@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cache of transformed signal data
+
+Ing.,Mgr. (MSc.) Jan Cimbálník, PhD.
+Biomedical engineering
+International Clinical Research Center
+St. Anne's University Hospital in Brno
+Czech Republic
+&
+Mayo systems electrophysiology lab
+Mayo Clinic
+200 1st St SW
+Rochester, MN
+United States
+"""
+
+# Std imports
+from collections import OrderedDict
+from threading import Lock
+
+# Third pary imports
+
+# Local imports
+
+
+class TransformCache:
+    """
+    LRU cache of transform chain results limited by memory budget.
+
+    Keys are created by visual containers from channels, time span,
+    signatures of the transforms in the chain, fill state of the input data
+    and the cache generation which is bumped when the source data change.
+    """
+
+    def __init__(self, max_bytes=256e6):
+
+        self.max_bytes = int(max_bytes)
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key):
+        with self._lock:
+            data = self._data.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+
+        return data
+
+    def put(self, key, data):
+
+        # Do not flush the whole cache for a single huge array
+        if data.nbytes > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._data:
+                self.nbytes -= self._data.pop(key).nbytes
+
+            self._data[key] = data
+            self.nbytes += data.nbytes
+
+            while self.nbytes > self.max_bytes:
+                _, old_data = self._data.popitem(last=False)
+                self.nbytes -= old_data.nbytes
+
+    def set_max_bytes(self, max_bytes):
+        with self._lock:
+            self.max_bytes = int(max_bytes)
+            while self.nbytes > self.max_bytes:
+                _, old_data = self._data.popitem(last=False)
+                self.nbytes -= old_data.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.nbytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def invalidate(self):
+        """
+        Drops all results and bumps generation so that keys of results
+        computed from the old data never match again.
+        """
+
+        with self._lock:
+            self.generation += 1
+        self.clear()
+
+    @property
+    def hit_ratio(self):
+        total = self.hits + self.misses
+        if not total:
+            return 0.
+        return self.hits / total
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compilation and serialization of transform chains
+
+Ing.,Mgr. (MSc.) Jan Cimbálník, PhD.
+Biomedical engineering
+International Clinical Research Center
+St. Anne's University Hospital in Brno
+Czech Republic
+&
+Mayo systems electrophysiology lab
+Mayo Clinic
+200 1st St SW
+Rochester, MN
+United States
+"""
+
+# Std imports
+from importlib import import_module
+import json
+import pickle
+
+# Third pary imports
+import numpy as np
+from scipy import sparse
+
+# Local imports
+
+SPEC_VERSION = 1
+
+# Only classes from these packages are created when decoding a spec
+TRANSFORM_MODULES = ('pysigview.widgets.transforms.',)
+
+
+# ----- Compilation -----
+def compile_chain(chain, report=None):
+    """
+    Returns chain where no-op stages are removed, repeated idempotent stages
+    are dropped and adjacent stages that can be fused (i.e. linear filters)
+    are merged into one.
+
+    Parameters:
+    -----------
+    chain - list of transforms
+    report - list to which messages about the changes are appended
+
+    Returns:
+    --------
+    Compiled list of transforms, the original transforms are not modified
+    """
+
+    if report is None:
+        report = []
+
+    compiled = []
+    for t in chain:
+        if t.is_noop():
+            report.append('Removed no-op stage ' + t.name)
+            continue
+
+        if len(compiled):
+            prev = compiled[-1]
+            if prev.signature == t.signature:
+                if t.is_idempotent():
+                    report.append('Removed duplicate stage ' + t.name)
+                    continue
+                report.append('Duplicate stage ' + t.name)
+
+            fused = prev.fuse(t)
+            if fused is not None:
+                report.append('Fused ' + prev.name + ' and ' + t.name)
+                compiled[-1] = fused
+                continue
+
+        compiled.append(t)
+
+    return compiled
+
+
+def run_chain(chain, data, compile=True):
+    """
+    Applies transform chain on data outside of the GUI. 2-D data is
+    processed along the last axis.
+    """
+
+    if compile:
+        chain = compile_chain(chain)
+
+    for t in chain:
+        data = t.apply_transform(data)
+
+    return data
+
+
+# ----- Serialization -----
+def encode_value(val):
+    """
+    Converts value to JSON serializable structure.
+    """
+
+    if isinstance(val, (str, bool, int, float)) or val is None:
+        return val
+    if isinstance(val, np.generic):
+        return val.item()
+    if isinstance(val, np.ndarray):
+        return {'__ndarray__': val.tolist(),
+                'dtype': str(val.dtype)}
+    if sparse.issparse(val):
+        val = val.tocsr()
+        return {'__sparse__': 'csr',
+                'data': encode_value(val.data),
+                'indices': encode_value(val.indices),
+                'indptr': encode_value(val.indptr),
+                'shape': list(val.shape)}
+    if isinstance(val, (list, tuple)):
+        return [encode_value(x) for x in val]
+    if isinstance(val, dict):
+        return dict([(str(k), encode_value(v)) for k, v in val.items()])
+
+    # Generic objects (transforms, montage matrices)
+    getstate = getattr(type(val), '__getstate__', None)
+    if getstate is not None and getstate is not getattr(object,
+                                                        '__getstate__',
+                                                        None):
+        state = val.__getstate__()
+    else:
+        state = val.__dict__.copy()
+    state = dict([(k, v) for k, v in state.items()
+                  if not k.startswith('_')])
+
+    return {'__object__': type(val).__module__ + '.' + type(val).__name__,
+            'state': encode_value(state)}
+
+
+def decode_value(val):
+    """
+    Inverse of encode_value. Objects are created only from classes in
+    TRANSFORM_MODULES, anything else raises ValueError.
+    """
+
+    if isinstance(val, list):
+        return [decode_value(x) for x in val]
+    if not isinstance(val, dict):
+        return val
+
+    if '__ndarray__' in val:
+        return np.array(val['__ndarray__'], dtype=val['dtype'])
+    if '__sparse__' in val:
+        return sparse.csr_matrix((decode_value(val['data']),
+                                  decode_value(val['indices']),
+                                  decode_value(val['indptr'])),
+                                 shape=tuple(val['shape']))
+    if '__object__' in val:
+        module_name, class_name = val['__object__'].rsplit('.', 1)
+        if not (module_name + '.').startswith(TRANSFORM_MODULES):
+            raise ValueError('Not a transform class: ' + val['__object__'])
+        cls = getattr(import_module(module_name), class_name, None)
+        if not isinstance(cls, type):
+            raise ValueError('Not a transform class: ' + val['__object__'])
+        obj = cls.__new__(cls)
+        state = decode_value(val['state'])
+        if hasattr(obj, '__setstate__'):
+            obj.__setstate__(state)
+        else:
+            obj.__dict__.update(state)
+        return obj
+
+    return dict([(k, decode_value(v)) for k, v in val.items()])
+
+
+def chain_to_spec(chain):
+    """
+    Returns JSON serializable specification of transform chain.
+    """
+
+    return {'version': SPEC_VERSION,
+            'transforms': [encode_value(t) for t in chain]}
+
+
+def spec_to_chain(spec):
+    """
+    Creates transform chain from specification.
+    """
+
+    return [decode_value(x) for x in spec['transforms']]
+
+
+class SpecUnpickler(pickle.Unpickler):
+    """
+    Unpickler of chain specifications. Specifications hold only plain
+    values, globals are resolved only from TRANSFORM_MODULES the same way
+    as in decode_value.
+    """
+
+    def find_class(self, module, name):
+        if not (module + '.').startswith(TRANSFORM_MODULES):
+            raise pickle.UnpicklingError('Not a transform class: '
+                                         + module + '.' + name)
+        cls = super().find_class(module, name)
+        if not isinstance(cls, type):
+            raise pickle.UnpicklingError('Not a transform class: '
+                                         + module + '.' + name)
+        return cls
+
+
+def save_chain(chain, path):
+    """
+    Saves transform chain as JSON (.json) or pickle (other extensions).
+    """
+
+    spec = chain_to_spec(chain)
+    if path.endswith('.json'):
+        with open(path, 'w') as fid:
+            json.dump(spec, fid)
+    else:
+        with open(path, 'wb') as fid:
+            pickle.dump(spec, fid)
+
+
+def load_chain(path):
+    """
+    Loads transform chain saved by save_chain. Pickled files are read by
+    SpecUnpickler so they cannot import anything but transform classes.
+    """
+
+    if path.endswith('.json'):
+        with open(path, 'r') as fid:
+            spec = json.load(fid)
+    else:
+        with open(path, 'rb') as fid:
+            spec = SpecUnpickler(fid).load()
+
+    return spec_to_chain(spec)
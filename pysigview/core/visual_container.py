@@ -19,12 +19,14 @@ United States
 """
 # Std imports
 from collections import OrderedDict
+from functools import partial
 
 # Third pary imports
 import numpy as np
 from scipy.signal import butter, filtfilt
 
 # Local imports
+from pysigview.core.transform_pipeline import compile_chain
 
 
 class BaseVisualContainer():
@@ -60,9 +62,20 @@ class SignalContainer(BaseVisualContainer):
         self._line_alpha = 1.
         self._visual_array_idx = 0
         self._data = None
+        self._stats = None
+        self._ranges = {}
         self._visible = True
 
         self.transform_chain = []
+        self.transform_cache = None
+        self._compiled_chain = (None, [])
+        self.transform_states = {}
+
+        # Padding samples around the view and the first sample of the data
+        self.data_margins = (0, 0)
+        self.data_sample_start = None
+        # NaNs in the data, tells apart data not yet filled by the buffer
+        self.data_nan_count = 0
 
         if self.ufact * self.scale_factor != 0:
             px_per_unit = np.float64(1) / (self.ufact * self.scale_factor)
@@ -118,17 +131,83 @@ class SignalContainer(BaseVisualContainer):
 
     @data.setter
     def data(self, data):
-        data = np.squeeze(np.vstack(data))
+        self.set_data(data)
+
+    def set_data(self, data, margins=(0, 0), sample_start=None,
+                 nan_count=None):
+        """
+        Sets data for the container. Margins are samples on both sides of
+        the view which are used by transforms and cut afterwards. NaN count
+        of data is counted here if not provided.
+        """
+
+        data = as_container_data(data)
+
+        self.data_margins = margins
+        self.data_sample_start = sample_start
+        if nan_count is None:
+            nan_count = int(np.count_nonzero(np.isnan(data)))
+        self.data_nan_count = nan_count
 
         # Apply transform chain
         if len(self.transform_chain):
-            for t in self.transform_chain:
-                data = t.apply_transform(data)
+            data = self.apply_transform_chain(data)
+
+        self.set_transformed_data(data)
+
+    def set_transformed_data(self, data):
+        """
+        Sets data that already went through the transform chain.
+        """
+
+        margins = self.data_margins
+
+        # Margins are in samples of the transformed data
+        fsamp_ratio = self.get_output_fsamp() / self.fsamp
+        if fsamp_ratio != 1:
+            margins = [int(round(x * fsamp_ratio)) for x in margins]
+
+        # Cut the margins
+        if margins[0] or margins[1]:
+            data = data[..., margins[0]:data.shape[-1] - margins[1]]
 
         if self.N is not None:
             data = self.subsample_data(data)
 
         self._data = data
+        self._stats = None
+        self._ranges = {}
+
+    @property
+    def stats(self):
+        """
+        Statistics of the current data (see data_statistics), computed once
+        per data assignment so that scale and color changes do not scan the
+        data.
+        """
+
+        if self._stats is None and self._data is not None:
+            self._stats = data_statistics(self._data)
+        return self._stats
+
+    def get_display_points(self, max_points):
+        """
+        Returns at most max_points evenly strided samples of the data.
+        """
+
+        return decimate_points(self._data, max_points)
+
+    def get_robust_range(self, percentile, max_points):
+        """
+        Returns (low, high) percentile range of the data estimated from
+        display points, cached per data assignment.
+        """
+
+        key = (percentile, max_points)
+        if key not in self._ranges:
+            self._ranges[key] = robust_range(
+                    self.get_display_points(max_points), percentile)
+        return self._ranges[key]
 
     @property
     def visible(self):
@@ -181,14 +260,126 @@ class SignalContainer(BaseVisualContainer):
             return
         transform.modify_visual_container(self)
         self.transform_chain.append(transform)
+        self.transform_states.clear()
         if self.container is not None:
             self.container.update_label()
 
     def transform_chain_remove(self, transform):
         self.transform_chain.pop(transform)
+        self.transform_states.clear()
         if self.container is not None:
             self.container.update_label()
 
+    def get_margin(self):
+        """
+        Padding samples required by the transform chain.
+        """
+        return sum([t.get_margin(self.fsamp) for t in self.transform_chain])
+
+    def get_output_fsamp(self):
+        """
+        Sampling frequency after the transform chain.
+        """
+
+        fsamp = self.fsamp
+        for t in self.transform_chain:
+            fsamp = t.get_output_fsamp(fsamp)
+        return fsamp
+
+    def split_compiled_chain(self):
+        """
+        Splits compiled chain to leading resampling stages and the rest.
+        """
+
+        chain = self.get_compiled_chain()
+        fsamp = self.fsamp
+        n_lead = 0
+        for t in chain:
+            if t.get_output_fsamp(fsamp) == fsamp:
+                break
+            fsamp = t.get_output_fsamp(fsamp)
+            n_lead += 1
+
+        return chain[:n_lead], chain[n_lead:]
+
+    def get_chain_signature(self):
+        return tuple(t.signature for t in self.transform_chain)
+
+    def get_cache_key(self, data):
+        # NaN count is set with the data, the data is not scanned here
+        return (self.orig_channel, tuple(self.add_channels),
+                int(self.uutc_ss[0]), int(self.uutc_ss[1]),
+                np.shape(data), tuple(self.data_margins),
+                self.get_chain_signature(), self.data_nan_count,
+                self.transform_cache.generation)
+
+    def get_batch_key(self, data):
+        """
+        Key of containers whose chains can be run on stacked data at once.
+        """
+
+        if not len(self.transform_chain) or np.ndim(data) != 1:
+            return None
+        if not all([t.is_batchable() for t in self.transform_chain]):
+            return None
+
+        # Channels resampled to common rate are batched on the common grid
+        lead, rest = self.split_compiled_chain()
+        n = len(data)
+        for t in lead:
+            n = t.get_output_length(n)
+        fsamp_ratio = self.get_output_fsamp() / self.fsamp
+        margins = tuple([int(round(x * fsamp_ratio))
+                         for x in self.data_margins])
+
+        return (tuple(t.signature for t in rest), self.get_output_fsamp(), n,
+                margins)
+
+    def get_cached_result(self, data):
+        if self.transform_cache is None:
+            return None
+
+        cached = self.transform_cache.get(self.get_cache_key(data))
+        if cached is None:
+            return None
+
+        # Subsampling works in place, never hand out the cached array
+        return cached.copy()
+
+    def cache_result(self, data, result):
+        if self.transform_cache is None:
+            return
+        self.transform_cache.put(self.get_cache_key(data), result.copy())
+
+    def get_compiled_chain(self):
+        """
+        Returns compiled transform chain, recompiled when the chain changes.
+        """
+
+        chain_sig = self.get_chain_signature()
+        if self._compiled_chain[0] != chain_sig:
+            self._compiled_chain = (chain_sig,
+                                    compile_chain(self.transform_chain))
+            # States belong to the previous compiled transforms
+            self.transform_states.clear()
+        return self._compiled_chain[1]
+
+    def run_transform_chain(self, data):
+        for t in self.get_compiled_chain():
+            data = t.apply_container_transform(data, self)
+        return data
+
+    def apply_transform_chain(self, data):
+
+        cached = self.get_cached_result(data)
+        if cached is not None:
+            return cached
+
+        result = self.run_transform_chain(data)
+        self.cache_result(data, result)
+
+        return result
+
     def subsample_data(self, data):
 
         # TODO - consider using numpy.fft to get rid of scipy dependency
@@ -209,6 +400,8 @@ class SignalContainer(BaseVisualContainer):
             cut_off = self.N / (np.size(data, 0) * 2)
             b, a = butter(4, cut_off)
             if len(data[~data_nan]):
+                # Data can be shared by containers, do not filter in place
+                data = data.copy()
                 # This will create edge artifacts!
                 data[~data_nan] = filtfilt(b, a, data[~data_nan])
             # data[::int(len(data)/N)] # Downsampling by choosing one sample
@@ -221,3 +414,150 @@ class SignalContainer(BaseVisualContainer):
                               axis=1)
         else:
             return data
+
+
+def data_statistics(data):
+    """
+    Computes mean, minimum and maximum of finite samples of data.
+
+    Returns:
+    --------
+    Dictionary with mean, min and max (NaN if there are no finite samples)
+    """
+
+    data = np.asarray(data).ravel()
+    finite = data[np.isfinite(data)]
+    if not finite.size:
+        return {'mean': np.nan, 'min': np.nan, 'max': np.nan}
+
+    return {'mean': finite.mean(),
+            'min': finite.min(),
+            'max': finite.max()}
+
+
+def decimate_points(data, max_points):
+    """
+    Strided view of data with at most max_points samples.
+    """
+
+    data = np.asarray(data).ravel()
+    if max_points and data.size > max_points:
+        data = data[::int(np.ceil(data.size / max_points))]
+    return data
+
+
+def robust_range(data, percentile=1):
+    """
+    Returns (percentile, 100 - percentile) range of finite samples of data
+    using one np.partition call.
+    """
+
+    finite = data[np.isfinite(data)]
+    n = finite.size
+    if not n:
+        return np.nan, np.nan
+
+    kth = [int(round(percentile / 100 * (n - 1))),
+           int(round((100 - percentile) / 100 * (n - 1)))]
+    part = np.partition(finite, kth)
+
+    return part[kth[0]], part[kth[1]]
+
+
+def as_container_data(data):
+    """
+    Converts data to a squeezed array. Plain arrays are not copied so that
+    containers can share data blocks.
+    """
+
+    if isinstance(data, np.ndarray) and data.dtype != object:
+        return np.squeeze(data)
+    return np.squeeze(np.vstack(data))
+
+
+def apply_batched_chain(group):
+    """
+    Runs transform chain on stacked data of containers in group and
+    scatters the rows back.
+    """
+
+    rows = []
+    for pc, data in group:
+        lead, rest = pc.split_compiled_chain()
+        for t in lead:
+            data = t.apply_container_transform(data, pc)
+        rows.append(data)
+
+    batch = np.vstack(rows)
+    for t in rest:
+        batch = t.apply_transform(batch)
+
+    for (pc, data), result in zip(group, batch):
+        pc.cache_result(data, result)
+        pc.set_transformed_data(result)
+
+
+def set_containers_data(pcs, pcs_data, executor=None, n_workers=1):
+    """
+    Sets data of multiple signal containers. Containers with identical
+    transform chains, sampling frequency and data length are stacked and
+    transformed in one call along the last axis. Leading resampling stages
+    run per container so that channels brought to common rate are stacked
+    together. If executor is provided the chains and subsampling run in its
+    threads, scipy releases GIL.
+
+    Parameters:
+    -----------
+    pcs - list of signal containers
+    pcs_data - list of (data, margins, sample_start, nan_count) for each
+               container, containers sharing a block share its NaN count
+    executor - concurrent.futures executor (optional)
+    n_workers - number of executor workers, batches are split to this many
+                parts
+    """
+
+    tasks = []
+    groups = OrderedDict()
+    for pc, (data, margins, sample_start, nan_count) in zip(pcs, pcs_data):
+        data = as_container_data(data)
+        pc.data_margins = margins
+        pc.data_sample_start = sample_start
+        pc.data_nan_count = nan_count
+
+        # Montages read their second channel from the fetched data so the
+        # chains do not depend on each other and can run in any order
+        batch_key = pc.get_batch_key(data)
+        if batch_key is None:
+            tasks.append(partial(pc.set_data, data, margins, sample_start,
+                                 nan_count))
+            continue
+
+        cached = pc.get_cached_result(data)
+        if cached is not None:
+            pc.set_transformed_data(cached)
+            continue
+
+        groups.setdefault(batch_key, []).append((pc, data))
+
+    for group in groups.values():
+        if len(group) == 1:
+            pc, data = group[0]
+            tasks.append(partial(pc.set_data, data, pc.data_margins,
+                                 pc.data_sample_start, pc.data_nan_count))
+            continue
+
+        # Split large batches between workers
+        n_parts = min(len(group), n_workers) if executor is not None else 1
+        for part in np.array_split(np.arange(len(group)), n_parts):
+            tasks.append(partial(apply_batched_chain,
+                                 [group[x] for x in part]))
+
+    if executor is None or len(tasks) < 2:
+        for task in tasks:
+            task()
+        return
+
+    # Join before the signals are updated, re-raises worker exceptions
+    futures = [executor.submit(task) for task in tasks]
+    for future in futures:
+        future.result()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Base class for annotation file handlers
+
+Ing.,Mgr. (MSc.) Jan Cimbálník, PhD.
+Biomedical engineering
+International Clinical Research Center
+St. Anne's University Hospital in Brno
+Czech Republic
+&
+Mayo systems electrophysiology lab
+Mayo Clinic
+200 1st St SW
+Rochester, MN
+United States
+"""
+
+# Std imports
+import math
+
+# Third pary imports
+
+# Local imports
+
+
+class AnnotationFileHandler:
+    """
+    Reads and writes annotation DataFrames. Handlers with pushdown set
+    materialise only the annotations overlapping the requested time range
+    and can be read lazily by the viewed window.
+    """
+
+    def __init__(self):
+
+        self.name = None
+        self.extension = None
+        self.pushdown = False
+
+        self._path = None
+
+    def set_path(self, path):
+        self._path = path
+
+    def get_file_filter(self):
+        return '{} (*{})'.format(self.name, self.extension)
+
+    def filter_time(self, df, uutc_ss):
+        """
+        Returns annotations overlapping uutc_ss, i.e. starting before its
+        end and ending at or after its start. One point annotations (NaN
+        end_time) end at their start.
+        """
+
+        if uutc_ss is None:
+            return df
+
+        ends = df['start_time']
+        if 'end_time' in df.columns:
+            ends = df['end_time'].fillna(ends)
+
+        mask = (df['start_time'] < uutc_ss[1]) & (ends >= uutc_ss[0])
+        return df[mask].reset_index(drop=True)
+
+    def get_bounds(self, uutc_ss, integer=True):
+        """
+        Returns uutc_ss cast to a time column type. Integer bounds are
+        rounded up so that time >= a and time < b select the same
+        annotations as with the original bounds.
+        """
+
+        if integer:
+            return math.ceil(uutc_ss[0]), math.ceil(uutc_ss[1])
+        return float(uutc_ss[0]), float(uutc_ss[1])
+
+    def read(self, uutc_ss=None):
+        raise NotImplementedError
+
+    def write(self, df):
+        raise NotImplementedError
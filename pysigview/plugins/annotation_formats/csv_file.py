@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+CSV annotation files
+
+Ing.,Mgr. (MSc.) Jan Cimbálník, PhD.
+Biomedical engineering
+International Clinical Research Center
+St. Anne's University Hospital in Brno
+Czech Republic
+&
+Mayo systems electrophysiology lab
+Mayo Clinic
+200 1st St SW
+Rochester, MN
+United States
+"""
+
+# Std imports
+
+# Third pary imports
+import pandas as pd
+
+# Local imports
+from .base import AnnotationFileHandler
+
+
+class csvHandler(AnnotationFileHandler):
+    def __init__(self):
+        super(csvHandler, self).__init__()
+
+        self.name = 'CSV'
+        self.extension = '.csv'
+
+        self.chunksize = 100000
+
+    def read(self, uutc_ss=None):
+
+        # Filter chunk by chunk to keep only the requested range in memory
+        chunks = pd.read_csv(self._path, skipinitialspace=True,
+                             chunksize=self.chunksize)
+        chunks = [self.filter_time(x, uutc_ss) for x in chunks]
+        if not len(chunks):
+            return pd.DataFrame(columns=('start_time', 'end_time', 'channel'))
+
+        return pd.concat(chunks, ignore_index=True)
+
+    def write(self, df):
+        df.to_csv(self._path, index=False)
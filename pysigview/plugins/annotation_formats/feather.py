@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Apache Arrow Feather annotation files
+
+Ing.,Mgr. (MSc.) Jan Cimbálník, PhD.
+Biomedical engineering
+International Clinical Research Center
+St. Anne's University Hospital in Brno
+Czech Republic
+&
+Mayo systems electrophysiology lab
+Mayo Clinic
+200 1st St SW
+Rochester, MN
+United States
+"""
+
+# Std imports
+
+# Third pary imports
+import pyarrow as pa
+import pyarrow.compute as pc
+from pyarrow import feather
+
+# Local imports
+from .base import AnnotationFileHandler
+
+
+class featherHandler(AnnotationFileHandler):
+    def __init__(self):
+        super(featherHandler, self).__init__()
+
+        self.name = 'Feather'
+        self.extension = '.feather'
+        self.pushdown = True
+
+    def read(self, uutc_ss=None):
+
+        # Uncompressed files are mapped without copying
+        table = feather.read_table(self._path, memory_map=True)
+
+        if uutc_ss is not None:
+            start_col = table.column('start_time')
+            start, stop = self.get_bounds(uutc_ss,
+                                          pa.types.is_integer(start_col.type))
+            overlap = pc.greater_equal(start_col, start)
+
+            # Null end_time (one point annotation) ends at its start
+            if 'end_time' in table.column_names:
+                end_col = table.column('end_time')
+                end_start, _ = self.get_bounds(
+                        uutc_ss, pa.types.is_integer(end_col.type))
+                overlap = pc.or_kleene(overlap,
+                                       pc.greater_equal(end_col, end_start))
+
+            mask = pc.and_kleene(pc.less(start_col, stop), overlap)
+            table = table.filter(mask)
+
+        return table.to_pandas()
+
+    def write(self, df):
+        df = df.sort_values('start_time')
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        feather.write_feather(table, self._path, compression='uncompressed')
@@ -21,7 +21,10 @@ United States
 # Third party imports
 
 # Local imports
-from pysigview.plugins.annotation_formats.sel import selHandler
+from pysigview.plugins.annotation_formats.pkl import pklHandler
+from pysigview.plugins.annotation_formats.csv_file import csvHandler
+from pysigview.plugins.annotation_formats.parquet import parquetHandler
+from pysigview.plugins.annotation_formats.feather import featherHandler
 
 
 def extension_evaluator(path):
@@ -36,15 +39,15 @@ def extension_evaluator(path):
         path = path[:-1]
 
     extension = path[path.rindex('.'):]
-    print(path)
 
     formats = get_available_file_formats()
 
-    file_handler = [x for x in formats if x.extension == extension][0]
+    file_handler = [x for x in formats if x.extension == extension]
 
     if file_handler == []:
         return None
     else:
+        file_handler = file_handler[0]
         file_handler.set_path(path)
 
     return file_handler
@@ -56,6 +59,16 @@ def get_available_file_formats():
     """
 
     # TODO do this automatically in the future
-    supported_file_formats = [selHandler()]
+    supported_file_formats = [pklHandler(), csvHandler(), parquetHandler(),
+                              featherHandler()]
 
     return supported_file_formats
+
+
+def get_file_filters():
+    """
+    Returns file dialog filter string
+    """
+
+    return ';;'.join([x.get_file_filter()
+                      for x in get_available_file_formats()])
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Apache Parquet annotation files
+
+Ing.,Mgr. (MSc.) Jan Cimbálník, PhD.
+Biomedical engineering
+International Clinical Research Center
+St. Anne's University Hospital in Brno
+Czech Republic
+&
+Mayo systems electrophysiology lab
+Mayo Clinic
+200 1st St SW
+Rochester, MN
+United States
+"""
+
+# Std imports
+
+# Third pary imports
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Local imports
+from .base import AnnotationFileHandler
+
+
+class parquetHandler(AnnotationFileHandler):
+    def __init__(self):
+        super(parquetHandler, self).__init__()
+
+        self.name = 'Parquet'
+        self.extension = '.parquet'
+        self.pushdown = True
+
+        # Small row groups so that statistics skip most of the file
+        self.row_group_size = 65536
+
+    def read(self, uutc_ss=None):
+
+        filters = None
+        if uutc_ss is not None:
+            schema = pq.read_schema(self._path, memory_map=True)
+            start_type = schema.field('start_time').type
+            start, stop = self.get_bounds(uutc_ss,
+                                          pa.types.is_integer(start_type))
+
+            # Overlap in disjunctive form, null end_time fails the second
+            # term and one point annotations are caught by the first one
+            filters = [[('start_time', '>=', start),
+                        ('start_time', '<', stop)]]
+            if 'end_time' in schema.names:
+                end_type = schema.field('end_time').type
+                end_start, _ = self.get_bounds(uutc_ss,
+                                               pa.types.is_integer(end_type))
+                filters.append([('start_time', '<', stop),
+                                ('end_time', '>=', end_start)])
+
+        table = pq.read_table(self._path, filters=filters, memory_map=True)
+
+        return table.to_pandas()
+
+    def write(self, df):
+        df = df.sort_values('start_time')
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        pq.write_table(table, self._path, row_group_size=self.row_group_size)
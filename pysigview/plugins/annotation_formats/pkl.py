@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Python pickle annotation files
+
+Ing.,Mgr. (MSc.) Jan Cimbálník, PhD.
+Biomedical engineering
+International Clinical Research Center
+St. Anne's University Hospital in Brno
+Czech Republic
+&
+Mayo systems electrophysiology lab
+Mayo Clinic
+200 1st St SW
+Rochester, MN
+United States
+"""
+
+# Std imports
+
+# Third pary imports
+import pandas as pd
+
+# Local imports
+from .base import AnnotationFileHandler
+
+
+class pklHandler(AnnotationFileHandler):
+    def __init__(self):
+        super(pklHandler, self).__init__()
+
+        self.name = 'Python pickle'
+        self.extension = '.pkl'
+
+    def read(self, uutc_ss=None):
+        return self.filter_time(pd.read_pickle(self._path), uutc_ss)
+
+    def write(self, df):
+        df.to_pickle(self._path)
@@ -20,20 +20,21 @@ United States
 
 
 # Standard library imports
+import os
+import re
 
 # Third party imports
 import numpy as np
-from PyQt5.QtCore import pyqtSignal, Qt, QSize
+from PyQt5.QtCore import pyqtSignal, Qt, QSize, QThread
 from PyQt5.QtWidgets import (QTreeWidget, QTreeWidgetItem,
                              QVBoxLayout, QHBoxLayout, QPushButton,
                              QFileDialog, QLineEdit, QDialog,
                              QFormLayout, QLabel, QMessageBox,
-                             QMenu, QCheckBox)
+                             QMenu, QCheckBox, QSpinBox, QProgressDialog)
 
 from vispy.scene import Line, LinearRegion
 
-import pandas as pd
-from pandas import DataFrame, read_sql
+from pandas import DataFrame, read_sql, concat
 
 # Local imports
 from pysigview.config.main import CONF
@@ -44,6 +45,12 @@ from pysigview.widgets.dataframe_view import DataFrameView
 from pysigview.utils.qthelpers import (add_actions, create_action,
                                        create_toolbutton, create_plugin_layout)
 from pysigview.config.utils import get_home_dir
+from pysigview.core.annotation_tiles import DatabaseTileCache, FileTileCache
+from pysigview.core.database_upload import AnnotationUploader
+from pysigview.core.thread_workers import (AnnotationTileWorker,
+                                           DatabaseUploadWorker)
+from pysigview.plugins.annotation_formats.formats import (extension_evaluator,
+                                                          get_file_filters)
 from pysigview.widgets.annotations.dialogs import (ConditionDialog,
                                                    HistogramDialog,
                                                    CathegoricalDialog)
@@ -52,6 +59,19 @@ from pysigview.widgets.annotations.annotation_item_widget import (
         AnnotationItemWidget)
 
 
+def compile_condition(condition_str):
+    """
+    Converts condition string to DataFrame.eval expression.
+
+    Older sessions store conditions as python code indexing the parent
+    DataFrame (self.parent().df["col"]), these are converted to backtick
+    quoted column names.
+    """
+
+    return re.sub(r'self\.parent\(\)\.df\[["\'](.+?)["\']\]', r'`\1`',
+                  condition_str).strip()
+
+
 class AnnotationList(QTreeWidget):
 
     def __init__(self, parent=None, **kwargs):
@@ -131,6 +151,15 @@ class AnnotationList(QTreeWidget):
 
             actions = [condition, histogram, categoric]
 
+        elif type(item) == TiledAnnotationSet:
+            reload = create_action(self, '&Reload',
+                                   icon=None,
+                                   tip='Reload annotations from the source',
+                                   triggered=item.reload_tiles,
+                                   context=Qt.ApplicationShortcut)
+
+            actions = [reload]
+
         elif type(item) == AnnotationSubset:
             edit = create_action(self, '&Edit condition',
                                  icon=None,
@@ -208,6 +237,9 @@ class AnnotationSet(QTreeWidgetItem):
 
         self.plot_data = True
 
+        # Cached subset masks {compiled condition: bool array}
+        self._condition_masks = {}
+
         # Widget settings
         self.item_widget = AnnotationItemWidget(self.label_text, len(self.df))
         self.treeWidget().setItemWidget(self, 0, self.item_widget)
@@ -231,13 +263,49 @@ class AnnotationSet(QTreeWidgetItem):
     def set_label(self, text):
         self.item_widget.label.setText(text)
 
+    def get_full_df(self):
+        """
+        Returns all annotations of the set, used by whole set operations
+        (saving, uploading, rendering).
+        """
+        return self.df
+
+    def add_annotation(self, uutc_ss, channel):
+        df = self.df
+        idx = len(df)
+        df.loc[idx, ['start_time', 'end_time']] = uutc_ss
+        df.loc[idx, 'channel'] = channel
+
+        self.update_count()
+
     def update_count(self):
         self.item_widget.set_count(len(self.df))
+
+        # The DataFrame has changed, subset masks have to be recomputed
+        self.invalidate_condition_masks()
+
         child_count = self.childCount()
         for i in range(child_count):
             ann_subset = self.child(i)
             ann_subset.update_df_map()
 
+    def invalidate_condition_masks(self):
+        self._condition_masks = {}
+
+    def get_condition_mask(self, condition_str):
+        """
+        Returns bool array of annotations fulfilling the condition. The masks
+        are cached until the DataFrame changes.
+        """
+
+        expr = compile_condition(condition_str)
+
+        if expr not in self._condition_masks:
+            mask = self.df.eval(expr)
+            self._condition_masks[expr] = np.asarray(mask, dtype=bool)
+
+        return self._condition_masks[expr]
+
     def show_df_view(self):
 
         self.pop_diag = QDialog()
@@ -639,12 +707,92 @@ class AnnotationSet(QTreeWidgetItem):
     def show_cathegorical_dialog(self):
 
         self.pop_diag = CathegoricalDialog(self.df)
-        self.pop_diag.categories_strs_created.connect(self.add_subsets)
+        self.pop_diag.categories_strs_created.connect(
+                self.add_cathegorical_subsets)
         self.pop_diag.setModal(False)
         self.pop_diag.setVisible(True)
 
         return
 
+    def add_cathegorical_subsets(self, col, cond_strs_names):
+        """
+        Creates masks for all cathegories in a single groupby pass and
+        creates the subsets from them.
+        """
+
+        cath_idxs = {str(cath): idxs for cath, idxs
+                     in self.df.groupby(col, sort=False).indices.items()}
+
+        for cond_str, name in cond_strs_names:
+            mask = np.zeros(len(self.df), bool)
+            if name in cath_idxs:
+                mask[cath_idxs[name]] = True
+            self._condition_masks[compile_condition(cond_str)] = mask
+
+        self.add_subsets(cond_strs_names)
+
+
+class TiledAnnotationSet(AnnotationSet):
+    """
+    Annotation set that streams annotations from database table or file for
+    the viewed time window. The DataFrame holds the currently cached tiles
+    and the manually added annotations which are kept in a separate overlay
+    so that loaded tiles do not overwrite them. Whole set operations read
+    the full source through get_full_df.
+    """
+
+    def __init__(self, parent=None, tile_cache=None, df_name=None, **kwargs):
+        super().__init__(parent, tile_cache.get_dataframe(), df_name, **kwargs)
+
+        self.tile_cache = tile_cache
+        self.added_df = DataFrame(columns=('start_time', 'end_time',
+                                           'channel'))
+        self.prefetch_tiles = CONF.get('annotations',
+                                       'database/prefetch_tiles')
+
+    def request_tiles(self):
+
+        data_map = self.main.signal_display.data_map
+        if not len(data_map) or not len(data_map.get_active_channels()):
+            return
+
+        view_ss = data_map.get_active_largest_ss()
+        missing = self.tile_cache.get_missing_tiles(view_ss,
+                                                    self.prefetch_tiles)
+        if len(missing):
+            self.plugin.start_tile_worker.emit(self.tile_cache, missing)
+
+    def merge_added(self, df):
+        if not len(self.added_df):
+            return df
+        if not len(df):
+            return self.added_df.copy()
+        return concat([df, self.added_df], ignore_index=True)
+
+    def get_full_df(self):
+        df = self.merge_added(self.tile_cache.read_all())
+        return df.sort_values('start_time').reset_index(drop=True)
+
+    def add_annotation(self, uutc_ss, channel):
+        idx = len(self.added_df)
+        self.added_df.loc[idx, ['start_time', 'end_time']] = uutc_ss
+        self.added_df.loc[idx, 'channel'] = channel
+        super().add_annotation(uutc_ss, channel)
+
+    def tiles_loaded(self):
+        self.df = self.merge_added(self.tile_cache.get_dataframe())
+        self.update_count()
+        super().plot_set()
+
+    def reload_tiles(self):
+        self.tile_cache.clear()
+        self.tiles_loaded()
+        self.request_tiles()
+
+    def plot_set(self):
+        self.request_tiles()
+        super().plot_set()
+
 
 class AnnotationSubset(QTreeWidgetItem):
     """
@@ -751,7 +899,7 @@ class AnnotationSubset(QTreeWidgetItem):
     def update_df_map(self):
 
         try:
-            self.df_map = eval(self.condition_str)
+            self.df_map = self.parent().get_condition_mask(self.condition_str)
             self.update_count()
         except Exception:
             return
@@ -768,6 +916,10 @@ class Annotations(BasePluginWidget):
     DISABLE_ACTIONS_WHEN_HIDDEN = True
     shortcut = None
 
+    # Signals
+    start_tile_worker = pyqtSignal(object, list)
+    start_upload_worker = pyqtSignal(object, object)
+
     def __init__(self, parent):
         BasePluginWidget.__init__(self, parent)
 
@@ -808,6 +960,27 @@ class Annotations(BasePluginWidget):
         self.active_set = None
         self.user_annotation_type = None
 
+        # Annotation tile reading thread
+        self.tile_worker = AnnotationTileWorker()
+        self.tile_worker_thread = QThread()
+        self.tile_worker.moveToThread(self.tile_worker_thread)
+        self.start_tile_worker.connect(self.tile_worker.run)
+        self.tile_worker.tiles_loaded.connect(self.distribute_tiles)
+        self.tile_worker.tiles_failed.connect(self.report_tile_failure)
+        self.tile_worker_thread.start()
+
+        # Database upload thread
+        self.uploader = None
+        self.upload_progress_dialog = None
+        self.upload_worker = DatabaseUploadWorker()
+        self.upload_worker_thread = QThread()
+        self.upload_worker.moveToThread(self.upload_worker_thread)
+        self.start_upload_worker.connect(self.upload_worker.run)
+        self.upload_worker.upload_progress.connect(self.report_upload_progress)
+        self.upload_worker.upload_finished.connect(self.finish_upload)
+        self.upload_worker.upload_failed.connect(self.report_upload_failure)
+        self.upload_worker_thread.start()
+
         # ----- Set layout -----
         layout = create_plugin_layout(btn_layout, self.annotation_list)
 #        layout.addWidget(self.annotation_list)
@@ -836,21 +1009,32 @@ class Annotations(BasePluginWidget):
     def open_file(self):
         load_dialog = QFileDialog(self)
 
-        file_types = "Python pickle (*.pkl);;CSV (*.csv)"
         load_path = load_dialog.getOpenFileName(self, 'Load annotation set',
                                                 get_home_dir(),
-                                                file_types)
+                                                get_file_filters())
         path = load_path[0]
-        if path.endswith('pkl'):
-            df = pd.read_pickle(path)
-        elif path.endswith('csv'):
-            df = pd.read_csv(path, skipinitialspace=True)
-        else:
+        if not path:
+            return
+
+        file_handler = extension_evaluator(path)
+        if file_handler is None:
             QMessageBox.critical(self, "open message",
                                  "File format not supported")
             return
 
-        self.add_annotation_set(df)
+        name = os.path.basename(path)
+
+        # Read only the viewed window from formats supporting it
+        if file_handler.pushdown and CONF.get(self.CONF_SECTION,
+                                              'file/lazy_loading'):
+            tile_span = CONF.get(self.CONF_SECTION, 'database/tile_span')
+            max_tiles = CONF.get(self.CONF_SECTION, 'database/max_tiles')
+            tile_cache = FileTileCache(file_handler, tile_span * 1e6,
+                                       max_tiles)
+            self.add_tiled_annotation_set(tile_cache, name)
+            return
+
+        self.add_annotation_set(file_handler.read(), name)
 
         return
 
@@ -865,20 +1049,22 @@ class Annotations(BasePluginWidget):
         # Bring up save dialog
         save_dialog = QFileDialog(self)
         save_dialog.setDefaultSuffix(".pkl")
-        file_types = "Python pickle (*.pkl);;CSV (*.csv)"
         save_path = save_dialog.getSaveFileName(self, 'Save annotation set',
                                                 get_home_dir(),
-                                                file_types)
+                                                get_file_filters())
         path = save_path[0]
-        if '.' not in path:
+        if not path:
+            return
+        if '.' not in os.path.basename(path):
             path += '.pkl'
 
-        if path.endswith('pkl'):
-            self.active_set.df.to_pickle(path)
-        elif path.endswith('csv'):
-            self.active_set.df.to_csv(path, index=False)
-        else:
-            QMessageBox.critical(self, "File format not supported")
+        file_handler = extension_evaluator(path)
+        if file_handler is None:
+            QMessageBox.critical(self, "save message",
+                                 "File format not supported")
+            return
+
+        file_handler.write(self.active_set.get_full_df())
 
         return
 
@@ -960,26 +1146,24 @@ class Annotations(BasePluginWidget):
             self.active_set.plot_set()
 
     def add_annotation(self, uutc_ss, channel):
-        df = self.active_set.df
-        idx = len(df)
-        df.loc[idx, ['start_time', 'end_time']] = uutc_ss
-        df.loc[idx, 'channel'] = channel
-
-        self.active_set.update_count()
+        self.active_set.add_annotation(uutc_ss, channel)
 
     # ----- Database interface -----
 
     def active_db_buttons(self):
-        self.tool_buttons[1].setEnabled(True)
         self.tool_buttons[2].setEnabled(True)
+        self.tool_buttons[3].setEnabled(True)
 
     def query_database(self):
 
+        if self.st_chb.isChecked():
+            self.stream_database()
+            return
+
         # Construct query
         print('Reading query')
 
-        query = 'SELECT * FROM {}.{}'.format(self.db_le.text(),
-                                             self.tb_le.text())
+        query = 'SELECT * FROM {}'.format(self.get_db_table())
 
         if self.wh_le.text():
             query += ' WHERE '+self.wh_le.text()
@@ -1026,6 +1210,58 @@ class Annotations(BasePluginWidget):
 
         return
 
+    def get_db_table(self):
+        if self.db_le.text():
+            return '{}.{}'.format(self.db_le.text(), self.tb_le.text())
+        else:
+            return self.tb_le.text()
+
+    def stream_database(self):
+        """
+        Creates annotation set that reads the table in time tiles around
+        the viewed window.
+        """
+
+        if not self.as_le.text():
+            msg_text = 'Annotation start column has to be specified'
+            QMessageBox.critical(self, "Column missing", msg_text)
+            return
+
+        prefix = 'database' + '/'
+        tile_span = CONF.get(self.CONF_SECTION, prefix+'tile_span') * 1e6
+        tile_cache = DatabaseTileCache(self.main.database.conn.engine,
+                                       self.get_db_table(),
+                                       self.as_le.text(),
+                                       self.ae_le.text(),
+                                       self.ac_le.text(),
+                                       self.wh_le.text(),
+                                       tile_span,
+                                       CONF.get(self.CONF_SECTION,
+                                                prefix+'max_tiles'),
+                                       CONF.get(self.CONF_SECTION,
+                                                prefix+'chunksize'))
+
+        return self.add_tiled_annotation_set(tile_cache, self.tb_le.text())
+
+    def add_tiled_annotation_set(self, tile_cache, name='NA'):
+
+        ann_group_item = TiledAnnotationSet(self.annotation_list,
+                                            tile_cache, name)
+        self.annotation_list.addTopLevelItem(ann_group_item)
+        ann_group_item.plot_set()
+
+        return ann_group_item
+
+    def distribute_tiles(self, tile_cache):
+        for item in self.annotation_list.get_annotation_items():
+            if getattr(item, 'tile_cache', None) is tile_cache:
+                item.tiles_loaded()
+
+    def report_tile_failure(self, tile_cache, message):
+        # The cache stops requesting tiles, reload of the set retries
+        msg = 'Loading annotation tiles failed: {} (reload the set to retry)'
+        self.main.statusBar().showMessage(msg.format(message))
+
     def save_db_settings(self):
 
         prefix = 'database' + '/'
@@ -1036,9 +1272,153 @@ class Annotations(BasePluginWidget):
         CONF.set(self.CONF_SECTION, prefix+'end_column', self.ae_le.text())
         CONF.set(self.CONF_SECTION, prefix+'channel_column', self.ac_le.text())
         CONF.set(self.CONF_SECTION, prefix+'where_clause', self.wh_le.text())
+        CONF.set(self.CONF_SECTION, prefix+'stream', self.st_chb.isChecked())
+
+    def upload_database(self):
+
+        # Check if we have an annotation set selected
+        if self.active_set is None:
+            QMessageBox.information(self, "No annotation set selected",
+                                    "Please select an annotation set.")
+            return
+
+        if self.uploader is not None:
+            QMessageBox.information(self, "Upload running",
+                                    "Previous upload is still running.")
+            return
+
+        if not self.up_as_le.text():
+            msg_text = 'Annotation start column has to be specified'
+            QMessageBox.critical(self, "Column missing", msg_text)
+            return
+
+        self.uploader = AnnotationUploader(self.main.database.conn.engine,
+                                           self.up_tb_le.text(),
+                                           self.up_as_le.text(),
+                                           self.up_ae_le.text(),
+                                           self.up_ac_le.text(),
+                                           self.up_db_le.text(),
+                                           self.up_bs_sb.value(),
+                                           self.up_us_chb.isChecked())
+
+        title = 'Uploading annotations'
+        self.upload_progress_dialog = QProgressDialog(title, 'Cancel', 0, 0,
+                                                      self)
+        self.upload_progress_dialog.setWindowTitle(title)
+        self.upload_progress_dialog.setMinimumDuration(0)
+        self.upload_progress_dialog.canceled.connect(self.cancel_upload)
+        self.upload_progress_dialog.show()
+
+        self.start_upload_worker.emit(self.uploader,
+                                      self.active_set.get_full_df().copy())
+
+    def cancel_upload(self):
+        if self.uploader is not None:
+            self.uploader.interupt()
+            self.main.statusBar().showMessage('Cancelling upload')
+
+    def report_upload_progress(self, written, n_records):
+        if self.upload_progress_dialog is not None:
+            self.upload_progress_dialog.setMaximum(n_records)
+            self.upload_progress_dialog.setValue(written)
+        msg = 'Uploading annotations: {} / {}'.format(written, n_records)
+        self.main.statusBar().showMessage(msg)
+
+    def close_upload(self):
+        self.uploader = None
+        if self.upload_progress_dialog is not None:
+            self.upload_progress_dialog.canceled.disconnect(
+                    self.cancel_upload)
+            self.upload_progress_dialog.close()
+            self.upload_progress_dialog = None
+
+    def finish_upload(self, written):
+        self.close_upload()
+        msg = 'Uploaded {} annotations'.format(written)
+        self.main.statusBar().showMessage(msg, 2000)
+
+    def report_upload_failure(self, message):
+        self.close_upload()
+        self.main.statusBar().clearMessage()
+        QMessageBox.critical(self, "Upload failed", message)
+
+    def save_db_up_settings(self):
+        prefix = 'database' + '/'
+        CONF.set(self.CONF_SECTION, prefix+'upload_database',
+                 self.up_db_le.text())
+        CONF.set(self.CONF_SECTION, prefix+'upload_table',
+                 self.up_tb_le.text())
+        CONF.set(self.CONF_SECTION, prefix+'upload_start_column',
+                 self.up_as_le.text())
+        CONF.set(self.CONF_SECTION, prefix+'upload_end_column',
+                 self.up_ae_le.text())
+        CONF.set(self.CONF_SECTION, prefix+'upload_channel_column',
+                 self.up_ac_le.text())
+        CONF.set(self.CONF_SECTION, prefix+'batch_size',
+                 self.up_bs_sb.value())
+        CONF.set(self.CONF_SECTION, prefix+'upsert',
+                 self.up_us_chb.isChecked())
 
     def show_db_up_dialog(self):
-        return
+
+        prefix = 'database' + '/'
+
+        self.pop_diag = QDialog(self)
+        self.pop_diag.setModal(True)
+        self.pop_diag.accepted.connect(self.save_db_up_settings)
+        self.pop_diag.accepted.connect(self.upload_database)
+
+        form = QFormLayout(self.pop_diag)
+
+        # Create widgets and labels
+        db_label = QLabel('Database:')
+        self.up_db_le = QLineEdit(CONF.get(self.CONF_SECTION,
+                                           prefix+'upload_database'))
+        form.addRow(db_label, self.up_db_le)
+
+        tb_label = QLabel('Table:')
+        self.up_tb_le = QLineEdit(CONF.get(self.CONF_SECTION,
+                                           prefix+'upload_table'))
+        form.addRow(tb_label, self.up_tb_le)
+
+        as_label = QLabel('Annotation start column:')
+        self.up_as_le = QLineEdit(CONF.get(self.CONF_SECTION,
+                                           prefix+'upload_start_column'))
+        form.addRow(as_label, self.up_as_le)
+
+        ae_label = QLabel('Annotation end column:')
+        self.up_ae_le = QLineEdit(CONF.get(self.CONF_SECTION,
+                                           prefix+'upload_end_column'))
+        form.addRow(ae_label, self.up_ae_le)
+
+        ac_label = QLabel('Annotation channel column:')
+        self.up_ac_le = QLineEdit(CONF.get(self.CONF_SECTION,
+                                           prefix+'upload_channel_column'))
+        form.addRow(ac_label, self.up_ac_le)
+
+        bs_label = QLabel('Batch size:')
+        self.up_bs_sb = QSpinBox()
+        self.up_bs_sb.setRange(1, 1000000)
+        self.up_bs_sb.setValue(CONF.get(self.CONF_SECTION,
+                                        prefix+'batch_size'))
+        form.addRow(bs_label, self.up_bs_sb)
+
+        us_label = QLabel('Replace matching (start, channel):')
+        self.up_us_chb = QCheckBox()
+        self.up_us_chb.setChecked(CONF.get(self.CONF_SECTION,
+                                           prefix+'upsert'))
+        form.addRow(us_label, self.up_us_chb)
+
+        # OK / cancel button
+        ok_btn = QPushButton('OK')
+        ok_btn.clicked.connect(self.pop_diag.accept)
+
+        clc_btn = QPushButton('Cancel')
+        clc_btn.clicked.connect(self.pop_diag.reject)
+
+        form.addRow(ok_btn, clc_btn)
+
+        self.pop_diag.setVisible(True)
 
     def show_db_down_dialog(self):
 
@@ -1083,6 +1463,11 @@ class Annotations(BasePluginWidget):
 
         form.addRow(wh_label, self.wh_le)
 
+        st_label = QLabel('Stream by time window:')
+        self.st_chb = QCheckBox()
+        self.st_chb.setChecked(CONF.get(self.CONF_SECTION, prefix+'stream'))
+        form.addRow(st_label, self.st_chb)
+
         # OK / cancel button
         ok_btn = QPushButton('OK')
         ok_btn.clicked.connect(self.pop_diag.accept)
@@ -1178,6 +1563,9 @@ class Annotations(BasePluginWidget):
                 an_set_obj.addChild(new_subset)
                 new_subset.df_map = an_subset['df_map']
                 new_subset.condition_str = an_subset['condition_str']
+                # Masks of streamed sets cover only the cached tiles
+                if len(new_subset.df_map) != len(an_set_obj.df):
+                    new_subset.update_df_map()
                 new_subset.set_label(an_subset['text'])
                 new_subset.plot_data = an_subset['plot_data']
                 new_subset.item_widget.check_box.setChecked(True)
@@ -1201,7 +1589,8 @@ class Annotations(BasePluginWidget):
         for an_set_obj in self.annotation_list.get_annotation_items():
             an_set = {}
             an_set['text'] = an_set_obj.label_text
-            an_set['df'] = an_set_obj.df
+            # Streamed sets are stored whole and restored as plain sets
+            an_set['df'] = an_set_obj.get_full_df()
             an_set['plot_data'] = an_set_obj.plot_data
             an_set['color'] = an_set_obj.color
             an_set['subsets'] = []
@@ -1225,6 +1614,12 @@ class Annotations(BasePluginWidget):
 
         # TODO: warning if there are unsaved annotations
 
+        # Running upload stops after the current batch
+        if self.uploader is not None:
+            self.uploader.interupt()
+        self.upload_worker_thread.quit()
+        self.upload_worker_thread.wait()
+
         return True
 
     def refresh_plugin(self):
@@ -34,6 +34,7 @@ from pysigview.widgets.channels.attribute_item_widget import (
         AttributeItemWidget)
 from pysigview.utils.qthelpers import hex2rgba
 from pysigview.core.visual_container import SignalContainer
+from pysigview.core.transform_pipeline import chain_to_spec, spec_to_chain
 
 
 class PlotAttributeItem(QTreeWidgetItem):
@@ -316,6 +317,9 @@ class visible_channels(QTreeWidget):
                 cont.pvc.plot_position = [x, y, z]
                 cont.update_pas()
 
+        # Containers were added, removed or moved
+        self.sd.invalidate_pc_grid()
+
     def create_plot_container_item(self, sc, parent):
         container = PlotContainerItem(sc, parent)
         parent.addChild(container)
@@ -572,7 +576,12 @@ class Channels(BasePluginWidget):
                 pvc.autoscale = cont['pvc']['autoscale']
                 pvc.scale_factor = cont['pvc']['scale_factor']
                 pvc.visible = cont['pvc']['visible']
-                pvc.transform_chain = cont['pvc']['transform_chain']
+                # Sessions saved before pipelines hold pickled transforms
+                if 'transform_pipeline' in cont['pvc']:
+                    pvc.transform_chain = spec_to_chain(
+                            cont['pvc']['transform_pipeline'])
+                else:
+                    pvc.transform_chain = cont['pvc']['transform_chain']
 
         # Move the items and visuals around
 
@@ -593,6 +602,8 @@ class Channels(BasePluginWidget):
                 item.takeChild(cont_i)
             self.visible_channels.takeTopLevelItem(coll_i)
 
+        self.sd.invalidate_pc_grid()
+
         return
 
     def save_plugin_data(self):
@@ -625,7 +636,8 @@ class Channels(BasePluginWidget):
                     pvc['scale_factor'] = cont_i.pvc.scale_factor
                     pvc['autoscale'] = cont_i.pvc.autoscale
                     pvc['visible'] = cont_i.pvc.visible
-                    pvc['transform_chain'] = cont_i.pvc.transform_chain
+                    pvc['transform_pipeline'] = chain_to_spec(
+                            cont_i.pvc.transform_chain)
 
                 container['pvc'] = pvc
 
@@ -19,12 +19,12 @@ United States
 
 # Third party imports
 import numpy as np
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QThread, pyqtSignal
 from PyQt5.QtGui import QIntValidator, QDoubleValidator
 from PyQt5.QtWidgets import (QVBoxLayout, QWidget, QComboBox, QLineEdit,
                              QCheckBox, QFormLayout, QHBoxLayout, QSlider)
 from vispy import scene, color
-from vispy.scene import Line, AxisWidget, Spectrogram
+from vispy.scene import Line, AxisWidget, Image, Text
 from vispy.visuals.transforms import STTransform
 
 # Local imports
@@ -32,10 +32,52 @@ from pysigview.config.main import CONF
 
 from pysigview.plugins.base import BasePluginWidget
 from pysigview.cameras.signal_camera import SignalCamera
+from pysigview.core.spectral import (amplitude_spectrum, welch_psd,
+                                     multitaper_psd, spectral_matrix,
+                                     SpectrogramTiles)
+from pysigview.core.thread_workers import SpectralWorker
+
+
+class TiledSpectrogram(Image):
+    """
+    Image visual showing spectrogram assembled from tiles computed in the
+    background.
+    """
+
+    def __init__(self, n_fft=256, step=16, parent=None):
+        super().__init__(np.zeros((1, 1), 'float32'), parent=parent)
+
+        self.tiles = SpectrogramTiles(n_fft, step)
+        self.fs = 1.
+        self.normalize = False
+        self.image_data = None
+
+    @property
+    def n_fft(self):
+        return self.tiles.n_fft
+
+    @n_fft.setter
+    def n_fft(self, n_fft):
+        self.tiles.set_params(n_fft=n_fft)
+
+    @property
+    def step(self):
+        return self.tiles.step
+
+    @step.setter
+    def step(self, step):
+        self.tiles.set_params(step=step)
+
+    @property
+    def freqs(self):
+        return np.fft.rfftfreq(self.n_fft, 1 / self.fs)
 
 
 class SignalWidget(QWidget):
 
+    # Signals
+    start_spectrum_worker = pyqtSignal(object)
+
     def __init__(self, parent):
         super(SignalWidget, self).__init__(parent)
 
@@ -49,7 +91,8 @@ class SignalWidget(QWidget):
         self.curr_pc = None
         self.sig_start = None
         self.sig_stop = None
-        self.spect_type = 'spectrum'  # spectrum, spectrogram
+        # spectrum, spectrogram, welch, multitaper, coherence
+        self.spect_type = 'spectrum'
 
         # General variables
         self.low_lim = None
@@ -57,6 +100,26 @@ class SignalWidget(QWidget):
 
         # Sepctrum variables
         self.mean_filter = None
+        self.welch_n_fft = 256
+        self.welch_overlap = 0.5
+        self.multitaper_nw = 4
+        self.coherence_n_fft = 256
+        self.matrix_channels = []
+        self._spectral_busy = False
+        self._spectral_queue = []
+        self._spectrogram_sel = None
+
+        # Spectrogram tiles computed per worker job
+        self.tiles_per_job = 4
+
+        # Spectrum worker
+        self.spectrum_worker = SpectralWorker()
+        self.spectrum_worker_thread = QThread()
+        self.spectrum_worker.moveToThread(self.spectrum_worker_thread)
+        self.start_spectrum_worker.connect(self.spectrum_worker.run)
+        self.spectrum_worker.result_ready.connect(self.receive_spectral_result)
+        self.spectrum_worker.result_failed.connect(self.spectral_job_failed)
+        self.spectrum_worker_thread.start()
 
         # Setup camera
         self.signal_camera = SignalCamera()
@@ -128,7 +191,20 @@ class SignalWidget(QWidget):
 
         self.signal_line = Line(parent=self.signal_view.scene, width=1)
         self.spectrum_line = Line(parent=self.spectrum_view.scene, width=1)
-        self.spectrogram = Spectrogram([0], parent=self.spectrum_view.scene)
+        self.spectrogram = TiledSpectrogram(parent=self.spectrum_view.scene)
+        self.coherence_image = Image(np.zeros((1, 1), 'float32'),
+                                     cmap='viridis', clim=(0, 1),
+                                     parent=self.spectrum_view.scene)
+        self.coherence_image.visible = False
+
+        # Channel names on the matrix diagonal and above the band powers
+        self.coherence_labels = Text(color='black', font_size=8,
+                                     parent=self.spectrum_view.scene)
+        self.band_power_labels = Text(anchor_y='bottom', color=axis_color,
+                                      font_size=8,
+                                      parent=self.signal_view.scene)
+        self.coherence_labels.visible = False
+        self.band_power_labels.visible = False
 
         # ----- Set layout -----
         # Widget layout
@@ -142,18 +218,39 @@ class SignalWidget(QWidget):
 
     def set_spect_type(self, stype):
         self.spect_type = stype
+
+        matrix = stype == 'coherence'
+        self.coherence_image.visible = matrix
+        self.coherence_labels.visible = matrix
+        self.band_power_labels.visible = matrix
+        self.signal_xaxis.axis.axis_label = 'Channel' if matrix else 'Time [s]'
+        self.signal_yaxis.axis.axis_label = ('Band power' if matrix
+                                             else 'Amplitude')
+
         if stype == 'spectrum':
             self.spectrum_line.visible = True
             self.spectrogram.visible = False
             self.spectrum_xaxis.axis.axis_label = 'Frequency [Hz]'
             self.spectrum_yaxis.axis.axis_label = 'Amplitude'
 
+        elif stype in ('welch', 'multitaper'):
+            self.spectrum_line.visible = True
+            self.spectrogram.visible = False
+            self.spectrum_xaxis.axis.axis_label = 'Frequency [Hz]'
+            self.spectrum_yaxis.axis.axis_label = 'PSD'
+
         elif stype == 'spectrogram':
             self.spectrogram.visible = True
             self.spectrum_line.visible = False
             self.spectrum_xaxis.axis.axis_label = 'Time [s]'
             self.spectrum_yaxis.axis.axis_label = 'Frequency [Hz]'
 
+        elif stype == 'coherence':
+            self.spectrogram.visible = False
+            self.spectrum_line.visible = False
+            self.spectrum_xaxis.axis.axis_label = 'Channel'
+            self.spectrum_yaxis.axis.axis_label = 'Channel'
+
         self.update_signals()
 
     def recieve_input(self, event):
@@ -195,6 +292,270 @@ class SignalWidget(QWidget):
 
                 self.update_signals()
 
+    def request_spectrum(self, data):
+        """
+        Sends spectrum job to the worker. Only one job is in flight, jobs
+        requested meanwhile are replaced by the newest one.
+        """
+
+        kwargs = {'data': data,
+                  'fsamp': self.curr_pc.fsamp,
+                  'workers': CONF.get('transforms', 'fft_workers')}
+
+        if self.spect_type == 'welch':
+            func = welch_psd
+            kwargs['n_fft'] = self.welch_n_fft
+            kwargs['overlap'] = self.welch_overlap
+            kwargs['window'] = CONF.get(self.CONF_SECTION,
+                                        'spectrum_window')
+        elif self.spect_type == 'multitaper':
+            func = multitaper_psd
+            kwargs['nw'] = self.multitaper_nw
+        else:
+            func = amplitude_spectrum
+            kwargs['window'] = CONF.get(self.CONF_SECTION,
+                                        'spectrum_window')
+            kwargs['mean_filter'] = self.mean_filter
+
+        job = {'func': func,
+               'kwargs': kwargs,
+               'spect_type': self.spect_type,
+               'pc': self.curr_pc}
+
+        # Pending jobs belong to older selections
+        self.set_spectral_queue([job])
+        self.dispatch_spectral_job()
+
+    def request_spectrogram(self, start, stop):
+        """
+        Shows tiles that are already computed and queues the missing ones,
+        starting from the beginning of the selection.
+        """
+
+        sg = self.spectrogram
+        sg.fs = self.curr_pc.fsamp
+        sg.tiles.set_data(self.curr_pc.data)
+        self._spectrogram_sel = (start, stop)
+
+        self.plot_spectrogram()
+
+        # Tiles of dropped jobs are released before looking for missing
+        self.set_spectral_queue([])
+        missing = sg.tiles.get_missing_tiles(start, stop)
+        workers = CONF.get('transforms', 'fft_workers')
+        jobs = []
+        for i in range(0, len(missing), self.tiles_per_job):
+            jobs.append({'func': sg.tiles.compute_tiles,
+                         'kwargs': {'data': self.curr_pc.data,
+                                    'tile_idxs': missing[i:i +
+                                                         self.tiles_per_job],
+                                    'key': sg.tiles.key,
+                                    'workers': workers},
+                         'spect_type': 'spectrogram',
+                         'pc': self.curr_pc})
+
+        self._spectral_queue = jobs
+        self.dispatch_spectral_job()
+
+    def request_matrix(self, start, stop):
+        """
+        Sends band power / coherence job over all visible channels that
+        share sampling frequency and view with the current channel.
+        """
+
+        fs = self.curr_pc.fsamp
+        n = len(self.curr_pc.data)
+        pcs = [pc for pc in self.sd.get_plot_containers()
+               if pc.visible and pc.fsamp == fs and pc.data is not None
+               and len(pc.data) == n]
+        if not pcs:
+            return
+
+        block = np.vstack([pc.data[start:stop] for pc in pcs])
+
+        low = self.low_lim if self.low_lim is not None else 0
+        high = self.high_lim if self.high_lim is not None else fs / 2
+
+        job = {'func': spectral_matrix,
+               'kwargs': {'data': block,
+                          'fsamp': fs,
+                          'band': (low, high),
+                          'n_fft': self.coherence_n_fft,
+                          'window': CONF.get(self.CONF_SECTION,
+                                             'spectrum_window'),
+                          'workers': CONF.get('transforms', 'fft_workers')},
+               'spect_type': 'coherence',
+               'pc': self.curr_pc,
+               'channels': [pc.name for pc in pcs]}
+
+        self.set_spectral_queue([job])
+        self.dispatch_spectral_job()
+
+    def plot_matrix(self, job, result):
+
+        if self.spect_type != 'coherence' or job['pc'] is not self.curr_pc:
+            return
+
+        band_power, coherence = result
+        n_ch = len(band_power)
+        self.matrix_channels = job['channels']
+
+        # Coherence heatmap
+        self.coherence_image.set_data(coherence.astype('float32'))
+        self.spectrum_camera.rect = (0, 0), (n_ch, n_ch)
+        self.spectrum_camera.limit_rect = self.spectrum_camera.rect
+        diag = np.arange(n_ch) + 0.5
+        self.coherence_labels.text = self.matrix_channels
+        self.coherence_labels.pos = np.c_[diag, diag]
+
+        # Band powers
+        p_min = np.min(band_power)
+        p_span = max(np.max(band_power) - p_min, np.finfo('float32').eps)
+        pos = np.c_[np.arange(n_ch) + 0.5, band_power]
+        self.signal_line.set_data(pos=pos, color=self.curr_pc.line_color)
+        self.signal_line.transform = STTransform([1, 1, 1])
+        self.band_power_labels.text = self.matrix_channels
+        self.band_power_labels.pos = pos
+        self.signal_camera.rect = (0, p_min), (n_ch, p_span)
+        self.signal_camera.limit_rect = self.signal_camera.rect
+
+    def release_spectral_job(self, job):
+        """
+        Clears pending mark of spectrogram tiles of failed or dropped job.
+        """
+
+        if job['spect_type'] == 'spectrogram':
+            self.spectrogram.tiles.release_tiles(job['kwargs']['key'],
+                                                 job['kwargs']['tile_idxs'])
+
+    def set_spectral_queue(self, jobs):
+        for job in self._spectral_queue:
+            self.release_spectral_job(job)
+        self._spectral_queue = jobs
+
+    def dispatch_spectral_job(self):
+        """
+        Sends the next queued job to the worker if it is idle.
+        """
+
+        if self._spectral_busy or not self._spectral_queue:
+            return
+
+        self._spectral_busy = True
+        self.start_spectrum_worker.emit(self._spectral_queue.pop(0))
+
+    def spectral_job_failed(self, job, message):
+        self._spectral_busy = False
+        self.release_spectral_job(job)
+        self.dispatch_spectral_job()
+
+    def receive_spectral_result(self, job, result):
+
+        self._spectral_busy = False
+
+        if job['spect_type'] == 'spectrogram':
+            self.spectrogram.tiles.put_tiles(*result)
+            # Tiles past the end of data are not returned
+            self.release_spectral_job(job)
+            if self.spect_type == 'spectrogram':
+                self.plot_spectrogram()
+        elif job['spect_type'] == 'coherence':
+            self.plot_matrix(job, result)
+        else:
+            self.plot_spectrum(job, result)
+
+        self.dispatch_spectral_job()
+
+    def get_lim_idxs(self, freqs):
+
+        low_lim_idx = 0
+        if self.low_lim is not None:
+            res = np.where(freqs >= self.low_lim)[0]
+            if len(res) > 0:
+                low_lim_idx = res[0]
+
+        high_lim_idx = len(freqs)
+        if self.high_lim is not None:
+            res = np.where(freqs <= self.high_lim)[0]
+            if len(res) > 0:
+                high_lim_idx = res[-1]
+
+        return low_lim_idx, high_lim_idx
+
+    def plot_spectrogram(self):
+
+        if self._spectrogram_sel is None:
+            return
+
+        sg = self.spectrogram
+        start, stop = self._spectrogram_sel
+        col_start, image = sg.tiles.get_image(start, stop)
+
+        freqs = sg.freqs
+        low_lim_idx, high_lim_idx = self.get_lim_idxs(freqs)
+        image = image[low_lim_idx:high_lim_idx]
+
+        # Nothing computed yet
+        if not image.size or np.isnan(image).all():
+            return
+
+        if sg.normalize:
+            image = image - np.nanmean(image, axis=1)[:, None]
+
+        # Columns still being computed are shown with the lowest value
+        image = np.where(np.isnan(image), np.nanmin(image), image)
+
+        sg.image_data = image
+        sg.set_data(image)
+
+        fs = self.curr_pc.fsamp
+        scale = [sg.step / fs, fs / sg.n_fft, 1]
+        translate = [(col_start * sg.step - start) / fs,
+                     freqs[low_lim_idx], 0]
+        sg.transform = STTransform(scale, translate)
+
+        # Adjust camera view
+        pos = (0, freqs[low_lim_idx])
+        size = ((stop - start) / fs,
+                freqs[high_lim_idx - 1] - freqs[low_lim_idx])
+        self.spectrum_camera.rect = pos, size
+
+        # Adjust camera limits
+        self.spectrum_camera.limit_rect = pos, size
+
+    def plot_spectrum(self, job, result):
+
+        # Selection moved to another channel or mode meanwhile
+        if (job['spect_type'] != self.spect_type
+                or job['pc'] is not self.curr_pc):
+            return
+
+        freqs, s = result
+        if not len(s):
+            return
+
+        low_lim_idx, high_lim_idx = self.get_lim_idxs(freqs)
+
+        pos = np.c_[freqs, s]
+
+        self.spectrum_line.set_data(pos=pos, color=self.curr_pc.line_color)
+        self.spectrum_line.transform = STTransform([1, 1, 1])
+
+        # Adjust camera limits
+        s_max = np.max(s)
+        pos = (0, 0)
+        size = (freqs[-1], s_max)
+        self.spectrum_camera.limit_rect = pos, size
+
+        # Adjust camera view
+        freqs = freqs[low_lim_idx:high_lim_idx]
+        if len(freqs) == 0:
+            return
+        pos = (freqs[0], 0)
+        size = (freqs[-1] - freqs[0],
+                np.max(s[low_lim_idx:high_lim_idx]))
+        self.spectrum_camera.rect = pos, size
+
     def update_signals(self):
 
         if self.sig_start is None or self.sig_stop is None:
@@ -210,16 +571,22 @@ class SignalWidget(QWidget):
         if len(data) < 2:
             return
 
+        # Channel matrix replaces the signal trace
+        if self.spect_type == 'coherence':
+            self.request_matrix(min(self.sig_start, self.sig_stop),
+                                max(self.sig_start, self.sig_stop))
+            return
+
         # Signal line
+        d_min = np.nanmin(data)
+        d_max = np.nanmax(data)
 
         s_x = 1/self.curr_pc.fsamp
-        s_y = 1/(np.max(data)-np.min(data))
-        s_z = 0
         scale = [s_x, 1, 1]
 
         # Translate
         t_x = 0
-        t_y = -np.min(data)
+        t_y = -d_min
         t_z = 0
         translate = [t_x, t_y, t_z]
 
@@ -230,98 +597,16 @@ class SignalWidget(QWidget):
         self.signal_line.set_data(pos=pos, color=self.curr_pc.line_color)
         self.signal_line.transform = transform
 
-        self.signal_camera.rect = (0, 0), (len(data) * s_x,
-                                           np.max(data)-np.min(data))
+        self.signal_camera.rect = (0, 0), (len(data) * s_x, d_max - d_min)
         self.signal_camera.limit_rect = self.signal_camera.rect
 
-        if self.spect_type == 'spectrum':
-
-            s = np.abs(np.fft.fft(data))[:int(len(data)/2)]
-            s[0] = 0
-            freqs = np.fft.fftfreq(data.size, 1 / self.curr_pc.fsamp)
-            freqs = freqs[:int(len(freqs)/2)]
-
-            if self.mean_filter is not None and self.mean_filter > 1:
-                s = np.convolve(s,
-                                np.ones((self.mean_filter,))/self.mean_filter,
-                                mode='valid')
-
-            if self.low_lim is not None:
-                res = np.where(freqs >= self.low_lim)[0]
-                if len(res) > 0:
-                    low_lim_idx = res[0]
-            else:
-                low_lim_idx = 0
-
-            if self.high_lim is not None:
-                res = np.where(freqs <= self.high_lim)[0]
-                if len(res) > 0:
-                    high_lim_idx = res[-1]
-            else:
-                high_lim_idx = len(freqs)
-
-            s_x = (self.curr_pc.fsamp / 2) / len(s)
-            s_y = 1
-            s_z = 1
-            scale = [s_x, s_y, s_z]
-
-            pos = np.c_[np.arange(len(s)), s]
-
-            self.spectrum_line.set_data(pos=pos, color=self.curr_pc.line_color)
-            self.spectrum_line.transform = STTransform(scale)
-
-            # Adjust camera limits
-            pos = (0, 0)
-            size = (freqs[-1], np.max(s))
-            self.spectrum_camera.limit_rect = pos, size
-
-            # Adjust camera view
-            freqs = freqs[low_lim_idx:high_lim_idx]
-            if len(freqs) == 0:
-                return
-            pos = (freqs[0], 0)
-            size = (freqs[-1] - freqs[0],
-                    np.max(s[low_lim_idx:high_lim_idx]))
-            self.spectrum_camera.rect = pos, size
+        if self.spect_type in ('spectrum', 'welch', 'multitaper'):
+            self.request_spectrum(data)
 
         elif self.spect_type == 'spectrogram':
-            self.spectrogram.x = data
-            freqs = self.spectrogram.freqs
-
-            if self.low_lim is not None:
-                res = np.where(freqs >= self.low_lim)[0]
-                if len(res) > 0:
-                    low_lim_idx = res[0]
-            else:
-                low_lim_idx = 0
-
-            if self.high_lim is not None:
-                res = np.where(freqs <= self.high_lim)[0]
-                if len(res) > 0:
-                    high_lim_idx = res[-1]
-            else:
-                high_lim_idx = len(freqs)
-
-            n_windows = ((len(data) - self.spectrogram.n_fft)
-                         // self.spectrogram.step + 1)
-
-            if n_windows == 0 or len(freqs) == 0:
-                return
-            
-            s_x = len(data) / self.curr_pc.fsamp
-            s_y = (self.curr_pc.fsamp / 2) / len(freqs)
-            s_z = 1
-            scale = [s_x, s_y, s_z]
-            self.spectrogram.transform = STTransform(scale)
-
-            # Adjust camera view
-            freqs = freqs[low_lim_idx:high_lim_idx-1]
-            pos = (0, freqs[0])
-            size = (len(data) / self.curr_pc.fsamp, freqs[-1] - freqs[0])
-            self.spectrum_camera.rect = pos, size
-
-            # Adjust camera limits
-            self.spectrum_camera.limit_rect = pos, size
+            self.request_spectrogram(min(self.sig_start, self.sig_stop),
+                                     max(self.sig_start, self.sig_stop))
+
 
 class GeneralTools(QWidget):
 
@@ -333,7 +618,8 @@ class GeneralTools(QWidget):
         layout = QFormLayout()
 
         self.cb = QComboBox()
-        self.cb.addItems(['Spectrum', 'Spectrogram'])
+        self.cb.addItems(['Spectrum', 'Spectrogram', 'Welch', 'Multitaper',
+                          'Coherence'])
         self.cb.currentIndexChanged.connect(self.switch_spect_type)
         layout.addRow("Transform", self.cb)
 
@@ -403,6 +689,82 @@ class SpectrumTools(QWidget):
             self.sw.update_signals()
 
 
+class WelchTools(QWidget):
+
+    def __init__(self, parent):
+        super(WelchTools, self).__init__(parent)
+
+        self.sw = self.parent().plugin.signal_widget
+
+        layout = QFormLayout()
+
+        self.n_fft_le = QLineEdit(str(self.sw.welch_n_fft))
+        self.n_fft_le_validator = QIntValidator(8, 65536)
+        self.n_fft_le.setValidator(self.n_fft_le_validator)
+        layout.addRow('NFFT', self.n_fft_le)
+        self.n_fft_le.editingFinished.connect(self.set_n_fft)
+
+        self.overlap_le = QLineEdit(str(int(self.sw.welch_overlap * 100)))
+        self.overlap_le_validator = QIntValidator(0, 95)
+        self.overlap_le.setValidator(self.overlap_le_validator)
+        layout.addRow('Overlap [%]', self.overlap_le)
+        self.overlap_le.editingFinished.connect(self.set_overlap)
+
+        self.setLayout(layout)
+
+    def set_n_fft(self):
+        self.sw.welch_n_fft = int(self.n_fft_le.text())
+        self.sw.update_signals()
+
+    def set_overlap(self):
+        self.sw.welch_overlap = int(self.overlap_le.text()) / 100
+        self.sw.update_signals()
+
+
+class MultitaperTools(QWidget):
+
+    def __init__(self, parent):
+        super(MultitaperTools, self).__init__(parent)
+
+        self.sw = self.parent().plugin.signal_widget
+
+        layout = QFormLayout()
+
+        self.nw_le = QLineEdit(str(self.sw.multitaper_nw))
+        self.nw_le_validator = QDoubleValidator(1, 50, 1)
+        self.nw_le.setValidator(self.nw_le_validator)
+        layout.addRow('NW', self.nw_le)
+        self.nw_le.editingFinished.connect(self.set_nw)
+
+        self.setLayout(layout)
+
+    def set_nw(self):
+        self.sw.multitaper_nw = float(self.nw_le.text())
+        self.sw.update_signals()
+
+
+class CoherenceTools(QWidget):
+
+    def __init__(self, parent):
+        super(CoherenceTools, self).__init__(parent)
+
+        self.sw = self.parent().plugin.signal_widget
+
+        layout = QFormLayout()
+
+        self.n_fft_le = QLineEdit(str(self.sw.coherence_n_fft))
+        self.n_fft_le_validator = QIntValidator(8, 65536)
+        self.n_fft_le.setValidator(self.n_fft_le_validator)
+        layout.addRow('NFFT', self.n_fft_le)
+        self.n_fft_le.editingFinished.connect(self.set_n_fft)
+
+        self.setLayout(layout)
+
+    def set_n_fft(self):
+        self.sw.coherence_n_fft = int(self.n_fft_le.text())
+        self.sw.update_signals()
+
+
 class SpectrogramTools(QWidget):
 
     def __init__(self, parent):
@@ -511,6 +873,7 @@ class SpectrogramTools(QWidget):
             self.spectrogram.normalize = True
         else:
             self.spectrogram.normalize = False
+        self.parent().plugin.signal_widget.plot_spectrogram()
 
     def set_clim_low_s(self, val):
         low = int(val)
@@ -522,11 +885,11 @@ class SpectrogramTools(QWidget):
         # Adjust text
         self.clim_low_le.setText(str(low))
 
-        if self.spectrogram._data is None:
+        if self.spectrogram.image_data is None:
             return
 
-        d_min = np.min(self.spectrogram._data)
-        d_max = np.max(self.spectrogram._data)
+        d_min = np.min(self.spectrogram.image_data)
+        d_max = np.max(self.spectrogram.image_data)
         d_diff = d_max - d_min
         low = ((low/100) * d_diff) + d_min
         high = ((high/100) * d_diff) + d_min
@@ -542,11 +905,11 @@ class SpectrogramTools(QWidget):
         # Adjust text
         self.clim_high_le.setText(str(high))
 
-        if self.spectrogram._data is None:
+        if self.spectrogram.image_data is None:
             return
 
-        d_min = np.min(self.spectrogram._data)
-        d_max = np.max(self.spectrogram._data)
+        d_min = np.min(self.spectrogram.image_data)
+        d_max = np.max(self.spectrogram.image_data)
         d_diff = d_max - d_min
         low = ((low/100) * d_diff) + d_min
         high = ((high/100) * d_diff) + d_min
@@ -564,11 +927,11 @@ class SpectrogramTools(QWidget):
         self.clim_low_s.setValue(low)
         self.clim_high_s.setValue(high)
 
-        if self.spectrogram.data is None:
+        if self.spectrogram.image_data is None:
             return
 
-        d_min = np.min(self.spectrogram.data)
-        d_max = np.max(self.spectrogram.data)
+        d_min = np.min(self.spectrogram.image_data)
+        d_max = np.max(self.spectrogram.image_data)
         d_diff = d_max - d_min
         low = ((low/100) * d_diff) + d_min
         high = ((high/100) * d_diff) + d_min
@@ -588,7 +951,12 @@ class ToolsWidget(QWidget):
 
         self.spectrum_tools = SpectrumTools(self)
         self.spectrogram_tools = SpectrogramTools(self)
-        self.specific_tools = [self.spectrum_tools, self.spectrogram_tools]
+        self.welch_tools = WelchTools(self)
+        self.multitaper_tools = MultitaperTools(self)
+        self.coherence_tools = CoherenceTools(self)
+        self.specific_tools = [self.spectrum_tools, self.spectrogram_tools,
+                               self.welch_tools, self.multitaper_tools,
+                               self.coherence_tools]
 
         self.curr_tools_widget = self.spectrum_tools
 
@@ -663,6 +1031,8 @@ class Measurement(BasePluginWidget):
         """
         Perform actions before parent main window is closed.
         """
+        self.signal_widget.spectrum_worker_thread.quit()
+        self.signal_widget.spectrum_worker_thread.wait()
         return True
 
     def refresh_plugin(self):
@@ -726,6 +1096,24 @@ class Measurement(BasePluginWidget):
         tw.spectrogram_tools.set_normalize(st['normalize_chb'])
         tw.spectrogram_tools.set_clim()
 
+        # Sessions saved before PSD estimators do not have these
+        st = data['tools'].get('welch')
+        if st is not None:
+            tw.welch_tools.n_fft_le.setText(st['n_fft'])
+            tw.welch_tools.overlap_le.setText(st['overlap'])
+            tw.welch_tools.set_n_fft()
+            tw.welch_tools.set_overlap()
+
+        st = data['tools'].get('multitaper')
+        if st is not None:
+            tw.multitaper_tools.nw_le.setText(st['nw'])
+            tw.multitaper_tools.set_nw()
+
+        st = data['tools'].get('coherence')
+        if st is not None:
+            tw.coherence_tools.n_fft_le.setText(st['n_fft'])
+            tw.coherence_tools.set_n_fft()
+
     def save_plugin_data(self):
         """Function to run when saving session"""
 
@@ -753,9 +1141,22 @@ class Measurement(BasePluginWidget):
         spectrogram_tools['clim_high_le'] = int((tw.spectrogram_tools.
                                                  clim_high_le.text()))
 
+        welch_tools = {}
+        welch_tools['n_fft'] = tw.welch_tools.n_fft_le.text()
+        welch_tools['overlap'] = tw.welch_tools.overlap_le.text()
+
+        multitaper_tools = {}
+        multitaper_tools['nw'] = tw.multitaper_tools.nw_le.text()
+
+        coherence_tools = {}
+        coherence_tools['n_fft'] = tw.coherence_tools.n_fft_le.text()
+
         tools = {'general': general_tools,
                  'spectrum': spectrum_tools,
-                 'spectrogram': spectrogram_tools}
+                 'spectrogram': spectrogram_tools,
+                 'welch': welch_tools,
+                 'multitaper': multitaper_tools,
+                 'coherence': coherence_tools}
 
         signal_props = {'sig_start': sw.sig_start,
                         'sig_stop': sw.sig_stop}
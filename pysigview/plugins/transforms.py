@@ -22,7 +22,7 @@ United States
 
 # Third party imports
 import numpy as np
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QThread, QTimer, pyqtSignal
 from PyQt5.QtWidgets import (QVBoxLayout, QHBoxLayout,
                              QWidget, QStackedWidget,
                              QListWidget, QTreeWidget, QTreeWidgetItem,
@@ -32,13 +32,16 @@ from vispy import scene
 
 # Local imports
 from pysigview.plugins.base import BasePluginWidget
-# from pysigview.config.main import CONF
+from pysigview.config.main import CONF
 from pysigview.cameras.signal_camera import SignalCamera
 from pysigview.widgets.transforms.filters import Filters
 from pysigview.widgets.transforms.montages import Montages
 from pysigview.widgets.transforms.envelopes import Envelopes
+from pysigview.widgets.transforms.resample import Resampling
 from pysigview.plugins.channels import PlotContainerItem, PlotCollectionItem
 from pysigview.core.visual_container import SignalContainer
+from pysigview.core.transform_pipeline import compile_chain
+from pysigview.core.thread_workers import TransformPreviewWorker
 
 from pysigview.visuals.simple_line_visual import SimpleLine
 
@@ -253,30 +256,33 @@ class TransformButtons(QWidget):
 
         transform_view = self.plugin.transform_view
 
+        report = []
         for i in range(transform_view.topLevelItemCount()):
             item = transform_view.topLevelItem(i)
 
             if hasattr(item.channel_item, 'pvc'):
                 if self.creat_copies_cb.isChecked():
-                    dup_ch_item = item.channel_item.create_duplicate()
-                    for transform in item.temporary_chain[:]:
-                        transform.visual_container = dup_ch_item.pvc
+                    ch_item = item.channel_item.create_duplicate()
                 else:
-                    for transform in item.temporary_chain[:]:
-                        transform.visual_container = item.channel_item.pvc
+                    ch_item = item.channel_item
+
+                for transform in item.temporary_chain[:]:
+                    ch_item.pvc.transoform_chain_add(transform)
+                report += self.get_compile_report(ch_item.pvc)
             else:
                 for j in range(item.childCount()):
-                    item = item.child(j)
-                    if not hasattr(item.channel_item, 'pvc'):
+                    child_item = item.child(j)
+                    if not hasattr(child_item.channel_item, 'pvc'):
                         continue
 
                     if self.creat_copies_cb.isChecked():
-                        ch_item = item.channel_item.create_duplicate()
+                        ch_item = child_item.channel_item.create_duplicate()
                     else:
-                        ch_item = item.channel_item
+                        ch_item = child_item.channel_item
 
-                    for transform in item.temporary_chain[:]:
+                    for transform in child_item.temporary_chain[:]:
                         ch_item.pvc.transoform_chain_add(transform)
+                    report += self.get_compile_report(ch_item.pvc)
 
         self.plugin.transform_view.clear()
         self.visible_channels.update_plot_positions()
@@ -284,11 +290,30 @@ class TransformButtons(QWidget):
 
         self.plugin.delete_plugin_data()
 
+        if report:
+            self.plugin.show_message('; '.join(report), 10000)
+
+    def get_compile_report(self, pvc):
+        """
+        Returns messages about stages removed or fused in pvc chain.
+        """
+
+        report = []
+        compile_chain(pvc.transform_chain, report)
+        return [pvc.name + ': ' + x for x in report]
+
 
 class SignalPreview(QWidget):
     """
     Preview of the signal and its transforms.
+
+    The raw preview window and the output of each chain stage are kept, so
+    that changing the previewed transform only recomputes that stage.
     """
+
+    # Signals
+    start_preview_worker = pyqtSignal(int, object, list, int)
+
     #TODO - slove the parent issue (why I cannot use self.parent())
     def __init__(self, parent):
         super().__init__(parent)
@@ -303,6 +328,26 @@ class SignalPreview(QWidget):
         self.preview_transform_chain = []
         self.preview_temp_transform = None
 
+        # Raw preview window and outputs of chain stages [(signature, data)]
+        self.preview_data = None
+        self.stage_cache = []
+        self._preview_request = 0
+        self._pending_chain = []
+
+        # Debounce of preview updates
+        self.preview_timer = QTimer(self)
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.timeout.connect(self.compute_trans_sig)
+
+        # Preview worker
+        self.preview_worker = TransformPreviewWorker()
+        self.preview_worker_thread = QThread()
+        self.preview_worker.moveToThread(self.preview_worker_thread)
+        self.start_preview_worker.connect(self.preview_worker.run)
+        self.preview_worker.preview_ready.connect(self.receive_trans_sig)
+        self.preview_worker.preview_failed.connect(self.report_preview_failure)
+        self.preview_worker_thread.start()
+
         # Widget layout
         layout = QVBoxLayout()
         layout.setContentsMargins(0, 0, 0, 0)
@@ -340,33 +385,96 @@ class SignalPreview(QWidget):
 #        self.preview_pvc = pvc
 #        self.preview_transform_chain = self.pvc.transform_chain
 
-    def update_trans_sig(self):
-
-        if self.preview_temp_transform is None:
-            return
+    def load_preview_data(self):
+        """
+        Takes the preview window from data_array, loads it only if it is
+        not there.
+        """
 
         dap = self.preview_pvc.data_array_pos
-
-        # Check if all the data is in data_array
         sd = self.main.signal_display
 
-        # We have to load the data here!
+        data = sd.data_array[dap]
+        if all(x is not None and len(x) for x in data):
+            return np.squeeze(np.vstack(data))
+
         dm = sm.DataMap()
         dm.setup_data_map(sd.data_map._map)
         dm.reset_data_map()
         dm['ch_set'][dap] = True
         dm['uutc_ss'][dap] = self.preview_pvc.uutc_ss
-        data = np.squeeze(np.vstack(sm.PDS.get_data(dm)[dap]))
+        return np.squeeze(np.vstack(sm.PDS.get_data(dm)[dap]))
 
-        for t in self.preview_transform_chain + [self.preview_temp_transform]:
-            data = t.apply_transform(data)
+    def get_cached_stages(self, chain):
+        """
+        Returns the number of leading chain stages with cached outputs.
+        """
 
-        y = data.astype('float32')
-        x = np.arange(len(y), dtype='float32')
+        n_cached = 0
+        for t, (sig, _) in zip(chain, self.stage_cache):
+            if t.signature != sig:
+                break
+            n_cached += 1
 
-        pos = np.c_[x, y]
+        return n_cached
 
-        self.trans_sig.pos = pos
+    def update_trans_sig(self):
+
+        if self.preview_temp_transform is None:
+            return
+
+        self.preview_timer.start(CONF.get('transforms', 'preview_delay'))
+
+    def compute_trans_sig(self):
+
+        if self.preview_temp_transform is None or self.preview_data is None:
+            return
+
+        chain = self.preview_transform_chain + [self.preview_temp_transform]
+
+        n_cached = self.get_cached_stages(chain)
+        del self.stage_cache[n_cached:]
+
+        if n_cached == len(chain):
+            self.plot_trans_sig(self.stage_cache[-1][1])
+            return
+
+        if n_cached:
+            data = self.stage_cache[n_cached - 1][1]
+        else:
+            data = self.preview_data
+
+        self._preview_request += 1
+        self._pending_chain = chain
+        self.preview_worker.latest_request = self._preview_request
+        self.start_preview_worker.emit(self._preview_request, data,
+                                       chain, n_cached)
+
+    def receive_trans_sig(self, request, start, outputs):
+
+        # Stale result
+        if request != self._preview_request:
+            return
+
+        chain = self._pending_chain
+        del self.stage_cache[start:]
+        for t, data in zip(chain[start:], outputs):
+            self.stage_cache.append((t.signature, data))
+
+        self.plot_trans_sig(outputs[-1])
+
+    def report_preview_failure(self, request, message):
+
+        # Stale result
+        if request != self._preview_request:
+            return
+
+        self._pending_chain = None
+        self.trans_sig.pos = None
+        self.main.statusBar().showMessage('Transform preview failed: '
+                                          + message, 5000)
+
+    def get_sig_transform(self, pos):
 
         # Scale
         s_x = 1 / len(pos)
@@ -378,16 +486,31 @@ class SignalPreview(QWidget):
         t_y = (-np.nanmean(pos[:, 1]) * s_y) + 0.5
         t = (t_x, t_y)
 
-        self.trans_sig.transform = scene.transforms.STTransform(s, t)
+        return scene.transforms.STTransform(s, t)
+
+    def plot_trans_sig(self, data):
+
+        y = data.astype('float32')
+        x = np.arange(len(y), dtype='float32')
+
+        pos = np.c_[x, y]
+
+        self.trans_sig.pos = pos
+        self.trans_sig.transform = self.get_sig_transform(pos)
 
     def set_orig_trans_sig(self):
 
-        dap = self.preview_pvc.data_array_pos
-        data = np.squeeze(np.vstack(self.main.signal_display.data_array[dap]))
+        self.preview_data = self.load_preview_data()
+        self.stage_cache = []
 
-        if len(self.preview_transform_chain):
-            for t in self.preview_transform_chain:
-                data = t.apply_transform(data)
+        # Outstanding results belong to the previous channel
+        self._preview_request += 1
+        self.preview_worker.latest_request = self._preview_request
+
+        data = self.preview_data
+        for t in self.preview_transform_chain:
+            data = t.apply_transform(data)
+            self.stage_cache.append((t.signature, data))
 
         y = data.astype('float32')
         x = np.arange(len(y), dtype='float32')
@@ -397,21 +520,18 @@ class SignalPreview(QWidget):
         self.orig_sig.pos = pos
         self.trans_sig.pos = pos
 
-        # Scale
-        s_x = 1 / len(pos)
-        s_y = 1 / (np.abs(max(pos[:, 1]) - min(pos[:, 1])))
-        s = (s_x, s_y)
-
-        # Translate
-        t_x = 0
-        t_y = (-np.nanmean(pos[:, 1]) * s_y) + 0.5
-        t = (t_x, t_y)
-
-        self.orig_sig.transform = scene.transforms.STTransform(s, t)
-        self.trans_sig.transform = scene.transforms.STTransform(s, t)
+        transform = self.get_sig_transform(pos)
+        self.orig_sig.transform = transform
+        self.trans_sig.transform = transform
 
         self.parent().transform_buttons.add_btn.setDisabled(False)
 
+    def stop_worker(self):
+        self.preview_timer.stop()
+        self.preview_worker.latest_request = -1
+        self.preview_worker_thread.quit()
+        self.preview_worker_thread.wait()
+
 
 class TransformsListStack(QWidget):
 
@@ -467,6 +587,12 @@ class TransformsListStack(QWidget):
         self.stack_widget.addWidget(envelopes)
         envelopes.register_transform()
 
+        resampling = Resampling(parent=self)
+        self.transform_list.append(resampling)
+        self.stack_list.addItem(resampling.get_transform_title())
+        self.stack_widget.addWidget(resampling)
+        resampling.register_transform()
+
     def switch_stack(self, row):
         """
         Switches the widget in the stack
@@ -567,6 +693,8 @@ class Transforms(BasePluginWidget):
         self.transform_view.clear()
         self.signal_preview.orig_sig.pos = None
         self.signal_preview.trans_sig.pos = None
+        self.signal_preview.preview_data = None
+        self.signal_preview.stage_cache = []
 
         return None
 
@@ -580,6 +708,7 @@ class Transforms(BasePluginWidget):
 
     def closing_plugin(self, cancelable=False):
         """Perform actions before parent main window is closed"""
+        self.signal_preview.stop_worker()
         return True
 
     def refresh_plugin(self):
@@ -17,6 +17,7 @@ United States
 """
 
 # Std imports
+import re
 
 # Third pary imports
 from PyQt5.QtCore import pyqtSignal
@@ -39,8 +40,9 @@ class ConditionDialog(QDialog):
 
         self.columns = columns
 
-        # Strip df part
+        # Strip df part (older sessions) and column quotes
         condition = condition.replace('self.parent().df', '')
+        condition = condition.replace('`', '')
 
         # Strip brackets and quotes
         condition = condition.replace('["', '')
@@ -103,29 +105,19 @@ class ConditionDialog(QDialog):
         self.setLayout(self.layout)
 
     def construct_condition_string(self):
-        if self.condition_le.text():
+        if self.condition_le.text() and len(self.columns):
             cond_string = self.condition_le.text()
 
-            for col in self.columns:
-
-                col_i = 0
-                cl_pos = cond_string.find(col)
-                while cl_pos >= 0:
-                    corr_pos = col_i + cl_pos
-                    cond_string = (cond_string[:corr_pos+len(col)]
-                                   + '"]'
-                                   + cond_string[corr_pos+len(col):])
-                    cond_string = (cond_string[:corr_pos]
-                                   + 'self.parent().df["'
-                                   + cond_string[corr_pos:])
-                    col_i += corr_pos + len('self.parent().df["'+col+'"]') + 1
-                    cl_pos = cond_string[col_i:].find(col)
+            # Quote the columns with backticks for DataFrame.eval, longer
+            # names first so that partial matches are not quoted
+            cols = sorted(self.columns, key=len, reverse=True)
+            col_pattern = '|'.join([re.escape(col) for col in cols])
+            cond_string = re.sub(r'(?<![\w`])(' + col_pattern + r')(?![\w`])',
+                                 r'`\1`', cond_string)
 
         else:
             cond_string = ''
 
-        print(cond_string)
-
         self.condition_created.emit(cond_string)
 
         return
@@ -232,7 +224,7 @@ class HistogramDialog(QDialog):
             bin_start = edge_arr[i]
             bin_stop = edge_arr[i+1]
 
-            df_str = 'self.parent().df["'+col+'"]'
+            df_str = '`'+col+'`'
             left_edge = '('+df_str+' >= '+str(bin_start)+')'
             le_name = '['+str(bin_start)
             if i+1 < len(edge_arr):
@@ -250,7 +242,8 @@ class HistogramDialog(QDialog):
 
 class CathegoricalDialog(QDialog):
 
-    categories_strs_created = pyqtSignal(list, name='categories_strs_created')
+    categories_strs_created = pyqtSignal(str, list,
+                                         name='categories_strs_created')
 
     def __init__(self, df):
         super().__init__()
@@ -326,7 +319,7 @@ class CathegoricalDialog(QDialog):
         for row_i in range(self.cath_list.count()):
             c_item = self.cath_list.item(row_i)
             cath = c_item.text()
-            df_str = 'self.parent().df["'+col+'"]'
+            df_str = '`'+col+'`'
 
             try:
                 float(cath)
@@ -334,4 +327,4 @@ class CathegoricalDialog(QDialog):
             except ValueError:
                 eval_strs.append([df_str + ' == "' + cath + '"', cath])
 
-        self.categories_strs_created.emit(eval_strs)
+        self.categories_strs_created.emit(col, eval_strs)
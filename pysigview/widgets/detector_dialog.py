@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Dialog for whole recording event detection
+
+Ing.,Mgr. (MSc.) Jan Cimbálník, PhD.
+Biomedical engineering
+International Clinical Research Center
+St. Anne's University Hospital in Brno
+Czech Republic
+&
+Mayo systems electrophysiology lab
+Mayo Clinic
+200 1st St SW
+Rochester, MN
+United States
+"""
+
+# Std imports
+
+# Third pary imports
+from PyQt5.QtWidgets import (QDialog, QFormLayout, QLineEdit, QComboBox,
+                             QPushButton, QListWidget, QAbstractItemView,
+                             QMessageBox)
+from PyQt5.QtGui import QDoubleValidator
+
+# Local imports
+from pysigview.core.event_detection import DETECTORS
+
+
+class DetectorDialog(QDialog):
+    """
+    Collects channels, detector and its parameters for EventDetectionJob.
+    """
+
+    def __init__(self, channels, parent=None):
+        super().__init__(parent)
+
+        self.setWindowTitle('Detect events')
+        self.setModal(True)
+
+        layout = QFormLayout(self)
+
+        # Channels
+        self.channel_list = QListWidget(self)
+        self.channel_list.setSelectionMode(QAbstractItemView.MultiSelection)
+        for ch in channels:
+            self.channel_list.addItem(ch)
+        self.channel_list.selectAll()
+        layout.addRow('Channels:', self.channel_list)
+
+        # Detector
+        self.detector_cb = QComboBox(self)
+        for d in DETECTORS:
+            self.detector_cb.addItem(d)
+        layout.addRow('Detector:', self.detector_cb)
+
+        # Parameters
+        self.param_les = {}
+        for key, label, default in (('threshold', 'Threshold [SD]:', '5'),
+                                    ('window', 'Window [s]:', '0.05'),
+                                    ('low', 'Band low [Hz]:', '80'),
+                                    ('high', 'Band high [Hz]:', '250'),
+                                    ('min_duration', 'Min duration [s]:',
+                                     '0.01'),
+                                    ('max_duration', 'Max duration [s]:',
+                                     '1'),
+                                    ('merge_gap', 'Merge gap [s]:', '0')):
+            le = QLineEdit(default, self)
+            le.setValidator(QDoubleValidator(0, 1e5, 3))
+            self.param_les[key] = le
+            layout.addRow(label, le)
+
+        # OK / cancel button
+        clc_btn = QPushButton('Cancel')
+        clc_btn.clicked.connect(self.reject)
+
+        ok_btn = QPushButton('OK')
+        ok_btn.clicked.connect(self.check_input)
+
+        layout.addRow(clc_btn, ok_btn)
+
+        self.setLayout(layout)
+
+    def check_input(self):
+        params = self.get_params()
+        if params is None:
+            return
+        self.accept()
+
+    def get_params(self):
+        """
+        Returns dictionary of EventDetectionJob parameters or None if the
+        input is not valid.
+        """
+
+        try:
+            values = dict([(key, float(le.text()))
+                           for key, le in self.param_les.items()])
+        except ValueError:
+            QMessageBox.warning(self, 'Detect events',
+                                'Detector parameters must be numbers')
+            return
+
+        channels = [x.text() for x in self.channel_list.selectedItems()]
+        if not channels:
+            QMessageBox.warning(self, 'Detect events', 'Select channels')
+            return
+
+        if values['low'] <= 0 or values['low'] >= values['high']:
+            QMessageBox.warning(self, 'Detect events',
+                                'Band low must be positive and below band '
+                                'high')
+            return
+
+        if values['window'] <= 0:
+            QMessageBox.warning(self, 'Detect events',
+                                'Window must be positive')
+            return
+
+        values['band'] = (values.pop('low'), values.pop('high'))
+
+        return {'channels': channels,
+                'detector': self.detector_cb.currentText(),
+                'params': values}
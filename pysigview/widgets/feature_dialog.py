@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Dialog for whole recording feature extraction
+
+Ing.,Mgr. (MSc.) Jan Cimbálník, PhD.
+Biomedical engineering
+International Clinical Research Center
+St. Anne's University Hospital in Brno
+Czech Republic
+&
+Mayo systems electrophysiology lab
+Mayo Clinic
+200 1st St SW
+Rochester, MN
+United States
+"""
+
+# Std imports
+
+# Third pary imports
+from PyQt5.QtWidgets import (QDialog, QFormLayout, QLineEdit, QCheckBox,
+                             QLabel, QPushButton, QHBoxLayout, QFileDialog,
+                             QListWidget, QAbstractItemView, QMessageBox)
+from PyQt5.QtGui import QDoubleValidator
+
+# Local imports
+from pysigview.core.feature_extraction import FEATURES
+
+
+class FeatureDialog(QDialog):
+    """
+    Collects channels, features, window parameters and output path for
+    FeatureExtractionJob.
+    """
+
+    def __init__(self, channels, parent=None):
+        super().__init__(parent)
+
+        self.setWindowTitle('Extract features')
+        self.setModal(True)
+
+        layout = QFormLayout(self)
+
+        # Channels
+        self.channel_list = QListWidget(self)
+        self.channel_list.setSelectionMode(QAbstractItemView.MultiSelection)
+        for ch in channels:
+            self.channel_list.addItem(ch)
+        self.channel_list.selectAll()
+        layout.addRow('Channels:', self.channel_list)
+
+        # Features
+        self.feature_cbs = {}
+        for f in FEATURES:
+            cb = QCheckBox(f.replace('_', ' ').capitalize(), self)
+            cb.setChecked(True)
+            self.feature_cbs[f] = cb
+            layout.addRow(cb)
+
+        # Window
+        self.window_le = QLineEdit('1', self)
+        self.window_le.setValidator(QDoubleValidator(0, 3600, 3))
+        layout.addRow('Window [s]:', self.window_le)
+
+        self.step_le = QLineEdit('0.5', self)
+        self.step_le.setValidator(QDoubleValidator(0, 3600, 3))
+        layout.addRow('Step [s]:', self.step_le)
+
+        # Band for band power
+        self.low_le = QLineEdit('4', self)
+        self.low_le.setValidator(QDoubleValidator(0, 1e5, 2))
+        layout.addRow('Band low [Hz]:', self.low_le)
+
+        self.high_le = QLineEdit('30', self)
+        self.high_le.setValidator(QDoubleValidator(0, 1e5, 2))
+        layout.addRow('Band high [Hz]:', self.high_le)
+
+        # Output
+        self.path_le = QLineEdit(self)
+        path_btn = QPushButton('...', self)
+        path_btn.clicked.connect(self.select_path)
+        path_layout = QHBoxLayout()
+        path_layout.addWidget(self.path_le)
+        path_layout.addWidget(path_btn)
+        layout.addRow(QLabel('Output:'), path_layout)
+
+        # OK / cancel button
+        clc_btn = QPushButton('Cancel')
+        clc_btn.clicked.connect(self.reject)
+
+        ok_btn = QPushButton('OK')
+        ok_btn.clicked.connect(self.check_input)
+
+        layout.addRow(clc_btn, ok_btn)
+
+        self.setLayout(layout)
+
+    def select_path(self):
+        path, _ = QFileDialog.getSaveFileName(self, 'Feature file', '',
+                                              'HDF5 (*.h5);;NumPy (*.npy)')
+        if path:
+            self.path_le.setText(path)
+
+    def check_input(self):
+        params = self.get_params()
+        if params is None:
+            return
+        self.accept()
+
+    def get_params(self):
+        """
+        Returns dictionary of FeatureExtractionJob parameters or None if the
+        input is not valid.
+        """
+
+        try:
+            window = float(self.window_le.text())
+            step = float(self.step_le.text())
+            band = (float(self.low_le.text()), float(self.high_le.text()))
+        except ValueError:
+            QMessageBox.warning(self, 'Extract features',
+                                'Window, step and band must be numbers')
+            return
+
+        channels = [x.text() for x in self.channel_list.selectedItems()]
+        features = [f for f, cb in self.feature_cbs.items() if cb.isChecked()]
+        path = self.path_le.text()
+
+        if window <= 0 or step <= 0 or band[0] >= band[1]:
+            QMessageBox.warning(self, 'Extract features',
+                                'Window and step must be positive and band '
+                                'low must be below band high')
+            return
+
+        if not channels or not features or not path:
+            QMessageBox.warning(self, 'Extract features',
+                                'Select channels, features and output file')
+            return
+
+        return {'channels': channels,
+                'path': path,
+                'features': features,
+                'window': window,
+                'step': step,
+                'band': band}
@@ -215,7 +215,7 @@ class Preferences(QDialog):
                 # configuration of single number
                 if isinstance(option_val, int) & ~isinstance(option_val, bool):
                     tmp_widget = PreferenceLineedit(str(option_val),
-                                                    name_reference, max_len=4,
+                                                    name_reference, max_len=9,
                                                     validator=QIntValidator())
                     tmp_widget.editingFinished.connect(self._line_edit)
 
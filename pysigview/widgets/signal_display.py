@@ -18,6 +18,7 @@ United States
 
 # Std lib imports
 from time import time, sleep
+from concurrent.futures import ThreadPoolExecutor
 import pickle
 
 
@@ -35,7 +36,9 @@ from PIL import Image as pil_Image
 
 # Local imports
 from pysigview.cameras.signal_camera import SignalCamera
-from pysigview.core.visual_container import SignalContainer
+from pysigview.core.visual_container import (SignalContainer,
+                                             set_containers_data,
+                                             robust_range)
 from pysigview.visuals.multiline_visual import Multiline
 from pysigview.visuals.crosshair_visual import Crosshair
 
@@ -43,6 +46,9 @@ from pysigview.config.main import CONF
 from pysigview.config.utils import get_home_dir
 from pysigview.core import source_manager as sm
 from pysigview.core.thread_workers import TimerWorker
+from pysigview.core.transform_cache import TransformCache
+from pysigview.widgets.transforms.resample import (create_resample_transform,
+                                                   match_rate)
 from pysigview.core.source_manager import DataMap
 from pysigview.utils.qthelpers import (hex2rgba, create_toolbutton,
                                        create_plugin_layout)
@@ -83,6 +89,8 @@ class SignalDisplay(QWidget):
         self.master_pc = None
         self.master_plot = None  # TODO - to be deleted
         self.curr_pc = None
+        self._pc_grid = None  # plot grid cell -> container lookup
+        self._axes_key = None
         self.rect_rel_w_pos = None
         self.rect_rel_h_pos = None
         self.resize_flag = False
@@ -97,6 +105,15 @@ class SignalDisplay(QWidget):
 
         self.data_array = None
 
+        # Transformed data cache
+        cache_size = CONF.get(self.CONF_SECTION, 'transform_cache_size')
+        self.transform_cache = TransformCache(cache_size * 1e6)
+
+        # Thread pool for transform chains
+        self.transform_workers = 0
+        self.transform_executor = None
+        self.set_transform_executor()
+
         # Widget layout
         layout = QVBoxLayout()
         layout.setContentsMargins(0, 0, 0, 0)
@@ -251,6 +268,7 @@ class SignalDisplay(QWidget):
         # Connect signals
         self.main.sig_file_opened.connect(self.initialize_data_map)
         self.main.metadata_reloaded.connect(self.create_conglomerate_disconts)
+        self.main.metadata_reloaded.connect(self.transform_cache.invalidate)
         self.plots_changed.connect(self.set_plot_update)
         self.plots_changed.connect(self.subsample)
         self.plots_changed.connect(self.rescale_grid)
@@ -417,17 +435,12 @@ class SignalDisplay(QWidget):
         sig_w_pos = self.rect_rel_w_pos * cols
         sig_h_pos = self.rect_rel_h_pos * rows
 
-        for pc in self.get_plot_containers():
-
-            if ((pc.plot_position[0]
-                 < sig_w_pos
-                 < pc.plot_position[0]+1)
-                and (pc.plot_position[1]
-                     < sig_h_pos
-                     < pc.plot_position[1]+1)):
-
-                self.curr_pc = pc
-                break
+        grid = self.get_pc_grid()
+        col_i = int(np.floor(sig_w_pos))
+        row_i = int(np.floor(sig_h_pos))
+        if (0 <= row_i < grid.shape[0] and 0 <= col_i < grid.shape[1]
+                and grid[row_i, col_i] is not None):
+            self.curr_pc = grid[row_i, col_i]
 
         # ??? Instead of modes use event.modifiers???
 
@@ -435,7 +448,7 @@ class SignalDisplay(QWidget):
 
             self.highlight_signal(self.curr_pc)
 
-        if self.measurement_mode:
+        if self.measurement_mode and self.curr_pc is not None:
 
             self.crosshair.set_data([self.rect_rel_w_pos,
                                      self.rect_rel_h_pos])
@@ -444,40 +457,26 @@ class SignalDisplay(QWidget):
 
             # Get the location of data point
             s_y = self.curr_pc.ufact*self.curr_pc.scale_factor
-            t_y = ((-np.nanmean(self.curr_pc.data)
+            t_y = ((-self.curr_pc.stats['mean']
                     * self.curr_pc.ufact
                     * self.curr_pc.scale_factor)
                    + ((0.5+self.curr_pc.plot_position[1]) / n_channels))
 
-            data_pos = self.curr_pc.data[int(self.rect_rel_w_pos
-                                             * len(self.curr_pc.data))]
+            n_data = len(self.curr_pc.data)
+            data_pos = self.curr_pc.data[min(int(self.rect_rel_w_pos
+                                                 * n_data), n_data - 1)]
             data_pos *= s_y
             data_pos += t_y
 
             self.marker.set_data(np.array([[self.rect_rel_w_pos, data_pos]]))
 
-            # TODO: determine margins
-            # Axes
-            t_y = (self.curr_pc.plot_position[1] / n_channels)
-            y_margin = 0
-            self.xaxis.pos = [[rect.left,
-                               t_y + y_margin],
-                              [rect.left+(rect.width*self.x_tick_spacing),
-                               t_y + y_margin]]
-            rel_diff = (rect.right - rect.left) * np.diff(pc.uutc_ss)
-            self.xaxis.domain = tuple([0, rel_diff/1000000])
-            s = [1/self.x_tick_spacing, 1]
-            t = [rect.left-rect.left*s[0], 0]
-            self.xaxis.transform = scene.transforms.STTransform(s, t)
-
-            x_margin = 0
-            self.yaxis.pos = [[rect.left + x_margin,
-                               t_y],
-                              [rect.left + x_margin,
-                               t_y + ((1/n_channels)*self.y_tick_spacing)]]
-            s = [1, 1/self.y_tick_spacing]
-            t = [0, t_y-t_y*s[1]]
-            self.yaxis.transform = scene.transforms.STTransform(s, t)
+            # Axes change only with the plot, the view or the time span
+            axes_key = (self.curr_pc, tuple(self.curr_pc.plot_position),
+                        tuple(self.curr_pc.uutc_ss), n_channels, rect.left,
+                        rect.right)
+            if axes_key != self._axes_key:
+                self._axes_key = axes_key
+                self.update_measure_axes(self.curr_pc, rect, n_channels)
 
             lpos = self.measure_line.pos
             if lpos is not None:
@@ -516,6 +515,30 @@ class SignalDisplay(QWidget):
 
         self.input_recieved.emit(event)
 
+    def update_measure_axes(self, pc, rect, n_channels):
+
+        # TODO: determine margins
+        t_y = (pc.plot_position[1] / n_channels)
+        y_margin = 0
+        self.xaxis.pos = [[rect.left,
+                           t_y + y_margin],
+                          [rect.left+(rect.width*self.x_tick_spacing),
+                           t_y + y_margin]]
+        rel_diff = (rect.right - rect.left) * np.diff(pc.uutc_ss)
+        self.xaxis.domain = tuple([0, rel_diff/1000000])
+        s = [1/self.x_tick_spacing, 1]
+        t = [rect.left-rect.left*s[0], 0]
+        self.xaxis.transform = scene.transforms.STTransform(s, t)
+
+        x_margin = 0
+        self.yaxis.pos = [[rect.left + x_margin,
+                           t_y],
+                          [rect.left + x_margin,
+                           t_y + ((1/n_channels)*self.y_tick_spacing)]]
+        s = [1, 1/self.y_tick_spacing]
+        t = [0, t_y-t_y*s[1]]
+        self.yaxis.transform = scene.transforms.STTransform(s, t)
+
     def show_measure_line(self, event):
 
         if event.type != 'mouse_press':
@@ -955,6 +978,7 @@ class SignalDisplay(QWidget):
     def initialize_data_map(self):
         self.data_map.setup_data_map(sm.ODS.data_map._map)
         self.data_map.reset_data_map()
+        self.transform_cache.invalidate()
 
     # TODO: what if there are two channels with the same orig_channels
     def update_data_map_channels(self):
@@ -962,6 +986,7 @@ class SignalDisplay(QWidget):
         Updates data_map from visible_channels pane and reloads the data.
         """
 
+        self.invalidate_pc_grid()
         pcs = self.get_plot_containers()
 
         # Check if some channels are duplicate
@@ -1004,6 +1029,33 @@ class SignalDisplay(QWidget):
         items = self.visible_channels.get_container_items()
         return [x.pvc for x in items]
 
+    def get_pc_grid(self):
+        """
+        Returns array (rows x columns) with the first plot container in each
+        plot grid cell. The array is rebuilt after the layout changes.
+        """
+
+        if self._pc_grid is not None:
+            return self._pc_grid
+
+        rows = int(self.visible_channels.get_row_count())
+        cols = int(self.visible_channels.get_col_count())
+        grid = np.empty((rows, cols), object)
+
+        for pc in self.get_plot_containers():
+            col_i, row_i = int(pc.plot_position[0]), int(pc.plot_position[1])
+            if (0 <= row_i < rows and 0 <= col_i < cols
+                    and grid[row_i, col_i] is None):
+                grid[row_i, col_i] = pc
+
+        self._pc_grid = grid
+
+        return grid
+
+    def invalidate_pc_grid(self):
+        self._pc_grid = None
+        self._axes_key = None
+
     # XXX - this could probably be made into a general plot_container function
     def add_signal_container(self, orig_channel):
         container_items = self.visible_channels.get_container_items()
@@ -1036,6 +1088,8 @@ class SignalDisplay(QWidget):
 
         pc.line_color = np.array(c)
 
+        pc.transform_cache = self.transform_cache
+
         pc.data_array_pos = [np.where(ci)[0][0]]
 
         # Scale factor
@@ -1048,6 +1102,17 @@ class SignalDisplay(QWidget):
         else:
             pc.uutc_ss = [pc.start_time, pc.start_time+init_tscale]
 
+        # Mixed rate channels are decimated to common sample grid
+        if CONF.get(self.CONF_SECTION, 'common_fsamp'):
+            common_fsamp = np.min(sm.ODS.data_map['fsamp'])
+            if pc.fsamp != common_fsamp:
+                try:
+                    pc.transoform_chain_add(
+                            create_resample_transform(pc.fsamp,
+                                                      common_fsamp))
+                except ValueError as e:
+                    self.main.statusBar().showMessage(str(e), 5000)
+
         return pc
 
     def side_flash(self, color=None):
@@ -1137,6 +1202,81 @@ class SignalDisplay(QWidget):
 
         return start, stop
 
+    def get_margin_data_map(self):
+        """
+        Returns data map extended by margins required by transforms of plot
+        containers or None if no margins are needed.
+        """
+
+        margins = np.zeros(len(self.data_map), np.int64)
+        for pc in self.get_plot_containers():
+            margin = pc.get_margin()
+            if not margin:
+                continue
+            uutc_margin = int(np.ceil(margin / pc.fsamp * 1e6))
+            for pos in pc.data_array_pos:
+                margins[pos] = max(margins[pos], uutc_margin)
+
+        if not margins.any():
+            return None
+
+        margin_dm = DataMap()
+        margin_dm.setup_data_map(self.data_map._map)
+
+        ch_set = margin_dm['ch_set']
+        uutc_ss = margin_dm['uutc_ss']
+        rec_start = sm.ODS.recording_info['recording_start']
+        rec_end = sm.ODS.recording_info['recording_end']
+        uutc_ss[ch_set, 0] = np.maximum(uutc_ss[ch_set, 0] - margins[ch_set],
+                                        rec_start)
+        uutc_ss[ch_set, 1] = np.minimum(uutc_ss[ch_set, 1] + margins[ch_set],
+                                        rec_end)
+
+        return margin_dm
+
+    def get_margin_samples(self, margin_dm):
+        """
+        Returns number of samples added on left and right by margin_dm.
+        """
+
+        fsamps = sm.ODS.data_map['fsamp']
+        left = ((self.data_map['uutc_ss'][:, 0] - margin_dm['uutc_ss'][:, 0])
+                / 1e6 * fsamps).astype(int)
+        right = ((margin_dm['uutc_ss'][:, 1] - self.data_map['uutc_ss'][:, 1])
+                 / 1e6 * fsamps).astype(int)
+
+        return left, right
+
+    def set_transform_executor(self):
+        n_workers = CONF.get(self.CONF_SECTION, 'transform_workers')
+        if n_workers == self.transform_workers:
+            return
+
+        if self.transform_executor is not None:
+            self.transform_executor.shutdown(wait=True)
+            self.transform_executor = None
+
+        self.transform_workers = n_workers
+        if n_workers > 1:
+            self.transform_executor = ThreadPoolExecutor(n_workers)
+
+    def get_block_row(self, pc, pos, x, left, start, stop):
+        """
+        Cuts samples start:stop of container pc from channel data x. Channels
+        with different sampling frequency are resampled to the container's
+        rate.
+        """
+
+        fsamp = sm.ODS.data_map['fsamp'][pos]
+        if fsamp == pc.fsamp:
+            return x[left+start:left+stop]
+
+        ratio = fsamp / pc.fsamp
+        ch_start = max(left + int(round(start * ratio)), 0)
+        ch_stop = left + int(round(stop * ratio))
+
+        return match_rate(x[ch_start:ch_stop], fsamp, pc.fsamp, stop - start)
+
     # TODO - when chnaging individual channel time scale
     # the set_plot_data function is called twice - eliminate
     def set_plot_data(self, uutc_ss=None, channels=None):
@@ -1155,13 +1295,58 @@ class SignalDisplay(QWidget):
         if len(self.data_map.get_active_channels()) == 0:
             return
 
-        self.data_array = sm.PDS.get_data(self.data_map)
+        # Fetch padding for transforms that need it
+        margin_dm = self.get_margin_data_map()
+        if (margin_dm is not None
+                and getattr(sm.PDS, "is_available", None)
+                and not sm.PDS.is_available(margin_dm)):
+            margin_dm = None
+
+        if margin_dm is None:
+            self.data_array = sm.PDS.get_data(self.data_map)
+            margin_array = self.data_array
+            left = np.zeros(len(self.data_map), int)
+        else:
+            margin_array = sm.PDS.get_data(margin_dm)
+            left, right = self.get_margin_samples(margin_dm)
+            self.data_array = np.empty(len(margin_array), object)
+            for i, x in enumerate(margin_array):
+                self.data_array[i] = x[left[i]:len(x) - right[i]]
 
         pcs = self.get_plot_containers()
+        pcs_data = []
+        blocks = {}
         for pc in pcs:
             start, stop = self.calculate_sample(pc)
-            pc.data = np.array([x[start:stop] for x
-                                in self.data_array[pc.data_array_pos]])
+            pos = pc.data_array_pos
+            rows = margin_array[pos]
+
+            # Margins limited by the data that is available
+            margin = pc.get_margin()
+            l_m = min([margin] + [left[p] + start for p in pos])
+            r_m = min([margin] + [len(x) - (left[p] + stop)
+                                  for p, x in zip(pos, rows)])
+            l_m, r_m = max(l_m, 0), max(r_m, 0)
+
+            sample_start = int(round((pc.uutc_ss[0] - pc.start_time)
+                                     / 1e6 * pc.fsamp)) - l_m
+
+            # Containers of matrix montages share one block of channels
+            block_key = (tuple(pos), start, stop, l_m, r_m)
+            if block_key not in blocks:
+                block = np.array([self.get_block_row(pc, p, x, left[p],
+                                                     start - l_m, stop + r_m)
+                                  for p, x in zip(pos, rows)])
+                # Counted once per block for the transform cache keys
+                blocks[block_key] = (block,
+                                     int(np.count_nonzero(np.isnan(block))))
+            block, nan_count = blocks[block_key]
+
+            pcs_data.append((block, (l_m, r_m), sample_start, nan_count))
+
+        # Containers sharing transform chains are processed together
+        set_containers_data(pcs, pcs_data, self.transform_executor,
+                            self.transform_workers)
 
         if first_load:
             self.autoscale_plot_data(pcs[0])
@@ -1217,17 +1402,23 @@ class SignalDisplay(QWidget):
         scales = []
         offsets = []
         color_list = []
-        data = np.empty(len(self.get_plot_containers()), object)
+        pcs = self.get_plot_containers()
+        data = np.empty(len(pcs), object)
         visibility = []
-        for li, pc in enumerate(self.get_plot_containers()):
+
+        autoscale_pcs = [pc for pc in pcs if pc.autoscale]
+        if CONF.get(self.CONF_SECTION, 'autoscale_group'):
+            self.autoscale_group(autoscale_pcs)
+        else:
+            for pc in autoscale_pcs:
+                self.autoscale_plot_data(pc)
+
+        for li, pc in enumerate(pcs):
             data[li] = pc.data
             pc._visual_array_idx = li
 
             visibility.append(pc.visible)
 
-            if pc.autoscale:
-                self.autoscale_plot_data(pc)
-
             # Scale
             s_x = 1/len(pc.data)
             s_y = pc.ufact*pc.scale_factor
@@ -1236,7 +1427,7 @@ class SignalDisplay(QWidget):
 
             # Translate
             t_x = pc.plot_position[0]
-            t_y = ((-np.nanmean(pc.data)
+            t_y = ((-pc.stats['mean']
                     * pc.ufact
                     * pc.scale_factor)
                    + ((0.5+pc.plot_position[1])
@@ -1397,12 +1588,52 @@ class SignalDisplay(QWidget):
         self.update_signals()
         return
 
+    def get_autoscale_points(self):
+        # A few points per pixel are enough for robust range
+        return 4 * max(int(self.canvas.central_widget.width), 1)
+
     def autoscale_plot_data(self, pc):
-        amp_span = np.abs(np.nanmax(pc.data)
-                          - np.nanmin(pc.data))
+        """
+        Scales the container to its percentile range so that artefacts do
+        not flatten the trace. The range is estimated from display points.
+        """
+
+        percentile = CONF.get(self.CONF_SECTION, 'autoscale_percentile')
+        low, high = pc.get_robust_range(percentile,
+                                        self.get_autoscale_points())
+        amp_span = np.abs(high - low)
+        if not np.isfinite(amp_span) or amp_span == 0:
+            amp_span = np.abs(pc.stats['max'] - pc.stats['min'])
+        if not np.isfinite(amp_span) or amp_span == 0:
+            return
+
         row_span = 1 / self.visible_channels.get_row_count()
         pc.scale_factor = row_span / (amp_span * pc.ufact)
 
+    def autoscale_group(self, pcs):
+        """
+        Scales containers with the same unit by one percentile range of
+        their pooled display points so that amplitudes stay comparable.
+        """
+
+        percentile = CONF.get(self.CONF_SECTION, 'autoscale_percentile')
+        max_points = self.get_autoscale_points()
+        row_span = 1 / self.visible_channels.get_row_count()
+
+        groups = {}
+        for pc in pcs:
+            groups.setdefault(pc.unit, []).append(pc)
+
+        for group in groups.values():
+            points = np.concatenate([pc.get_display_points(max_points)
+                                     * pc.ufact for pc in group])
+            low, high = robust_range(points, percentile)
+            amp_span = np.abs(high - low)
+            if not np.isfinite(amp_span) or amp_span == 0:
+                continue
+            for pc in group:
+                pc.scale_factor = row_span / amp_span
+
     def highlight_signal(self, pc):
 
         # Determine the signal rectangle
@@ -1436,5 +1667,6 @@ class SignalDisplay(QWidget):
         # update CONF attributes from init
         self.canvas.bgcolor = CONF.get(self.CONF_SECTION,'bgcolor')
         self.color_palette = CONF.get(self.CONF_SECTION, 'color_palette')
-
-
+        cache_size = CONF.get(self.CONF_SECTION, 'transform_cache_size')
+        self.transform_cache.set_max_bytes(cache_size * 1e6)
+        self.set_transform_executor()
@@ -19,14 +19,17 @@ United States
 # Standard library imports
 
 # Third party imports
-from numpy import abs
+import numpy as np
 from PyQt5.QtCore import pyqtSignal, Qt
-from PyQt5.QtWidgets import (QVBoxLayout, QHBoxLayout, QCheckBox,
-                             QWidget, QComboBox, QLabel, QPushButton)
+from PyQt5.QtWidgets import (QVBoxLayout, QHBoxLayout, QCheckBox, QLineEdit,
+                             QWidget, QComboBox, QLabel, QPushButton,
+                             QMessageBox)
 
-from scipy.signal import hilbert
+from scipy import fft as sp_fft
+from scipy.signal import butter, sosfiltfilt
 
 # Local imports
+from pysigview.config.main import CONF
 from pysigview.core.plot_transform import BasePlotTransform
 
 
@@ -38,9 +41,107 @@ class EnvelopeTransform(BasePlotTransform):
 
         self.name = 'envelope'
         self.pow = 1
+        self.method = 'hilbert'  # hilbert, rms or rectify
+        self.fsamp = None
+        self.window = 0.1  # RMS window in seconds
+        self.cutoff = 5  # Rectify lowpass cut-off in Hz
+
+        self._sos = None
+
+    def __setstate__(self, state):
+        # Sessions saved before envelope methods were introduced
+        state.setdefault('method', 'hilbert')
+        state.setdefault('fsamp', None)
+        state.setdefault('window', 0.1)
+        state.setdefault('cutoff', 5)
+        state['_sos'] = None
+        self.__dict__.update(state)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_sos'] = None
+        return state
 
     def apply_transform(self, data):
-        return abs(hilbert(data))**self.pow
+        if self.method == 'rms':
+            env = self.rms_envelope(data)
+        elif self.method == 'rectify':
+            env = self.rectify_envelope(data)
+        else:
+            env = self.hilbert_envelope(data)
+
+        if self.pow != 1:
+            env = env**self.pow
+
+        return env
+
+    def is_batchable(self):
+        return True
+
+    def is_idempotent(self):
+        # RMS of a window held at one value is the value itself, the other
+        # methods smooth the envelope again
+        return self.method == 'rms' and self.pow == 1
+
+    def hilbert_envelope(self, data):
+        """
+        Envelope from analytic signal. The data is padded with reflections
+        to a length the FFT handles fast.
+        """
+
+        n = data.shape[-1]
+        if n < 2:
+            return np.abs(data)
+
+        pad = min(n - 1, max(1, n // 8))
+        n_fft = sp_fft.next_fast_len(n + 2 * pad)
+        pad_width = [(0, 0)] * (data.ndim - 1) + [(pad, n_fft - n - pad)]
+        padded = np.pad(data, pad_width, mode='reflect')
+
+        workers = CONF.get('transforms', 'fft_workers')
+        spec = sp_fft.fft(padded, axis=-1, workers=workers)
+
+        h = np.zeros(n_fft)
+        h[0] = 1
+        if n_fft % 2 == 0:
+            h[n_fft // 2] = 1
+            h[1:n_fft // 2] = 2
+        else:
+            h[1:(n_fft + 1) // 2] = 2
+
+        analytic = sp_fft.ifft(spec * h, axis=-1, workers=workers)
+
+        return np.abs(analytic[..., pad:pad + n])
+
+    def rms_envelope(self, data):
+        """
+        Root mean square in non-overlapping windows, held for the window
+        length.
+        """
+
+        n = data.shape[-1]
+        win = max(int(self.window * self.fsamp), 1)
+        n_win = int(np.ceil(n / win))
+
+        pad_width = [(0, 0)] * (data.ndim - 1) + [(0, n_win * win - n)]
+        padded = np.pad(data.astype('float64'), pad_width, mode='constant',
+                        constant_values=np.nan)
+        padded = padded.reshape(data.shape[:-1] + (n_win, win))
+
+        rms = np.sqrt(np.nanmean(padded**2, axis=-1))
+
+        return np.repeat(rms, win, axis=-1)[..., :n]
+
+    def rectify_envelope(self, data):
+        """
+        Rectified signal smoothed by zero phase lowpass filter.
+        """
+
+        if self._sos is None:
+            self._sos = butter(2, self.cutoff / (self.fsamp / 2),
+                               output='sos')
+
+        return sosfiltfilt(self._sos, np.abs(data), axis=-1)
 
     @property
     def transform_variables(self):
@@ -84,6 +185,12 @@ class Envelopes(QWidget):
         self.envelope_selector_label = QLabel('Select envelope type:', self)
         self.envelope_selector = QComboBox(self)
         self.envelope_selector.addItem('Hilbert')
+        self.envelope_selector.addItem('RMS')
+        self.envelope_selector.addItem('Rectify + lowpass')
+
+        # Window / cut-off of the cheap envelopes
+        self.param_label = QLabel('RMS window (s):', self)
+        self.param_le = QLineEdit('0.1', self)
 
         # Checkbox Power sublayout
         envelope_sublayout = QHBoxLayout()
@@ -100,6 +207,8 @@ class Envelopes(QWidget):
         # Assemble the layout
         envelope_layout.addWidget(self.envelope_selector_label)
         envelope_layout.addWidget(self.envelope_selector)
+        envelope_layout.addWidget(self.param_label)
+        envelope_layout.addWidget(self.param_le)
 
         envelope_sublayout.addWidget(self.envelope_check_label)
         envelope_sublayout.addWidget(self.envelope_check_power)
@@ -112,26 +221,67 @@ class Envelopes(QWidget):
 
         self.setLayout(layout)
 
+        self.set_e_layout()
+
         # Connect signals
+        self.envelope_selector.currentIndexChanged.connect(
+                self.set_e_layout)
         self.envelope_selector.currentIndexChanged.connect(
                 self.set_preview_transform)
         # TODO how connect checkbox to preview, should it be even connected?
 
         self.set_button.clicked.connect(self.set_preview_transform)
 
+    def set_e_layout(self):
+        selected_envelope = self.envelope_selector.currentText()
+        if selected_envelope == 'RMS':
+            self.param_label.setText('RMS window (s):')
+            self.param_le.setText('0.1')
+        elif selected_envelope == 'Rectify + lowpass':
+            self.param_label.setText('Lowpass cut-off (Hz):')
+            self.param_le.setText('5')
+
+        hilbert = selected_envelope == 'Hilbert'
+        self.param_label.setHidden(hilbert)
+        self.param_le.setHidden(hilbert)
+
     def create_transform(self, vc):
 
-        fs = vc.fsamp
+        fs = vc.get_output_fsamp()
         if fs is None:
             return
 
         # Create the transform object
         transform = EnvelopeTransform()
+        transform.fsamp = fs
 
         if self.envelope_check_power.isChecked():
             transform.pow = 2
 
-        transform.name = ('/SignalEnvelope')
+        selected_envelope = self.envelope_selector.currentText()
+        if selected_envelope == 'Hilbert':
+            transform.name = ('/SignalEnvelope')
+            return transform
+
+        try:
+            param = float(self.param_le.text())
+        except ValueError:
+            QMessageBox.warning(self, 'Envelope',
+                                'Window / cut-off must be a number')
+            return
+
+        if selected_envelope == 'RMS':
+            transform.method = 'rms'
+            transform.window = param
+            transform.name = ('/RMSEnvelope')
+        elif selected_envelope == 'Rectify + lowpass':
+            if param >= fs / 2:
+                QMessageBox.warning(self, 'Envelope',
+                                    'Cut-off must be below Nyquist frequency')
+                return
+            transform.method = 'rectify'
+            transform.cutoff = param
+            transform.name = ('/RectifiedEnvelope')
 
         return transform
 
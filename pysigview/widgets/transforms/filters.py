@@ -19,39 +19,129 @@ United States
 """
 
 # Standard library imports
+from functools import lru_cache
 
 # Third party imports
 from PyQt5.QtCore import pyqtSignal, Qt
+import numpy as np
 from PyQt5.QtWidgets import (QVBoxLayout,
-                             QWidget, QLineEdit,
+                             QWidget, QLineEdit, QCheckBox,
                              QComboBox, QLabel, QMessageBox, QPushButton)
 
-from scipy.signal import butter, filtfilt
+from scipy.signal import (butter, iirnotch, sosfilt, sosfiltfilt,
+                          sosfilt_zi, tf2sos)
 
 # Local imports
+from pysigview.config.main import CONF
 from pysigview.core.plot_transform import BasePlotTransform
 
 
+@lru_cache(maxsize=32)
+def get_notch_sos(fsamp, f0, q, harmonics):
+    """
+    Returns second order sections of notch filters at f0 and its harmonics
+    below Nyquist frequency cascaded into one filter. Designs are cached,
+    the returned array must not be modified.
+    """
+
+    sections = []
+    for k in range(1, harmonics + 1):
+        if k * f0 >= fsamp / 2:
+            break
+        b, a = iirnotch(k * f0, q, fs=fsamp)
+        sections.append(tf2sos(b, a))
+
+    if not sections:
+        return None
+
+    sos = np.vstack(sections)
+    sos.flags.writeable = False
+
+    return sos
+
+
 class FilterTransform(BasePlotTransform):
 
     def __init__(self):
         super().__init__()
 
         self.name = 'filter'
-        self.a = None
-        self.b = None
+        self.sos = None
+        self.zero_phase = True
+        self.margin = 0  # in seconds
+
+    def __setstate__(self, state):
+        # Sessions saved before SOS filtering hold b, a coefficients
+        if state.get('sos') is None and state.get('b') is not None:
+            state['sos'] = tf2sos(state.pop('b'), state.pop('a'))
+        state.setdefault('zero_phase', True)
+        state.setdefault('margin', 0)
+        self.__dict__.update(state)
+
+    def is_noop(self):
+        return self.sos is None or not len(self.sos)
+
+    def fuse(self, other):
+        # Cascade of linear filters is a single filter with stacked sections
+        if (not isinstance(other, FilterTransform)
+                or other.zero_phase != self.zero_phase):
+            return None
+
+        transform = FilterTransform()
+        transform.sos = np.vstack([self.sos, other.sos])
+        transform.zero_phase = self.zero_phase
+        transform.margin = self.margin + other.margin
+        transform.name = self.name + other.name
+
+        return transform
+
+    def is_batchable(self):
+        # Causal filtering keeps state per container
+        return self.zero_phase
+
+    def get_margin(self, fsamp):
+        max_margin = CONF.get('transforms', 'max_margin')
+        return int(np.ceil(min(self.margin, max_margin) * fsamp))
 
     def apply_transform(self, data):
-        return filtfilt(self.b, self.a, data)
+        if self.zero_phase:
+            return sosfiltfilt(self.sos, data)
+        else:
+            return sosfilt(self.sos, data)
+
+    def apply_container_transform(self, data, vc):
+        if (self.zero_phase or vc.data_sample_start is None
+                or data.ndim != 1):
+            return self.apply_transform(data)
+
+        first = vc.data_sample_start
+        last = first + len(data)
+
+        # Forward pan over contiguous data - filter only the new samples
+        # State carried over NaN gap is NaN, start over in that case
+        state = vc.transform_states.get(self)
+        if state is not None and np.isfinite(state[3]).all():
+            s_first, s_last, s_out, s_zi = state
+            if s_first <= first <= s_last <= last:
+                new_out, zi = sosfilt(self.sos, data[s_last - first:],
+                                      zi=s_zi)
+                out = np.concatenate([s_out[first - s_first:], new_out])
+                vc.transform_states[self] = (first, last, out, zi)
+                return out
+
+        x0 = data[0] if np.isfinite(data[0]) else 0
+        out, zi = sosfilt(self.sos, data, zi=sosfilt_zi(self.sos) * x0)
+        vc.transform_states[self] = (first, last, out, zi)
+
+        return out
 
     @property
     def transform_variables(self):
-        return (self.a, self.b)
+        return self.sos
 
     @transform_variables.setter
-    def transforms_variables(self, a, b):
-        self.a = a
-        self.b = b
+    def transforms_variables(self, sos):
+        self.sos = sos
 
 
 class Filters(QWidget):
@@ -88,6 +178,7 @@ class Filters(QWidget):
         self.filter_selector_label = QLabel('Select filter type:', self)
         self.filter_selector = QComboBox(self)
         self.filter_selector.addItem('Butterworth')
+        self.filter_selector.addItem('Notch')
 
         # Filter cut-offs
         self.low_cutoff_label = QLabel('Low cutoff:', self)
@@ -100,6 +191,10 @@ class Filters(QWidget):
         self.poles_label = QLabel('N poles:', self)
         self.poles_le = QLineEdit(self)
 
+        # Zero phase / causal
+        self.zero_phase_cb = QCheckBox('Zero phase', self)
+        self.zero_phase_cb.setChecked(True)
+
         # Set button
         self.set_button = QPushButton('Set', self)
 
@@ -119,6 +214,8 @@ class Filters(QWidget):
         filter_layout.addWidget(self.poles_label)
         filter_layout.addWidget(self.poles_le)
 
+        filter_layout.addWidget(self.zero_phase_cb)
+
         filter_layout.addWidget(self.set_button)
 
         layout.addLayout(filter_layout)
@@ -127,21 +224,75 @@ class Filters(QWidget):
         self.setLayout(layout)
 
         # Connect signals
+        self.filter_selector.currentIndexChanged.connect(self.set_f_layout)
         self.filter_selector.currentIndexChanged.connect(
                 self.set_preview_transform)
         self.low_cutoff_le.returnPressed.connect(self.set_preview_transform)
         self.high_cutoff_le.returnPressed.connect(self.set_preview_transform)
         self.poles_le.returnPressed.connect(self.set_preview_transform)
+        self.zero_phase_cb.stateChanged.connect(self.set_preview_transform)
         self.set_button.clicked.connect(self.set_preview_transform)
 
+    def set_f_layout(self):
+        if self.filter_selector.currentText() == 'Notch':
+            self.low_cutoff_label.setText('Line frequency:')
+            self.low_cutoff_le.setText('50')
+            self.high_cutoff_label.setText('Quality factor:')
+            self.high_cutoff_le.setText('30')
+            self.poles_label.setText('N harmonics:')
+            self.poles_le.setText('3')
+        else:
+            self.low_cutoff_label.setText('Low cutoff:')
+            self.low_cutoff_le.setText('')
+            self.high_cutoff_label.setText('High cutoff:')
+            self.high_cutoff_le.setText('')
+            self.poles_label.setText('N poles:')
+            self.poles_le.setText('')
+
+    def create_notch_transform(self, fs):
+
+        try:
+            f0 = float(self.low_cutoff_le.text())
+            q = float(self.high_cutoff_le.text())
+            harmonics = int(self.poles_le.text())
+        except ValueError:
+            QMessageBox.warning(self, 'Notch', 'Line frequency, quality '
+                                'factor and harmonics must be numbers')
+            return
+
+        if f0 <= 0 or q <= 0 or harmonics < 1:
+            QMessageBox.warning(self, 'Notch', 'Notch parameters must be '
+                                'positive')
+            return
+
+        sos = get_notch_sos(float(fs), f0, q, harmonics)
+        if sos is None:
+            QMessageBox.warning(self, 'Notch', 'Line frequency must be below '
+                                'Nyquist frequency')
+            return
+
+        # Greate the transform object
+        transform = FilterTransform()
+        transform.sos = sos
+        transform.zero_phase = self.zero_phase_cb.isChecked()
+        # Notch transients decay with time constant Q / (pi * f0)
+        transform.margin = 3 * q / (np.pi * f0)
+        transform.name = (' / Notch; ' + self.low_cutoff_le.text() + 'Hz x'
+                          + str(len(sos)))
+
+        return transform
+
     def create_transform(self, vc):
 
-        fs = vc.fsamp
+        fs = vc.get_output_fsamp()
         if fs is None:
             return
 
         # Design the filter
         selected_filter = self.filter_selector.currentText()
+        if selected_filter == 'Notch':
+            return self.create_notch_transform(fs)
+
         low_fc_str = self.low_cutoff_le.text()
         high_fc_str = self.high_cutoff_le.text()
         poles_str = self.poles_le.text()
@@ -168,19 +319,22 @@ class Filters(QWidget):
 
         if selected_filter == 'Butterworth':
             if low_fc and high_fc:
-                b, a = butter(poles, [low_fc/(fs/2),
-                                      high_fc/(fs/2)], 'bandpass')
+                sos = butter(poles, [low_fc/(fs/2),
+                                     high_fc/(fs/2)], 'bandpass',
+                             output='sos')
             elif low_fc and not high_fc:
-                b, a = butter(poles, low_fc/(fs/2), 'highpass')
+                sos = butter(poles, low_fc/(fs/2), 'highpass', output='sos')
             elif not low_fc and high_fc:
-                b, a = butter(poles, high_fc/(fs/2), 'lowpass')
+                sos = butter(poles, high_fc/(fs/2), 'lowpass', output='sos')
             else:
                 return
 
         # Greate the transform object
         transform = FilterTransform()
-        transform.a = a
-        transform.b = b
+        transform.sos = sos
+        transform.zero_phase = self.zero_phase_cb.isChecked()
+        # Transients decay within a few periods of the lowest cut-off
+        transform.margin = poles / min([x for x in (low_fc, high_fc) if x])
         transform.name = (' / ' + selected_filter + '; '
                           + '-'.join([low_fc_str, high_fc_str]) + 'Hz')
 
@@ -17,9 +17,12 @@ United States
 """
 
 # Standard library imports
+import hashlib
+from threading import Lock
 
 # Third party imports
 import numpy as np
+from scipy import sparse
 from PyQt5.QtCore import pyqtSignal, Qt
 from PyQt5.QtWidgets import (QVBoxLayout, QWidget, QComboBox, QLabel,
                              QPushButton)
@@ -41,6 +44,9 @@ class MontageTransform(BasePlotTransform):
     def apply_transform(self, data):
         return data[0] - data[1]
 
+    def is_noop(self):
+        return self.second_channel is None
+
     def modify_visual_container(self, vc):
         vc.add_channels.append(self.second_channel)
         vc.data_array_pos.append(self.second_channel_pos)
@@ -55,6 +61,162 @@ class MontageTransform(BasePlotTransform):
         self.second_channel_pos = second_channel_pos
 
 
+class MontageMatrix:
+    """
+    Reference matrix over a block of source channels. The derived signal of
+    source channel i is weights[i] @ block, all derived signals are
+    computed with one matrix multiplication.
+    """
+
+    def __init__(self, channels, positions, weights):
+
+        self.channels = list(channels)
+        self.positions = list(positions)
+        self.weights = weights
+
+        self.row_index = dict([(ch, i) for i, ch in enumerate(self.channels)])
+
+        # Weights are fixed so the signature is computed just once
+        if sparse.issparse(weights):
+            dense_weights = weights.toarray()
+        else:
+            dense_weights = np.asarray(weights)
+        h = hashlib.sha1(repr(self.channels).encode())
+        h.update(np.ascontiguousarray(dense_weights, 'float64').tobytes())
+        self.signature = h.hexdigest()
+
+        self._block = None
+        self._result = None
+        self._lock = Lock()
+
+    def __repr__(self):
+        return 'MontageMatrix(' + self.signature + ')'
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_block'] = None
+        state['_result'] = None
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = Lock()
+
+    def apply(self, block):
+        """
+        Returns all derived signals. The result is kept for the last block so
+        that containers sharing it trigger only one multiplication. The block
+        itself is referenced (not its address) so that a new block allocated
+        at the same memory is not mistaken for it.
+        """
+
+        with self._lock:
+            if block is not self._block:
+                self._result = np.asarray(self.weights @ block)
+                self._block = block
+            return self._result
+
+    def apply_row(self, block, channel):
+        row = self.weights[self.row_index[channel]]
+        return np.asarray(row @ block).ravel()
+
+
+def group_channels(channels):
+    """
+    Groups channels by their name without digits (i.e. electrodes), keeps
+    the order of channels.
+    """
+
+    groups = {}
+    for ci, ch in enumerate(channels):
+        stub = ''.join([i for i in ch if not i.isdigit()])
+        groups.setdefault(stub, []).append(ci)
+
+    return list(groups.values())
+
+
+def common_average_matrix(channels):
+    n = len(channels)
+    return np.eye(n) - np.ones([n, n]) / n
+
+
+def bipolar_chain_matrix(channels):
+    """
+    Each channel minus the next one of the same electrode. The last channel
+    of an electrode stays referential.
+    """
+
+    n = len(channels)
+    weights = sparse.lil_matrix((n, n))
+    for group in group_channels(channels):
+        for ci in group:
+            weights[ci, ci] = 1
+        for ci, next_ci in zip(group[:-1], group[1:]):
+            weights[ci, next_ci] = -1
+
+    return weights.tocsr()
+
+
+def laplacian_matrix(channels):
+    """
+    Each channel minus the mean of its neighbours on the same electrode.
+    """
+
+    n = len(channels)
+    weights = sparse.lil_matrix((n, n))
+    for group in group_channels(channels):
+        for gi, ci in enumerate(group):
+            weights[ci, ci] = 1
+            neighbours = group[max(gi-1, 0):gi] + group[gi+1:gi+2]
+            for ni in neighbours:
+                weights[ci, ni] = -1 / len(neighbours)
+
+    return weights.tocsr()
+
+
+MATRIX_MONTAGES = {'Common average': (common_average_matrix, 'CAR'),
+                   'Bipolar chain': (bipolar_chain_matrix, 'BIP'),
+                   'Laplacian': (laplacian_matrix, 'LAP')}
+
+
+class MatrixMontageTransform(BasePlotTransform):
+
+    def __init__(self):
+        super().__init__()
+
+        self.name = 'matrix montage'
+        self.montage = None
+        self.channel = None
+
+    def apply_transform(self, data):
+        return self.montage.apply_row(data, self.channel)
+
+    def apply_container_transform(self, data, vc):
+        # Channels outside of the montage block (i.e. different fsamp)
+        if vc.orig_channel not in self.montage.row_index:
+            return data
+        if data.ndim != 2:
+            return self.apply_transform(data)
+        return self.montage.apply(data)[self.montage.row_index[
+                vc.orig_channel]]
+
+    def modify_visual_container(self, vc):
+        if vc.orig_channel not in self.montage.row_index:
+            return
+        vc.add_channels = [x for x in self.montage.channels
+                           if x != vc.orig_channel]
+        vc.data_array_pos = list(self.montage.positions)
+
+    @property
+    def transform_variables(self):
+        return self.montage
+
+    @transform_variables.setter
+    def transforms_variables(self, montage):
+        self.montage = montage
+
+
 class Montages(QWidget):
 
     # Attributes
@@ -89,6 +251,8 @@ class Montages(QWidget):
         self.montage_selector_label = QLabel('Select montage type:', self)
         self.montage_selector = QComboBox(self)
         self.montage_selector.addItem('Unipolar')
+        for montage_name in MATRIX_MONTAGES.keys():
+            self.montage_selector.addItem(montage_name)
 
         # Channel selector for montage
         self.channel_selector_label = QLabel('Select channel:', self)
@@ -115,8 +279,10 @@ class Montages(QWidget):
                 self.set_second_channel)
         self.set_button.clicked.connect(self.set_preview_transform)
 
-    def set_m_layout(self, int):
-        return
+    def set_m_layout(self, idx):
+        unipolar = self.montage_selector.currentText() == 'Unipolar'
+        self.channel_selector_label.setEnabled(unipolar)
+        self.channel_selector.setEnabled(unipolar)
 
     def set_second_channel(self, ch_idx):
         if ch_idx < 0:
@@ -131,8 +297,38 @@ class Montages(QWidget):
         for channel in sm.ODS.data_map['channels']:
             self.channel_selector.addItem(channel)
 
+    def create_matrix_transform(self, vc):
+
+        selected_montage = self.montage_selector.currentText()
+        generator, abbrev = MATRIX_MONTAGES[selected_montage]
+
+        # Source channels are the displayed channels with the same fsamp
+        channels = []
+        for pc in self.main.signal_display.get_plot_containers():
+            if pc.fsamp == vc.fsamp and pc.orig_channel not in channels:
+                channels.append(pc.orig_channel)
+        if vc.orig_channel not in channels:
+            channels.append(vc.orig_channel)
+
+        positions = [np.where(sm.PDS.data_map['channels'] == x)[0][0]
+                     for x in channels]
+
+        montage = MontageMatrix(channels, positions, generator(channels))
+
+        # Greate the transform object
+        transform = MatrixMontageTransform()
+        transform.montage = montage
+        transform.channel = vc.orig_channel
+        transform.name = ' / ' + abbrev
+        transform.modify_visual_container(vc)
+
+        return transform
+
     def create_transform(self, vc):
 
+        if self.montage_selector.currentText() in MATRIX_MONTAGES:
+            return self.create_matrix_transform(vc)
+
         # Design the filter
         selected_channel = self.channel_selector.currentText()
 
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Resampling signal transform
+
+Ing.,Mgr. (MSc.) Jan Cimbálník, PhD.
+Biomedical engineering
+International Clinical Research Center
+St. Anne's University Hospital in Brno
+Czech Republic
+&
+Mayo systems electrophysiology lab
+Mayo Clinic
+200 1st St SW
+Rochester, MN
+United States
+"""
+
+# Standard library imports
+from fractions import Fraction
+from functools import lru_cache
+
+# Third party imports
+import numpy as np
+from PyQt5.QtCore import pyqtSignal, Qt
+from PyQt5.QtWidgets import (QVBoxLayout, QWidget, QLineEdit, QLabel,
+                             QMessageBox, QPushButton)
+
+from scipy.signal import firwin, resample_poly
+
+# Local imports
+from pysigview.core.plot_transform import BasePlotTransform
+
+
+MAX_RATE_FACTOR = 10000
+
+
+def get_rate_ratio(fs_in, fs_out, max_factor=MAX_RATE_FACTOR):
+    """
+    Returns exact (up, down) ratio of sampling frequencies. Raises
+    ValueError if up or down is larger than max_factor since the filter
+    would be too long.
+    """
+
+    # Decimal representation keeps i.e. 32556 / 5000 exact
+    ratio = (Fraction(repr(float(fs_out)))
+             / Fraction(repr(float(fs_in))))
+    up, down = ratio.numerator, ratio.denominator
+    if max(up, down) > max_factor:
+        raise ValueError('Cannot resample {} Hz to {} Hz exactly, rate '
+                         'factor {}/{} is too large'.format(fs_in, fs_out,
+                                                            up, down))
+
+    return up, down
+
+
+@lru_cache(maxsize=64)
+def get_polyphase_design(fs_in, fs_out):
+    """
+    Returns (up, down, taps) of polyphase resampling from fs_in to fs_out
+    with exact rate ratio. Designs are cached, the taps must not be
+    modified.
+    """
+
+    up, down = get_rate_ratio(fs_in, fs_out)
+
+    # Same design as scipy.signal.resample_poly default
+    max_rate = max(up, down)
+    half_len = 10 * max_rate
+    taps = firwin(2 * half_len + 1, 1 / max_rate, window=('kaiser', 5.0))
+    taps.flags.writeable = False
+
+    return up, down, taps
+
+
+def resample(data, fs_in, fs_out):
+    """
+    Resamples data along the last axis using cached polyphase design.
+    """
+
+    up, down, taps = get_polyphase_design(fs_in, fs_out)
+    if up == down:
+        return data
+
+    return resample_poly(data, up, down, axis=-1, window=taps)
+
+
+def match_rate(data, fs_in, fs_out, n):
+    """
+    Resamples data to fs_out and fits the result to n samples, used to put
+    channels with different rates into one block. Rates without short exact
+    ratio are interpolated onto the target grid.
+    """
+
+    try:
+        data = resample(data, fs_in, fs_out)
+    except ValueError:
+        t_in = np.arange(data.shape[-1]) / fs_in
+        t_out = np.arange(n) / fs_out
+        data = np.apply_along_axis(lambda x: np.interp(t_out, t_in, x), -1,
+                                   data)
+    if data.shape[-1] >= n:
+        return data[..., :n]
+
+    pad_width = [(0, 0)] * (data.ndim - 1) + [(0, n - data.shape[-1])]
+    return np.pad(data, pad_width, mode='edge')
+
+
+class ResampleTransform(BasePlotTransform):
+
+    def __init__(self):
+        super().__init__()
+
+        self.name = 'resample'
+        self.fsamp = None
+        self.target_fsamp = None
+
+    def apply_transform(self, data):
+        return resample(data, self.fsamp, self.target_fsamp)
+
+    def apply_container_transform(self, data, vc):
+        # Following stateful transforms count samples at the new rate
+        if vc.data_sample_start is not None:
+            up, down, _ = get_polyphase_design(self.fsamp, self.target_fsamp)
+            vc.data_sample_start = int(round(vc.data_sample_start
+                                             * up / down))
+        return self.apply_transform(data)
+
+    def is_noop(self):
+        up, down, _ = get_polyphase_design(self.fsamp, self.target_fsamp)
+        return up == down
+
+    def is_batchable(self):
+        return True
+
+    def get_margin(self, fsamp):
+        up, down, taps = get_polyphase_design(self.fsamp, self.target_fsamp)
+        return int(np.ceil(len(taps) / 2 / up))
+
+    def get_output_fsamp(self, fsamp):
+        up, down, _ = get_polyphase_design(self.fsamp, self.target_fsamp)
+        return fsamp * up / down
+
+    def get_output_length(self, n):
+        up, down, _ = get_polyphase_design(self.fsamp, self.target_fsamp)
+        return int(np.ceil(n * up / down))
+
+    @property
+    def transform_variables(self):
+        return self.target_fsamp
+
+    @transform_variables.setter
+    def transforms_variables(self, target_fsamp):
+        self.target_fsamp = target_fsamp
+
+
+def create_resample_transform(fsamp, target_fsamp):
+    """
+    Raises ValueError if fsamp cannot be resampled to target_fsamp exactly.
+    """
+
+    get_polyphase_design(fsamp, target_fsamp)
+
+    transform = ResampleTransform()
+    transform.fsamp = fsamp
+    transform.target_fsamp = target_fsamp
+    transform.name = '/RS' + str(int(target_fsamp))
+    return transform
+
+
+class Resampling(QWidget):
+
+    # Attributes
+    CONF_SUBSECTION = 'resampling'
+    IMG_PATH = 'images'
+    shortcut = None
+
+    # Signals
+    filters_transform_changed = pyqtSignal(name='filters_transform_changed')
+
+    def __init__(self, parent):
+        super(Resampling, self).__init__(parent)
+
+        self.transform_list_stack = self.parent()
+        self.preview = self.transform_list_stack.parent().signal_preview
+        self.main = self.transform_list_stack.main
+
+        self.title = 'Resampling'
+
+        # Transform
+        self.preview_transform = None
+
+        # Master layout
+        layout = QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        # Target frequency
+        self.fsamp_label = QLabel('Target frequency (Hz):', self)
+        self.fsamp_le = QLineEdit(self)
+
+        # Set button
+        self.set_button = QPushButton('Set', self)
+
+        # Assemble the layout
+        layout.addWidget(self.fsamp_label)
+        layout.addWidget(self.fsamp_le)
+        layout.addWidget(self.set_button)
+        layout.setAlignment(Qt.AlignTop)
+
+        self.setLayout(layout)
+
+        # Connect signals
+        self.set_button.clicked.connect(self.set_preview_transform)
+
+    def create_transform(self, vc):
+
+        try:
+            target_fsamp = float(self.fsamp_le.text())
+        except ValueError:
+            QMessageBox.warning(self, 'Resampling',
+                                'Target frequency must be a number')
+            return
+
+        if target_fsamp <= 0:
+            QMessageBox.warning(self, 'Resampling',
+                                'Target frequency must be positive')
+            return
+
+        try:
+            return create_resample_transform(vc.get_output_fsamp(),
+                                             target_fsamp)
+        except ValueError as e:
+            QMessageBox.warning(self, 'Resampling', str(e))
+            return
+
+    # ??? Should be part of transforms API??
+    def set_preview_transform(self):
+
+        vc = self.preview.preview_pvc
+        self.preview.preview_temp_transform = self.create_transform(vc)
+        self.preview.update_trans_sig()
+
+    # ----- Transforms API -----
+    def get_transform_title(self):
+        """Return widget title"""
+        return self.title
+
+    def register_transform(self):
+        """
+        Register transform in Transforms plugin.
+        """
+
+        # Connect signals
+
+        return
@@ -146,7 +146,8 @@ setup_args = dict(name='pysigview',
                                     'pyopengl', 'pandas', 'scipy',
                                     'sqlalchemy', 'pymysql', 'pysigview_cs',
                                     'pillow', 'jupyter',
-                                    'pymef', 'pydread', 'h5py'],
+                                    'pymef', 'pydread', 'h5py', 'pyarrow',
+                                    'matplotlib'],
                   zip_safe=False,
                   classifiers=['License :: OSI Approved :: MIT License',
                                'Operating System :: MacOS',
@@ -157,7 +158,10 @@ setup_args = dict(name='pysigview',
                                'Topic :: Scientific/Engineering'],
                   data_files=get_data_files(),
                   entry_points={'gui_scripts': [
-                                'pysigview = pysigview.app.start:main']},
+                                'pysigview = pysigview.app.start:main'],
+                                'console_scripts': [
+                                'pysigview-render = '
+                                'pysigview.app.batch_render:main']},
                   cmdclass=CMDCLASS)
 
 # =============================================================================
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Time range reads of columnar annotation files
+
+Ing.,Mgr. (MSc.) Jan Cimbálník, PhD.
+Biomedical engineering
+International Clinical Research Center
+St. Anne's University Hospital in Brno
+Czech Republic
+&
+Mayo systems electrophysiology lab
+Mayo Clinic
+200 1st St SW
+Rochester, MN
+United States
+"""
+
+# Std imports
+
+# Third pary imports
+import numpy as np
+import pandas as pd
+import pytest
+
+# Local imports
+pytest.importorskip('pyarrow')
+from pysigview.plugins.annotation_formats.parquet import parquetHandler  # noqa
+from pysigview.plugins.annotation_formats.feather import featherHandler  # noqa
+
+
+@pytest.mark.parametrize('handler_class', [parquetHandler, featherHandler])
+def test_read_float_bounds(tmp_path, handler_class):
+    df = pd.DataFrame({'start_time': np.array([10, 20, 30], 'int64'),
+                       'end_time': [15., np.nan, 35.]})
+
+    handler = handler_class()
+    handler.set_path(str(tmp_path / ('annotations' + handler.extension)))
+    handler.write(df)
+
+    assert handler.read((15.5, 30.))['start_time'].tolist() == [20]
+    assert handler.read((10.5, 30.))['start_time'].tolist() == [10, 20]
+    assert handler.read((10, 30.5))['start_time'].tolist() == [10, 20, 30]
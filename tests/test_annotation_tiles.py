@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Annotation tile caches
+
+Ing.,Mgr. (MSc.) Jan Cimbálník, PhD.
+Biomedical engineering
+International Clinical Research Center
+St. Anne's University Hospital in Brno
+Czech Republic
+&
+Mayo systems electrophysiology lab
+Mayo Clinic
+200 1st St SW
+Rochester, MN
+United States
+"""
+
+# Std imports
+
+# Third pary imports
+import numpy as np
+import pandas as pd
+import pytest
+
+# Local imports
+sqla = pytest.importorskip('sqlalchemy')
+from pysigview.core.annotation_tiles import DatabaseTileCache  # noqa
+
+TILE_SPAN = 100
+
+
+@pytest.fixture
+def tile_cache():
+    engine = sqla.create_engine('sqlite://')
+    df = pd.DataFrame({'start': [50, 150, 250, 350],
+                       'stop': [320, np.nan, 260, 360],
+                       'ch': ['a', 'b', 'c', 'd']})
+    df.to_sql('annotations', engine, index=False)
+
+    return DatabaseTileCache(engine, 'annotations', 'start', 'stop', 'ch',
+                             tile_span=TILE_SPAN, max_tiles=2)
+
+
+def test_tiles_overlap(tile_cache):
+    # Annotation starting before the first tile runs into the view
+    tile_cache.fetch_tiles(tile_cache.get_missing_tiles([200, 300]))
+    df = tile_cache.get_dataframe()
+
+    assert sorted(df['channel']) == ['a', 'c']
+
+
+def test_tiles_output_once(tile_cache):
+    tile_cache.max_tiles = 4
+    tile_cache.fetch_tiles(tile_cache.get_missing_tiles([0, 400]))
+    df = tile_cache.get_dataframe()
+
+    assert sorted(df['channel']) == ['a', 'b', 'c', 'd']
+
+
+def test_tiles_lru(tile_cache):
+    tile_cache.fetch_tiles(tile_cache.get_missing_tiles([0, 200]))
+
+    # Viewing tile 0 again makes tile 1 the least recently used
+    tile_cache.get_missing_tiles([0, 100])
+    tile_cache.fetch_tiles(tile_cache.get_missing_tiles([300, 400]))
+
+    assert sorted(tile_cache._tiles.keys()) == [0, 3]
+
+
+def test_tiles_failure(tile_cache):
+    tile_cache.table = 'missing'
+    with pytest.raises(Exception):
+        tile_cache.fetch_tiles(tile_cache.get_missing_tiles([0, 100]))
+
+    # Failed cache is not queried again until it is cleared
+    assert tile_cache.get_missing_tiles([0, 100]) == []
+    tile_cache.clear()
+    assert tile_cache.get_missing_tiles([0, 100]) == [0]
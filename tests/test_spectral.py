@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Spectral estimates checked against scipy.signal
+
+Ing.,Mgr. (MSc.) Jan Cimbálník, PhD.
+Biomedical engineering
+International Clinical Research Center
+St. Anne's University Hospital in Brno
+Czech Republic
+&
+Mayo systems electrophysiology lab
+Mayo Clinic
+200 1st St SW
+Rochester, MN
+United States
+"""
+
+# Std imports
+
+# Third pary imports
+import numpy as np
+from scipy import signal
+
+# Local imports
+from pysigview.core.spectral import (welch_psd, cross_spectral_matrix,
+                                     band_matrix, SpectrogramTiles)
+
+FSAMP = 250.
+
+
+def get_data(n_ch=3, n=5000):
+    rng = np.random.default_rng(0)
+    t = np.arange(n) / FSAMP
+    common = np.sin(2 * np.pi * 10 * t)
+    return np.vstack([common + rng.standard_normal(n)
+                      for _ in range(n_ch)])
+
+
+def test_welch_psd():
+    data = get_data()[0]
+    for n_fft in (256, 255):
+        freqs, psd = welch_psd(data, FSAMP, n_fft, 0.5, 'hann')
+        ref_freqs, ref = signal.welch(data, FSAMP, 'hann', n_fft,
+                                      n_fft - int(n_fft * 0.5),
+                                      detrend='constant')
+        np.testing.assert_allclose(freqs, ref_freqs)
+        np.testing.assert_allclose(psd, ref, rtol=1e-10)
+
+
+def test_cross_spectral_matrix():
+    data = get_data()
+    for n_fft in (256, 255):
+        freqs, csd = cross_spectral_matrix(data, FSAMP, n_fft, 0.5, 'hann')
+        for i in range(len(data)):
+            for j in range(len(data)):
+                _, ref = signal.csd(data[i], data[j], FSAMP, 'hann', n_fft,
+                                    n_fft - int(n_fft * 0.5),
+                                    detrend='constant')
+                # scipy conjugates the first signal
+                np.testing.assert_allclose(csd[i, j], ref.conj(),
+                                           rtol=1e-10, atol=1e-14)
+
+
+def test_band_matrix():
+    data = get_data()
+    band = (8, 12)
+    freqs, csd = cross_spectral_matrix(data, FSAMP, 256, 0.5, 'hann')
+    band_power, coherence = band_matrix(freqs, csd, band)
+
+    for i in range(len(data)):
+        psd_freqs, psd = welch_psd(data[i], FSAMP, 256, 0.5, 'hann')
+        mask = (psd_freqs >= band[0]) & (psd_freqs <= band[1])
+        expected = psd[mask].sum() * (psd_freqs[1] - psd_freqs[0])
+        np.testing.assert_allclose(band_power[i], expected, rtol=1e-10)
+
+    ref_freqs, ref = signal.coherence(data[0], data[1], FSAMP, 'hann', 256,
+                                      128, detrend='constant')
+    mask = (ref_freqs >= band[0]) & (ref_freqs <= band[1])
+    np.testing.assert_allclose(coherence[0, 1], ref[mask].mean(),
+                               rtol=1e-10)
+    np.testing.assert_allclose(np.diag(coherence), 1)
+
+
+def test_spectrogram_pending():
+    data = get_data(1)[0]
+    tiles = SpectrogramTiles(n_fft=64, step=16, tile_cols=16)
+
+    tiles.set_data(data)
+    missing = tiles.get_missing_tiles(0, 2000)
+    assert len(missing)
+
+    # Queued tiles are not requested again
+    assert tiles.get_missing_tiles(0, 2000) == []
+
+    tiles.put_tiles(*tiles.compute_tiles(data, missing[:2], tiles.key))
+    tiles.release_tiles(tiles.key, missing[2:])
+    assert tiles.get_missing_tiles(0, 2000) == missing[2:]
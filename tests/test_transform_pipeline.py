@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Loading of saved transform chains
+
+Ing.,Mgr. (MSc.) Jan Cimbálník, PhD.
+Biomedical engineering
+International Clinical Research Center
+St. Anne's University Hospital in Brno
+Czech Republic
+&
+Mayo systems electrophysiology lab
+Mayo Clinic
+200 1st St SW
+Rochester, MN
+United States
+"""
+
+# Std imports
+import os
+import pickle
+
+# Third pary imports
+import pytest
+
+# Local imports
+from pysigview.core.transform_pipeline import load_chain
+
+
+class Payload:
+    def __reduce__(self):
+        return (os.getcwd, ())
+
+
+def test_load_chain_rejects_foreign_globals(tmp_path):
+    path = str(tmp_path / 'chain.pkl')
+    with open(path, 'wb') as fid:
+        pickle.dump({'version': 1, 'transforms': [Payload()]}, fid)
+
+    with pytest.raises(pickle.UnpicklingError):
+        load_chain(path)
+
+
+def test_load_chain_empty(tmp_path):
+    path = str(tmp_path / 'chain.pkl')
+    with open(path, 'wb') as fid:
+        pickle.dump({'version': 1, 'transforms': []}, fid)
+
+    assert load_chain(path) == []